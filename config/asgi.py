@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Keep the middleware chain async: static files come from the WSGI service
+os.environ.setdefault('SERVE_STATIC', 'false')
 
 application = get_asgi_application()
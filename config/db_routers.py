@@ -0,0 +1,178 @@
+"""
+Database routers.
+
+CatalogReplicaRouter sends reads of the public catalog (categories, products,
+images, reviews and their rating summaries) to one of the DATABASE_REPLICAS
+aliases, picked at random in proportion to its weight. Everything else and every
+write uses the primary. Replicas hold the same data, so relations between objects
+from any alias are allowed, and migrations only run on the primary.
+
+Catalog reads also go to the primary when:
+
+- the request has written anything (the router saw a db_for_write other than
+  a DatabaseCache write), so a view reads back what it just saved;
+- the client wrote within the last DATABASE_PIN_SECONDS: PrimaryPinningMiddleware
+  sets a short-lived cookie after writing requests, which gives carts and
+  checkout read-your-writes across requests despite replication lag;
+- the request is not a GET/HEAD/OPTIONS, so update views never load a stale row
+  and save it back;
+- the code runs inside a transaction on the primary (checkout, imports);
+- the code runs under `primary()`, a view wrapped with `use_primary`, or a class
+  view using PrimaryReadMixin.
+
+Outside a request (workers, shell) nothing resets the pin, so once a thread has
+written it keeps reading the primary.
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+CATALOG_MODELS = {
+    'products.category',
+    'products.subcategory',
+    'products.product',
+    'products.productimage',
+    'products.review',
+    'products.reviewmedia',
+    'products.productratingsummary',
+}
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Set when the current request (or thread, outside requests) has written
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+# Set when reads must see the primary for another reason
+_use_primary = contextvars.ContextVar('db_use_primary', default=False)
+
+
+def replica_weights():
+    """{alias: weight} from DATABASE_REPLICAS, which may also be a plain list of aliases."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', {})
+    if isinstance(replicas, dict):
+        return {alias: weight for alias, weight in replicas.items() if weight > 0}
+    return dict.fromkeys(replicas, 1)
+
+
+def choose_replica():
+    weights = replica_weights()
+    if not weights:
+        return 'default'
+    return random.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def reads_primary():
+    return _wrote.get() or _use_primary.get() or connections['default'].in_atomic_block
+
+
+@contextmanager
+def primary():
+    """Send every read in the block to the primary."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def use_primary(view):
+    """Decorator for views whose reads must see the primary."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class PrimaryReadMixin:
+    """Class-based view mixin: the whole request reads from the primary."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with primary():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def is_cache_model(model):
+    # DatabaseCache routes its table through a pseudo-model whose _meta only has
+    # app_label, model_name and db_table
+    return model._meta.app_label == 'django_cache'
+
+
+class CatalogReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_cache_model(model):
+            return None
+        if model._meta.label_lower in CATALOG_MODELS and not reads_primary():
+            return choose_replica()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Cache writes (set/add/delete on DatabaseCache) change no data a read could miss
+        if is_cache_model(model):
+            return None
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {'default', *replica_weights()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class PrimaryPinningMiddleware:
+    """Scopes the router's pin to the request and carries it over in a cookie."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        # asgiref copies context variables set by sync ORM code back to this task
+        tokens = self.start(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
+        return _wrote.set(False), _use_primary.set(
+            PIN_COOKIE in request.COOKIES or request.method not in SAFE_METHODS
+        )
+
+    def finish(self, response):
+        if _wrote.get():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def reset(self, tokens):
+        wrote, use_primary = tokens
+        _wrote.reset(wrote)
+        _use_primary.reset(use_primary)
@@ -0,0 +1,273 @@
+"""
+Per-request instrumentation.
+
+RequestInstrumentationMiddleware measures every request:
+
+    db         time spent executing SQL, with the query count
+    serialize  time spent in DRF serializer `.data`
+    render     time spent rendering the response (DRF renderers)
+    app        everything else in the view and middleware
+    total      wall time of the request
+
+and reports it three ways: a `Server-Timing` response header, one structured log
+line on the `config.instrumentation` logger, and a rolling in-process sample
+window per URL name (e.g. `products:product-list`) served by `request_stats`.
+
+The cost per request is a few perf_counter calls and one wrapper call per query.
+Turn it off with REQUEST_INSTRUMENTATION = False; the middleware then removes
+itself at startup.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLES_PER_ROUTE = 1000
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db', 'serialize', 'render', 'render_started', 'serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.render_started = None
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+
+def timed_serializer_data(fget):
+    """Wrap a serializer `data` getter so the outermost call is added to the request's serialize time."""
+    def data(serializer):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return fget(serializer)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return fget(serializer)
+        finally:
+            metrics.serialize += time.perf_counter() - started
+            metrics.serializing = False
+
+    data.instrumented = True
+    return data
+
+
+def install_serializer_timing():
+    from rest_framework import serializers
+
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        prop = serializer_class.__dict__['data']
+        if not getattr(prop.fget, 'instrumented', False):
+            serializer_class.data = property(timed_serializer_data(prop.fget), doc=prop.__doc__)
+
+
+class RouteSamples:
+    """The last `size` samples of one route, summarised on demand."""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+
+    def add(self, sample):
+        self.samples.append(sample)
+
+    def summary(self):
+        samples = list(self.samples)
+        totals = sorted(sample[0] for sample in samples)
+        db = sorted(sample[1] for sample in samples)
+        queries = [sample[2] for sample in samples]
+        statuses = {}
+        for sample in samples:
+            statuses[sample[3]] = statuses.get(sample[3], 0) + 1
+
+        histogram = dict.fromkeys([f"le_{bound}" for bound in HISTOGRAM_BOUNDS_MS] + ['inf'], 0)
+        for total in totals:
+            bound = next((bound for bound in HISTOGRAM_BOUNDS_MS if total <= bound), None)
+            histogram[f"le_{bound}" if bound is not None else 'inf'] += 1
+
+        return {
+            'count': len(samples),
+            'statuses': statuses,
+            'total_ms': percentiles(totals),
+            'db_ms': percentiles(db),
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 1) if queries else 0,
+                'max': max(queries, default=0),
+            },
+            'histogram_ms': histogram,
+        }
+
+
+def percentiles(ordered):
+    if not ordered:
+        return {'p50': 0, 'p95': 0, 'p99': 0, 'max': 0}
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+    return {'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99), 'max': round(ordered[-1], 2)}
+
+
+class RouteRegistry:
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, sample):
+        samples = self.routes.get(route)
+        if samples is None:
+            with self.lock:
+                size = getattr(settings, 'REQUEST_INSTRUMENTATION_SAMPLES', DEFAULT_SAMPLES_PER_ROUTE)
+                samples = self.routes.setdefault(route, RouteSamples(size))
+        samples.add(sample)
+
+    def snapshot(self):
+        return {route: samples.summary() for route, samples in sorted(self.routes.copy().items())}
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+
+registry = RouteRegistry()
+
+
+def record_context_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def install_context_query_recording():
+    """Permanently wrap this thread's connections to record into the current request's metrics."""
+    for connection in connections.all():
+        if record_context_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_context_query)
+
+
+class RequestInstrumentationMiddleware:
+    """Keep near the top of MIDDLEWARE so `total` covers the other middleware too."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        # The async ORM runs queries on another thread, with other connection
+        # objects, but it carries this context over
+        await sync_to_async(install_context_query_recording)()
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        finished = time.perf_counter()
+        if metrics.render_started is not None:
+            metrics.render = finished - metrics.render_started
+        self.report(request, response, metrics, finished - metrics.started)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called last among template response hooks, right before response.render()
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+        return response
+
+    def report(self, request, response, metrics, total):
+        timings = {
+            'db': metrics.db * 1000,
+            'serialize': metrics.serialize * 1000,
+            'render': metrics.render * 1000,
+            'app': max(total - metrics.db - metrics.serialize - metrics.render, 0) * 1000,
+            'total': total * 1000,
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration:.2f}' + (f';desc="{metrics.queries} queries"' if name == 'db' else '')
+            for name, duration in timings.items()
+        )
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None else 'unresolved'
+        registry.add(route, (timings['total'], timings['db'], metrics.queries, response.status_code))
+
+        if logger.isEnabledFor(logging.INFO):
+            fields = {
+                'route': route,
+                'method': request.method,
+                'status': response.status_code,
+                'queries': metrics.queries,
+                **{f"{name}_ms": round(duration, 2) for name, duration in timings.items()},
+            }
+            logger.info(
+                ' '.join(f"{key}={value}" for key, value in fields.items()),
+                extra={'request_metrics': fields}
+            )
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_stats(request):
+    """Rolling per-route latency and query statistics; DELETE clears them."""
+    if request.method == 'DELETE':
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': getattr(settings, 'REQUEST_INSTRUMENTATION', True),
+        'window': getattr(settings, 'REQUEST_INSTRUMENTATION_SAMPLES', DEFAULT_SAMPLES_PER_ROUTE),
+        'routes': registry.snapshot(),
+    })
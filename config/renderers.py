@@ -0,0 +1,76 @@
+"""
+orjson-backed JSON renderer and parser for DRF.
+
+ORJSONRenderer produces the same bytes as rest_framework's JSONRenderer under
+this project's settings (COMPACT_JSON and UNICODE_JSON on): no whitespace,
+UTF-8 instead of \\u escapes, U+2028/U+2029 escaped. Types orjson does not
+encode the way DRF does (Decimal, lazy translation strings, querysets, and
+datetime/date/time, kept on DRF's isoformat() output) go through DRF's own
+JSONEncoder.default. The known differences are floats in exponent form
+(`1e-07` vs `1e-7`) and NaN/Infinity, which orjson writes as `null` rather than
+invalid JSON.
+
+It falls back to JSONRenderer for indented output (`Accept: application/json;
+indent=4`), non-default COMPACT_JSON/UNICODE_JSON, integers wider than 64 bits,
+and when orjson is not installed. JSON_BACKEND = 'stdlib' turns both classes
+off in settings.
+"""
+
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_encoder = JSONEncoder()
+
+
+def default_renderer():
+    """An instance of the first DEFAULT_RENDERER_CLASSES entry, for views that render by hand."""
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays a strict javascript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
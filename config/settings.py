@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -67,9 +68,12 @@ INSTALLED_APPS = [
     # Custom apps
     'accounts',
     'products',
+    'order_management',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'config.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -81,6 +85,11 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
+# WhiteNoise is sync only; under ASGI it would push every view, async ones too,
+# through a thread. config/asgi.py turns it off and the WSGI service serves static files.
+if os.getenv('SERVE_STATIC', 'true').lower() not in ('1', 'true', 'yes'):
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 
 
 
@@ -108,6 +117,18 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse: DB_CONN_MAX_AGE seconds of persistent connections per worker
+# thread (0 closes after every request, None never closes), health-checked before
+# reuse. DB_POOL=true uses psycopg 3's pool instead (psycopg[pool] in
+# requirements.txt); Django requires CONN_MAX_AGE 0 then, the pool does the reuse.
+# DB_PGBOUNCER_TRANSACTION_POOLING=true turns server-side cursors off, which
+# PgBouncer in transaction mode cannot keep; elsewhere `.iterator()` (exports,
+# streaming lists) needs them to fetch rows in chunks.
+DB_POOL = os.getenv('DB_POOL', 'false').lower() in ('1', 'true', 'yes')
+DB_PGBOUNCER_TRANSACTION_POOLING = (
+    os.getenv('DB_PGBOUNCER_TRANSACTION_POOLING', 'false').lower() in ('1', 'true', 'yes')
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -117,14 +138,110 @@ DATABASES = {
         'HOST': os.getenv('PGHOST'),
         'PORT': os.getenv('PGPORT', 5432),
         'OPTIONS': {
-            'sslmode': 'require',
+            'sslmode': os.getenv('PGSSLMODE', 'require'),
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
         },
-        'DISABLE_SERVER_SIDE_CURSORS': True,
-        'CONN_MAX_AGE': 0,
-        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER_TRANSACTION_POOLING,
+        'CONN_MAX_AGE': 0 if DB_POOL else (
+            None if os.getenv('DB_CONN_MAX_AGE') == 'none' else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
     }
 }
 
+if DB_POOL:
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured('DB_POOL=true needs psycopg 3 and its pool: pip install "psycopg[pool]"')
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Drop idle connections before the server or a proxy does
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS=host1*3,host2:6432 adds aliases replica_1, replica_2, ...
+# with the primary's credentials and an optional *weight (default 1).
+# config.db_routers sends catalog reads to them, weighted, unless the request must
+# read its own writes; DATABASE_PIN_SECONDS is how long a client that wrote keeps
+# reading the primary.
+DATABASE_REPLICAS = {}
+for number, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    address, _, weight = address.strip().partition('*')
+    host, _, port = address.partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        # Tests read the primary through replica aliases
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+# Local / offline runs (tests, benchmarks): DB_ENGINE=sqlite. SQLITE_REPLICA_PATHS
+# (comma separated files) adds unreplicated replica aliases to try the routing.
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    DATABASE_REPLICAS = {}
+    for number, path in enumerate(filter(None, os.getenv('SQLITE_REPLICA_PATHS', '').split(',')), start=1):
+        alias = f'replica_{number}'
+        DATABASES[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS[alias] = 1
+
+DATABASE_PIN_SECONDS = int(os.getenv('DATABASE_PIN_SECONDS', 5))
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['config.db_routers.CatalogReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+        'config.db_routers.PrimaryPinningMiddleware'
+    )
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Catalog versions (products/cache.py), the response cache and cart summaries are
+# invalidated by whichever worker handles the write, so every worker must share
+# one cache: Redis when REDIS_URL is set, otherwise the database table made by
+# `manage.py createcachetable` (build.sh runs it). CACHE_BACKEND=locmem keeps the
+# cache per process, fine for single-process runs only; DB_ENGINE=sqlite defaults
+# to it.
+REDIS_URL = os.getenv('REDIS_URL', '')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND') or (
+    'locmem' if os.getenv('DB_ENGINE') == 'sqlite' else 'redis' if REDIS_URL else 'database'
+)
+CACHE_BACKENDS = {
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+    'database': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[CACHE_BACKEND]}
+if CACHE_BACKEND != 'redis':
+    # Past this many entries the database and locmem backends cull a third of them
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))}
 
 
 # Password validation
@@ -170,9 +287,23 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 
 
+# JSON encoding for DRF (config/renderers.py): 'orjson', or 'stdlib' for DRF's own classes
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+if JSON_BACKEND == 'orjson':
+    JSON_RENDERER_CLASS = 'config.renderers.ORJSONRenderer'
+    JSON_PARSER_CLASS = 'config.renderers.ORJSONParser'
+else:
+    JSON_RENDERER_CLASS = 'rest_framework.renderers.JSONRenderer'
+    JSON_PARSER_CLASS = 'rest_framework.parsers.JSONParser'
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',  # ✅ Force only JSON
+        JSON_RENDERER_CLASS,  # ✅ Force only JSON
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        JSON_PARSER_CLASS,
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -181,6 +312,67 @@ REST_FRAMEWORK = {
 
 
 
+# Request instrumentation (config/instrumentation.py): Server-Timing headers,
+# per-request log lines and rolling per-route stats at /api/instrumentation/stats/
+REQUEST_INSTRUMENTATION = os.getenv('REQUEST_INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+REQUEST_INSTRUMENTATION_SAMPLES = int(os.getenv('REQUEST_INSTRUMENTATION_SAMPLES', 1000))
+
+
+# Razorpay
+RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
+RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
+
+# Payment gateway (order_management/payments.py): 'razorpay', or 'fake' for offline load tests
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'razorpay')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.05))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_READ_TIMEOUT', 10))
+PAYMENT_GATEWAY_POOL_SIZE = int(os.getenv('PAYMENT_GATEWAY_POOL_SIZE', 10))
+
+# Seconds an order may wait for its payment; then the orders.expire_pending job
+# cancels it and puts its stock back (order_management/checkout.py)
+ORDER_PENDING_TIMEOUT = int(os.getenv('ORDER_PENDING_TIMEOUT', 3600))
+PAYMENT_GATEWAY_MAX_RETRIES = int(os.getenv('PAYMENT_GATEWAY_MAX_RETRIES', 2))
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.getenv('PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5))
+PAYMENT_GATEWAY_BREAKER_RESET = int(os.getenv('PAYMENT_GATEWAY_BREAKER_RESET', 30))
+PAYMENT_GATEWAY_FAKE_LATENCY_MS = int(os.getenv('PAYMENT_GATEWAY_FAKE_LATENCY_MS', 0))
+PAYMENT_GATEWAY_FAKE_FAILURE_RATE = float(os.getenv('PAYMENT_GATEWAY_FAKE_FAILURE_RATE', 0))
+
+
+# Background jobs (jobs/queue.py), run by `manage.py run_workers`
+JOBS_WORKER_PROCESSES = int(os.getenv('JOBS_WORKER_PROCESSES', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_BACKOFF = float(os.getenv('JOBS_BACKOFF', 10))
+JOBS_MAX_BACKOFF = float(os.getenv('JOBS_MAX_BACKOFF', 3600))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 600))
+
+# Seconds a per-user cart summary (carts/summary/) stays cached; writes invalidate it sooner
+CART_SUMMARY_TIMEOUT = int(os.getenv('CART_SUMMARY_TIMEOUT', 300))
+
+# Anonymous catalog response cache (products/response_cache.py): an in-process LRU of
+# RESPONSE_CACHE_LOCAL_SIZE entries, rechecked every RESPONSE_CACHE_LOCAL_TIMEOUT seconds,
+# in front of the shared cache. Writes invalidate entries by tag before they expire.
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_LOCAL_SIZE = int(os.getenv('RESPONSE_CACHE_LOCAL_SIZE', 512))
+RESPONSE_CACHE_LOCAL_TIMEOUT = int(os.getenv('RESPONSE_CACHE_LOCAL_TIMEOUT', 60))
+
+# Rows per chunk of ?stream=json|ndjson list responses (products/streaming.py)
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 500))
+
+# Email sent by background jobs
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'false').lower() in ('1', 'true', 'yes')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'MHE Bazar <noreply@mhebazar.in>')
+SERVER_EMAIL = DEFAULT_FROM_EMAIL
+# Comma-separated addresses alerted about payments that need a manual refund
+ADMINS = [('Admin', email.strip()) for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()]
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -19,9 +19,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .instrumentation import request_stats
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('accounts.urls')),
     path('api/', include('products.urls')),
+    path('api/', include('order_management.urls')),
+    path('api/instrumentation/stats/', request_stats, name='instrumentation-stats'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
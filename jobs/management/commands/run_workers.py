@@ -0,0 +1,96 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import jobs_setting, work, worker_id
+
+logger = logging.getLogger(__name__)
+
+
+def worker_loop(batch_size, poll_interval, stop):
+    # The parent handles Ctrl-C and SIGTERM and tells workers to finish via `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    worker = worker_id()
+    while not stop.is_set():
+        try:
+            if work(worker, batch_size):
+                continue
+        except Exception:
+            # Lost connection and the like: drop it and try again after a pause
+            logger.exception("Worker %s failed to run jobs", worker)
+            connections.close_all()
+        stop.wait(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=jobs_setting('WORKER_PROCESSES', 2),
+            help="Number of worker processes."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help="Jobs claimed per poll."
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=jobs_setting('POLL_INTERVAL', 1.0),
+            help="Seconds to wait when the queue is empty."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run due jobs in this process until none are left, then exit."
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = 0
+            while ran := work(batch_size=options['batch_size']):
+                total += ran
+            self.stdout.write(self.style.SUCCESS(f"Ran {total} jobs."))
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        # Forked children inherit the configured Django app registry
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        processes = [
+            context.Process(
+                target=worker_loop,
+                args=(options['batch_size'], options['poll_interval'], stop),
+                daemon=True
+            )
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} workers.")
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        try:
+            while not stop.is_set() and any(process.is_alive() for process in processes):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        stop.set()
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
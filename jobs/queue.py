@@ -0,0 +1,145 @@
+"""
+Database-backed job queue.
+
+Side effects that do not have to finish inside the request (emails, vendor
+notifications, ...) are registered as tasks and enqueued as Job rows:
+
+    @task('orders.send_confirmation')
+    def send_order_confirmation(order_id):
+        ...
+
+    enqueue('orders.send_confirmation', order_id=order.pk)
+
+`enqueue` inserts the row on transaction commit, so a rolled back order never
+sends mail and workers never see rows they cannot read yet. Payloads are JSON.
+
+Workers (`manage.py run_workers`) claim batches with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of processes can poll the same
+table without handing a job out twice. A failed job is retried after an
+exponential, jittered backoff (JOBS_BACKOFF * 2 ** (attempts - 1), capped at
+JOBS_MAX_BACKOFF) and marked dead once it has used `max_attempts`. Jobs left
+running by a crashed worker are claimed again after JOBS_LOCK_TIMEOUT seconds.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+tasks = {}
+
+
+def jobs_setting(name, default):
+    return getattr(settings, f'JOBS_{name}', default)
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs called `name`."""
+    def register(func):
+        if tasks.get(name, func) is not func:
+            raise ValueError(f"Task {name!r} is already registered")
+        tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=None, max_attempts=None, **payload):
+    """Queue `name(**payload)` once the current transaction commits."""
+    if name not in tasks:
+        raise ValueError(f"Unknown task {name!r}")
+    job = Job(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or jobs_setting('MAX_ATTEMPTS', 5),
+        run_after=timezone.now() + timedelta(seconds=delay or 0),
+    )
+    transaction.on_commit(job.save)
+    return job
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, batch_size=10):
+    """Lock up to `batch_size` due jobs for `worker` and return them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=jobs_setting('LOCK_TIMEOUT', 600))
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='queued', run_after__lte=now) | Q(status='running', locked_at__lt=stale))
+            .order_by('run_after', 'id')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids).update(
+            status='running',
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now
+        )
+    return list(Job.objects.filter(pk__in=ids).order_by('run_after', 'id'))
+
+
+def backoff(attempts):
+    base = jobs_setting('BACKOFF', 10)
+    ceiling = min(jobs_setting('MAX_BACKOFF', 3600), base * 2 ** max(attempts - 1, 0))
+    # Jitter keeps jobs that failed together from retrying together
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def run(job):
+    """Run one claimed job and record the outcome. Returns the new status."""
+    now = timezone.now()
+    try:
+        handler = tasks.get(job.name)
+        if handler is None:
+            raise LookupError(f"No handler registered for task {job.name!r}")
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) is dead after %s attempts", job.pk, job.name, job.attempts)
+            updates = {'status': 'dead'}
+        else:
+            logger.warning("Job %s (%s) failed, attempt %s of %s", job.pk, job.name, job.attempts, job.max_attempts)
+            updates = {'status': 'queued', 'run_after': now + timedelta(seconds=backoff(job.attempts))}
+    else:
+        error = ''
+        updates = {'status': 'done'}
+
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, last_error=error[-10000:], updated_at=now, **updates
+    )
+    job.status = updates['status']
+    return job.status
+
+
+def work(worker=None, batch_size=10):
+    """Claim and run one batch. Returns the number of jobs run."""
+    jobs = claim(worker or worker_id(), batch_size)
+    for job in jobs:
+        run(job)
+    return len(jobs)
+
+
+def requeue_dead(queryset=None):
+    """Give dead jobs (all, or those in `queryset`) a fresh set of attempts."""
+    queryset = Job.objects.all() if queryset is None else queryset
+    return queryset.filter(status='dead').update(
+        status='queued', attempts=0, run_after=timezone.now(), updated_at=timezone.now()
+    )
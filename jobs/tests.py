@@ -0,0 +1,114 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .management.commands.run_workers import worker_loop
+from .models import Job
+from .queue import claim, enqueue, requeue_dead, run, task, work
+
+calls = []
+
+
+@task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('tests.fail')
+def fail(value):
+    raise RuntimeError(f"failed {value}")
+
+
+@override_settings(JOBS_BACKOFF=10, JOBS_MAX_BACKOFF=60, JOBS_LOCK_TIMEOUT=600)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue('tests.record', value=1)
+            self.assertFalse(Job.objects.exists())
+        for callback in callbacks:
+            callback()
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload, job.status), ('tests.record', {'value': 1}, 'queued'))
+
+    def test_enqueue_unknown_task(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_claim_locks_due_jobs_once(self):
+        due = Job.objects.create(name='tests.record', payload={'value': 1})
+        Job.objects.create(name='tests.record', payload={'value': 2}, run_after=timezone.now() + timedelta(hours=1))
+
+        # SAVEPOINT, locking SELECT, UPDATE, RELEASE, fetch
+        with self.assertNumQueries(5):
+            jobs = claim('worker-a')
+        self.assertEqual([job.pk for job in jobs], [due.pk])
+        self.assertEqual((jobs[0].status, jobs[0].attempts, jobs[0].locked_by), ('running', 1, 'worker-a'))
+        self.assertEqual(claim('worker-b'), [])
+
+    def test_run_success(self):
+        Job.objects.create(name='tests.record', payload={'value': 7})
+        self.assertEqual(work('worker-a'), 1)
+        self.assertEqual(calls, [7])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.locked_by, job.last_error), ('done', '', ''))
+
+    def test_failure_backs_off_then_dead_letters(self):
+        Job.objects.create(name='tests.fail', payload={'value': 1}, max_attempts=2)
+
+        [job] = claim('worker-a')
+        self.assertEqual(run(job), 'queued')
+        job.refresh_from_db()
+        self.assertIn('RuntimeError: failed 1', job.last_error)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timedelta(seconds=4))
+        self.assertEqual(claim('worker-a'), [])
+
+        Job.objects.update(run_after=timezone.now())
+        [job] = claim('worker-a')
+        self.assertEqual(run(job), 'dead')
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+        self.assertEqual(requeue_dead(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+
+    def test_stale_running_job_is_reclaimed(self):
+        Job.objects.create(
+            name='tests.record', payload={'value': 3}, status='running', attempts=1,
+            locked_by='crashed', locked_at=timezone.now() - timedelta(hours=1)
+        )
+        [job] = claim('worker-b')
+        self.assertEqual((job.locked_by, job.attempts), ('worker-b', 2))
+        self.assertEqual(run(job), 'done')
+
+    def test_run_workers_once(self):
+        Job.objects.bulk_create([Job(name='tests.record', payload={'value': value}) for value in range(25)])
+        Job.objects.create(name='tests.fail', payload={'value': 0})
+        out = StringIO()
+        call_command('run_workers', once=True, batch_size=10, stdout=out)
+        self.assertIn('Ran 26 jobs.', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(25)))
+        self.assertEqual(Job.objects.filter(status='done').count(), 25)
+        self.assertEqual(Job.objects.filter(status='queued').count(), 1)
+
+
+class WorkerLoopTests(SimpleTestCase):
+    def test_errors_are_logged(self):
+        stop = threading.Event()
+
+        def lose_connection(worker, batch_size):
+            stop.set()
+            raise ConnectionError("server closed the connection")
+
+        with mock.patch('jobs.management.commands.run_workers.work', lose_connection), \
+                mock.patch('jobs.management.commands.run_workers.signal.signal'), \
+                self.assertLogs('jobs.management.commands.run_workers', 'ERROR') as logs:
+            worker_loop(10, 0, stop)
+        self.assertIn("server closed the connection", logs.output[0])
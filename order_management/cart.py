@@ -0,0 +1,180 @@
+"""
+Batched cart writes.
+
+`update_cart` applies any mix of additions, absolute quantities and removals in
+one transaction with a fixed number of statements, whatever the line count:
+
+- add: INSERT ... ON CONFLICT DO NOTHING creates missing lines at quantity 0,
+  then one UPDATE adds the requested amounts with F('quantity') + n. The
+  increment happens in the database, so concurrent adds never lose an update.
+- update: INSERT ... ON CONFLICT (user, product) DO UPDATE SET quantity.
+- remove: one DELETE.
+
+Wishlist moves reuse the add path.
+
+`cart_summary` is the compact cart behind the header badge and mini-cart: line
+totals, per-vendor subtotals and grand totals computed in SQL, cached per user.
+Bulk writes bypass model signals, so every cart write path calls
+`invalidate_cart_summary`; product price and availability changes invalidate the
+carts holding the product (order_management.signals).
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, PositiveIntegerField, Sum, When
+)
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from products.models import Product
+from .models import Cart, Wishlist
+
+
+def check_products(product_ids):
+    """Raise ValidationError unless every id is an active product."""
+    found = set(Product.objects.filter(pk__in=product_ids, is_active=True).values_list('pk', flat=True))
+    missing = sorted(set(product_ids) - found)
+    if missing:
+        raise ValidationError({'product_id': [f"Product {pk} does not exist or is not available." for pk in missing]})
+
+
+def add_to_cart(user, quantities):
+    """Add `quantities` {product_id: n} to the user's cart. Call inside a transaction."""
+    Cart.objects.bulk_create(
+        [Cart(user=user, product_id=product_id, quantity=0) for product_id in quantities],
+        ignore_conflicts=True
+    )
+    Cart.objects.filter(user=user, product_id__in=list(quantities)).update(
+        quantity=F('quantity') + Case(
+            *[When(product_id=product_id, then=quantity) for product_id, quantity in quantities.items()],
+            default=0,
+            output_field=PositiveIntegerField(),
+        ),
+        updated_at=timezone.now()
+    )
+
+
+def set_cart_quantities(user, quantities):
+    """Upsert `quantities` {product_id: n} as the user's line quantities. Call inside a transaction."""
+    Cart.objects.bulk_create(
+        [Cart(user=user, product_id=product_id, quantity=quantity) for product_id, quantity in quantities.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'product'],
+        update_fields=['quantity', 'updated_at']
+    )
+
+
+def update_cart(user, add=None, update=None, remove=None):
+    """
+    Apply `add` (increments) and `update` (absolute quantities), both
+    {product_id: quantity}, and `remove` ([product_id]) to the user's cart atomically.
+    """
+    add, update, remove = add or {}, update or {}, remove or []
+    if add or update:
+        check_products({*add, *update})
+
+    with transaction.atomic():
+        if add:
+            add_to_cart(user, add)
+        if update:
+            set_cart_quantities(user, update)
+        if remove:
+            Cart.objects.filter(user=user, product_id__in=remove).delete()
+    invalidate_cart_summary(user.pk)
+
+
+def move_wishlist_to_cart(user, wishlist_ids=None):
+    """
+    Move the user's wishlist lines (all, or `wishlist_ids`) into the cart, one unit
+    each. Returns the number of lines moved.
+    """
+    with transaction.atomic():
+        lines = Wishlist.objects.select_for_update().filter(user=user)
+        if wishlist_ids is not None:
+            lines = lines.filter(pk__in=wishlist_ids)
+        moved = dict(lines.values_list('pk', 'product_id'))
+        if not moved:
+            return 0
+
+        add_to_cart(user, dict.fromkeys(moved.values(), 1))
+        Wishlist.objects.filter(pk__in=list(moved)).delete()
+    invalidate_cart_summary(user.pk)
+    return len(moved)
+
+
+# Cart summary
+
+def cart_summary_key(user_id):
+    return f"orders:cart-summary:{user_id}"
+
+
+def invalidate_cart_summary(*user_ids):
+    """
+    Drop the users' cached summaries once the current transaction commits (at once
+    outside one). Deleting earlier would let a concurrent read cache the
+    pre-commit cart again.
+    """
+    keys = [cart_summary_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def line_total():
+    return ExpressionWrapper(
+        F('quantity') * F('product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def compute_cart_summary(user_id):
+    """Build the summary with two queries: the lines and the per-vendor GROUP BY."""
+    carts = Cart.objects.filter(user_id=user_id)
+    lines = carts.annotate(line_total=line_total()).order_by('-created_at').values_list(
+        'pk', 'product_id', 'product__vendor_id', 'quantity', 'product__price', 'line_total'
+    )
+    vendors = (
+        carts.values('product__vendor_id')
+        .annotate(lines=Count('pk'), items=Sum('quantity'), subtotal=Sum(line_total()))
+        .order_by('product__vendor_id')
+    )
+
+    vendors = [
+        {
+            'vendor_id': row['product__vendor_id'],
+            'lines': row['lines'],
+            'items': row['items'],
+            'subtotal': row['subtotal'],
+        }
+        for row in vendors
+    ]
+    total = sum((vendor['subtotal'] for vendor in vendors), Decimal('0.00'))
+    return {
+        'lines': [
+            {
+                'id': pk,
+                'product_id': product_id,
+                'vendor_id': vendor_id,
+                'quantity': quantity,
+                'price': str(price),
+                'line_total': str(total_price),
+            }
+            for pk, product_id, vendor_id, quantity, price, total_price in lines
+        ],
+        'vendors': [{**vendor, 'subtotal': str(vendor['subtotal'])} for vendor in vendors],
+        'line_count': sum(vendor['lines'] for vendor in vendors),
+        'item_count': sum(vendor['items'] for vendor in vendors),
+        'total': str(total),
+    }
+
+
+def cart_summary(user_id):
+    """The user's cached cart summary, computed on a miss."""
+    key = cart_summary_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_cart_summary(user_id)
+        cache.set(key, summary, getattr(settings, 'CART_SUMMARY_TIMEOUT', 300))
+    return summary
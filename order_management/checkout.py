@@ -0,0 +1,261 @@
+"""
+Checkout pipeline.
+
+An order is placed inside one transaction:
+
+1. the cart lines (or wishlist line) and their products are loaded and row-locked
+   with a single SELECT ... FOR UPDATE, ordered by product so concurrent
+   checkouts lock in the same order;
+2. stock is checked against the locked rows and reserved for every product with
+   one UPDATE;
+3. the Order, its OrderItems (bulk_create) and the Delivery are inserted.
+
+The transaction commits before the payment gateway is contacted, so slow gateway
+calls never hold row locks. The query count does not depend on the number of lines.
+
+Verified payment webhooks are settled by `settle_payment`: a conditional
+PENDING -> PAID UPDATE plus a PaymentEvent row whose unique payment id makes
+redeliveries no-ops. Confirmation and vendor emails are queued as jobs for after
+the commit.
+
+Only PENDING orders hold stock. `leave_pending` moves an order to FAILED
+(unverified callback, gateway down when starting a payment) or CANCELLED
+(the `orders.expire_pending` job queued at checkout, once the order has waited
+ORDER_PENDING_TIMEOUT seconds without a payment) and puts its quantities back in
+the same transaction. `reopen_order` reserves them again when a FAILED order's
+payment is retried.
+
+A payment can still be captured on the order's gateway order after it left
+PENDING (the customer paid just as it expired, or while a retry failed).
+`settle_payment` then reserves the stock again and marks the order PAID; if the
+stock is gone it records REFUND and queues `orders.payment_needs_refund`.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from jobs.queue import enqueue
+from products.models import Product
+from .cart import invalidate_cart_summary
+from .models import Cart, Delivery, Order, OrderItem, PaymentEvent, Wishlist
+
+logger = logging.getLogger(__name__)
+
+# States an order can leave PENDING for while its gateway order stays payable
+LAPSED_STATUSES = ('FAILED', 'CANCELLED')
+
+
+def reserve_stock(lines):
+    """
+    Decrement stock for `lines` [(product, quantity), ...] whose products are locked
+    by the caller. Raises ValidationError listing every product that is short.
+    """
+    short = [
+        f"Only {product.stock_quantity} of {product.name} in stock."
+        for product, quantity in lines
+        if quantity > product.stock_quantity
+    ]
+    if short:
+        raise ValidationError({'stock': short})
+
+    Product.objects.filter(pk__in=[product.pk for product, _ in lines]).update(
+        stock_quantity=Case(
+            *[When(pk=product.pk, then=F('stock_quantity') - quantity) for product, quantity in lines],
+            default=F('stock_quantity'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    for product, quantity in lines:
+        product.stock_quantity -= quantity
+
+
+def order_quantities(order_id):
+    """{product_id: quantity} of the order's items."""
+    return dict(
+        OrderItem.objects.filter(order_id=order_id)
+        .order_by('product_id')
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+
+
+def release_stock(order_id):
+    """Add the order's quantities back to stock, in one UPDATE."""
+    quantities = order_quantities(order_id)
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=Case(
+            *[When(pk=product_id, then=F('stock_quantity') + quantity) for product_id, quantity in quantities.items()],
+            default=F('stock_quantity'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def reserve_order_stock(order_id):
+    """Lock the order's products and reserve its quantities again, see reserve_stock."""
+    quantities = order_quantities(order_id)
+    # Same lock order as checkout
+    products = Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk')
+    reserve_stock([(product, quantities[product.pk]) for product in products])
+
+
+def expire_pending_later(order_id):
+    enqueue(
+        'orders.expire_pending',
+        delay=getattr(settings, 'ORDER_PENDING_TIMEOUT', 3600),
+        order_id=order_id
+    )
+
+
+def create_order(user, lines, delivery=None):
+    """Reserve stock and insert the order, its items and delivery. Call inside a transaction."""
+    reserve_stock(lines)
+
+    order = Order.objects.create(
+        user=user,
+        total_amount=sum(product.price * quantity for product, quantity in lines),
+        status='PENDING'
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+        for product, quantity in lines
+    ])
+    if delivery is not None:
+        Delivery.objects.create(order=order, **delivery)
+    expire_pending_later(order.pk)
+    return order
+
+
+def checkout_cart(user, cart_ids, delivery):
+    """Place an order for the user's cart lines `cart_ids`."""
+    cart_ids = set(cart_ids)
+    with transaction.atomic():
+        cart_lines = list(
+            Cart.objects.select_for_update()
+            .select_related('product')
+            .filter(user=user, pk__in=cart_ids)
+            .order_by('product_id')
+        )
+        if len(cart_lines) != len(cart_ids):
+            raise ValidationError({'cart_items': ["Cart items must belong to the current user"]})
+
+        return create_order(user, [(line.product, line.quantity) for line in cart_lines], delivery)
+
+
+def checkout_wishlist_item(user, wishlist_id):
+    """Place a single-unit order for a wishlist line and remove it from the wishlist."""
+    with transaction.atomic():
+        wishlist_item = (
+            Wishlist.objects.select_for_update()
+            .select_related('product')
+            .filter(user=user, pk=wishlist_id)
+            .first()
+        )
+        if wishlist_item is None:
+            return None
+
+        order = create_order(user, [(wishlist_item.product, 1)])
+        wishlist_item.delete()
+        return order
+
+
+def settle_payment(order_id, razorpay_order_id, payment_id, signature):
+    """
+    Apply a verified payment to its order once. Returns (outcome, duplicate) where
+    outcome is the PaymentEvent outcome recorded for `payment_id`.
+    """
+    outcome = PaymentEvent.objects.filter(payment_id=payment_id).values_list('outcome', flat=True).first()
+    if outcome is not None:
+        return outcome, True
+
+    try:
+        with transaction.atomic():
+            order = Order.objects.filter(pk=order_id, razorpay_order_id=razorpay_order_id)
+            payment = {
+                'status': 'PAID',
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+                'updated_at': timezone.now(),
+            }
+            paid = order.filter(status='PENDING').update(**payment)
+            outcome = 'PAID' if paid else 'IGNORED'
+            if not paid and order.select_for_update().filter(status__in=LAPSED_STATUSES).exists():
+                # The customer was charged after the order gave its stock back
+                try:
+                    reserve_order_stock(order_id)
+                except ValidationError:
+                    outcome = 'REFUND'
+                else:
+                    paid = order.filter(status__in=LAPSED_STATUSES).update(**payment)
+                    outcome = 'PAID'
+            PaymentEvent.objects.create(
+                payment_id=payment_id,
+                razorpay_order_id=razorpay_order_id,
+                order_id=None if outcome == 'IGNORED' else order_id,
+                outcome=outcome
+            )
+            if outcome == 'REFUND':
+                logger.error(
+                    "Payment %s captured for lapsed order %s, which is out of stock", payment_id, order_id
+                )
+                enqueue('orders.payment_needs_refund', order_id=order_id, payment_id=payment_id)
+            if paid:
+                # The ordered products leave the buyer's cart
+                user_id = Order.objects.filter(pk=order_id).values_list('user_id', flat=True).get()
+                Cart.objects.filter(
+                    user_id=user_id,
+                    product_id__in=OrderItem.objects.filter(order_id=order_id).values('product_id')
+                ).delete()
+                invalidate_cart_summary(user_id)
+                enqueue('orders.send_confirmation', order_id=order_id)
+                enqueue('orders.notify_vendors', order_id=order_id)
+    except IntegrityError:
+        # A concurrent delivery of the same event got there first
+        outcome = PaymentEvent.objects.filter(payment_id=payment_id).values_list('outcome', flat=True).first()
+        return outcome, True
+
+    return outcome, False
+
+
+def leave_pending(order_id, status, **conditions):
+    """
+    PENDING -> `status` (FAILED or CANCELLED) for the order if it also matches
+    `conditions`, releasing its stock in the same transaction. The conditional
+    UPDATE makes sure the stock goes back once. Returns whether the order moved.
+    """
+    with transaction.atomic():
+        moved = Order.objects.filter(pk=order_id, status='PENDING', **conditions).update(
+            status=status, updated_at=timezone.now()
+        )
+        if moved:
+            release_stock(order_id)
+    return bool(moved)
+
+
+def mark_payment_failed(order_id, razorpay_order_id):
+    """PENDING -> FAILED for a callback that did not verify; other states are left alone."""
+    return leave_pending(order_id, 'FAILED', razorpay_order_id=razorpay_order_id)
+
+
+def reopen_order(order_id):
+    """
+    FAILED -> PENDING for a payment retry, reserving the order's stock again.
+    Returns False if the order is no longer FAILED; raises ValidationError when
+    stock ran out meanwhile, leaving the order FAILED.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, status='FAILED').update(
+            status='PENDING', updated_at=timezone.now()
+        ):
+            return False
+        reserve_order_stock(order_id)
+        expire_pending_later(order_id)
+    return True
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=255, unique=True)),
+                ('razorpay_order_id', models.CharField(max_length=255)),
+                ('outcome', models.CharField(choices=[('PAID', 'Order marked paid'), ('IGNORED', 'Order was not pending')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_events', to='order_management.order')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order_management', '0003_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentevent',
+            name='outcome',
+            field=models.CharField(choices=[('PAID', 'Order marked paid'), ('IGNORED', 'Order was not pending'), ('REFUND', 'Order lapsed and out of stock, refund due')], max_length=20),
+        ),
+    ]
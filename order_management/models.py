@@ -65,7 +65,8 @@ class Order(models.Model):
     )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
-    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True)
+    # Webhooks look orders up by gateway order id
+    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     razorpay_payment_id = models.CharField(max_length=255, blank=True, null=True)
     razorpay_signature = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -73,6 +74,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Paginated order history: WHERE user_id = ? ORDER BY created_at, id
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
@@ -125,4 +130,33 @@ class Delivery(models.Model):
         verbose_name_plural = "Deliveries"
 
     def __str__(self):
-        return f"Delivery for Order #{self.order.id}"
\ No newline at end of file
+        return f"Delivery for Order #{self.order.id}"
+
+class PaymentEvent(models.Model):
+    """
+    Idempotency record of a verified payment webhook. The unique payment id turns
+    redeliveries of the same event into a single indexed lookup.
+    """
+    OUTCOME_CHOICES = (
+        ('PAID', 'Order marked paid'),
+        ('IGNORED', 'Order was not pending'),
+        ('REFUND', 'Order lapsed and out of stock, refund due'),
+    )
+
+    payment_id = models.CharField(max_length=255, unique=True)
+    razorpay_order_id = models.CharField(max_length=255)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payment_events'
+    )
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.payment_id} -> {self.outcome}"
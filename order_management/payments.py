@@ -0,0 +1,289 @@
+"""
+Payment gateway service layer.
+
+Views talk to `get_gateway()` instead of building a razorpay.Client per call. The
+gateway is created once per process and reused, so the HTTP connection pool and
+TLS sessions survive between requests. Every remote call gets:
+
+- connect/read timeouts (PAYMENT_GATEWAY_CONNECT_TIMEOUT / _READ_TIMEOUT),
+- up to PAYMENT_GATEWAY_MAX_RETRIES retries of transient failures with full-jitter
+  exponential backoff,
+- a circuit breaker that fails fast for PAYMENT_GATEWAY_BREAKER_RESET seconds after
+  PAYMENT_GATEWAY_BREAKER_THRESHOLD consecutive failures,
+- latency and outcome metrics (`gateway_metrics`, served by PaymentGatewayMetricsView).
+
+PAYMENT_GATEWAY selects the backend: 'razorpay' (default) or 'fake', an in-process
+gateway with configurable latency and failure rate for offline load tests.
+"""
+
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import razorpay
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from razorpay.errors import GatewayError, ServerError
+from requests.adapters import HTTPAdapter
+
+from config.instrumentation import percentiles
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not complete the call (after retries, or with the circuit open)."""
+
+
+class CircuitOpenError(PaymentGatewayError):
+    pass
+
+
+class TransientGatewayError(Exception):
+    """Raised by backends for failures worth retrying."""
+
+
+def gateway_setting(name, default):
+    return getattr(settings, f'PAYMENT_GATEWAY_{name}', default)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        # Half-open lets calls through; the first outcome closes or re-opens it
+        return self.state != 'open'
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class GatewayMetrics:
+    """Per-operation call outcomes and the latency of the last `window` calls."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def operation(self, name):
+        with self.lock:
+            if name not in self.operations:
+                self.operations[name] = {
+                    'calls': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'rejected': 0,
+                    'latency_ms': deque(maxlen=self.window),
+                }
+            return self.operations[name]
+
+    def record(self, name, outcome, latency=None, retries=0):
+        stats = self.operation(name)
+        with self.lock:
+            stats['calls'] += 1
+            stats[outcome] += 1
+            stats['retries'] += retries
+            if latency is not None:
+                stats['latency_ms'].append(latency * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            operations = {
+                name: {**stats, 'latency_ms': sorted(stats['latency_ms'])}
+                for name, stats in self.operations.items()
+            }
+        for stats in operations.values():
+            stats['failure_rate'] = round(stats['failed'] / stats['calls'], 4) if stats['calls'] else 0
+            stats['latency_ms'] = percentiles(stats['latency_ms'])
+        return operations
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+
+
+gateway_metrics = GatewayMetrics()
+
+
+class PaymentGateway:
+    """Retries, circuit breaking and metrics around a backend's `_create_order`."""
+    name = None
+
+    def __init__(self, key_id, key_secret, max_retries=2, backoff=0.2, max_backoff=2.0,
+                 breaker=None, metrics=None):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker(threshold=5, reset_after=30)
+        self.metrics = metrics or gateway_metrics
+
+    def create_order(self, amount, currency='INR', receipt=None):
+        """Create a gateway order for `amount` in the smallest currency unit (paise)."""
+        data = {'amount': amount, 'currency': currency, 'payment_capture': 1}
+        if receipt:
+            data['receipt'] = receipt
+        return self.call('create_order', self._create_order, data)
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """
+        Local check of a checkout callback: HMAC-SHA256 of "order_id|payment_id" with
+        the key secret, as Razorpay signs it. Never touches the network.
+        """
+        expected = self.sign(order_id, payment_id)
+        return hmac.compare_digest(expected, str(signature))
+
+    def sign(self, order_id, payment_id):
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(str(self.key_secret).encode(), message, hashlib.sha256).hexdigest()
+
+    def call(self, operation, func, *args):
+        if not self.breaker.allow():
+            self.metrics.record(operation, 'rejected')
+            raise CircuitOpenError(f"{self.name} {operation}: circuit open")
+
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = func(*args)
+            except TransientGatewayError as exc:
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    self.metrics.record(operation, 'failed', time.perf_counter() - started, attempt)
+                    raise PaymentGatewayError(f"{self.name} {operation} failed: {exc}") from exc
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                attempt += 1
+            except Exception as exc:
+                # Rejections (bad request and the like) are not the gateway being down
+                self.metrics.record(operation, 'failed', time.perf_counter() - started, attempt)
+                raise PaymentGatewayError(f"{self.name} {operation} rejected: {exc}") from exc
+            else:
+                self.breaker.record_success()
+                self.metrics.record(operation, 'succeeded', time.perf_counter() - started, attempt)
+                return result
+
+    def _create_order(self, data):
+        raise NotImplementedError
+
+
+class RazorpayGateway(PaymentGateway):
+    name = 'razorpay'
+    transient_errors = (requests.ConnectionError, requests.Timeout, ServerError, GatewayError)
+
+    def __init__(self, key_id, key_secret, connect_timeout=3.05, read_timeout=10, pool_size=10, **kwargs):
+        super().__init__(key_id, key_secret, **kwargs)
+        self.timeout = (connect_timeout, read_timeout)
+        session = requests.Session()
+        # Retries are ours; the adapter only pools connections
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret))
+
+    def _create_order(self, data):
+        try:
+            return self.client.order.create(data, timeout=self.timeout)
+        except self.transient_errors as exc:
+            raise TransientGatewayError(str(exc) or type(exc).__name__) from exc
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process stand-in for load tests and local runs. Orders get `order_FAKE...` ids
+    after `latency` seconds; a `failure_rate` share of calls fail as transient errors.
+    `sign()` produces callback signatures the webhook accepts.
+    """
+    name = 'fake'
+
+    def __init__(self, key_id='fake_key', key_secret='fake_secret', latency=0.0, failure_rate=0.0, **kwargs):
+        super().__init__(key_id or 'fake_key', key_secret or 'fake_secret', **kwargs)
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def _create_order(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise TransientGatewayError("simulated gateway failure")
+        return {
+            'id': f"order_FAKE{uuid.uuid4().hex[:14]}",
+            'entity': 'order',
+            'amount': data['amount'],
+            'currency': data['currency'],
+            'receipt': data.get('receipt'),
+            'status': 'created',
+        }
+
+
+GATEWAYS = {
+    'razorpay': RazorpayGateway,
+    'fake': FakeGateway,
+}
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def build_gateway():
+    backend = getattr(settings, 'PAYMENT_GATEWAY', 'razorpay')
+    options = {
+        'max_retries': gateway_setting('MAX_RETRIES', 2),
+        'backoff': gateway_setting('BACKOFF', 0.2),
+        'breaker': CircuitBreaker(
+            threshold=gateway_setting('BREAKER_THRESHOLD', 5),
+            reset_after=gateway_setting('BREAKER_RESET', 30),
+        ),
+    }
+    if backend == 'fake':
+        options.update(
+            latency=gateway_setting('FAKE_LATENCY_MS', 0) / 1000,
+            failure_rate=gateway_setting('FAKE_FAILURE_RATE', 0.0),
+        )
+    else:
+        options.update(
+            connect_timeout=gateway_setting('CONNECT_TIMEOUT', 3.05),
+            read_timeout=gateway_setting('READ_TIMEOUT', 10),
+            pool_size=gateway_setting('POOL_SIZE', 10),
+        )
+    return GATEWAYS[backend](settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET, **options)
+
+
+def get_gateway():
+    """The process-wide gateway, built from settings on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway()
+    return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting=None, **kwargs):
+    global _gateway
+    if setting is None or setting.startswith('PAYMENT_GATEWAY') or setting.startswith('RAZORPAY_'):
+        _gateway = None
@@ -1,11 +1,11 @@
 from rest_framework import serializers
 
-from products.models import Product
+from products.models import Product, ProductImage
 from .models import Cart, Wishlist, Order, OrderItem, Delivery
-from products.serializers import ProductListSerializer
+from products.serializers import ProductCardSerializer
 
 class CartSerializer(serializers.ModelSerializer):
-    product = ProductListSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
         source='product',
@@ -21,8 +21,37 @@ class CartSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+class CartLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartBulkSerializer(serializers.Serializer):
+    add = CartLineSerializer(many=True, required=False)
+    update = CartLineSerializer(many=True, required=False)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, data):
+        add, update = {}, {}
+        for line in data.get('add', []):
+            # Repeated adds of a product accumulate
+            add[line['product_id']] = add.get(line['product_id'], 0) + line['quantity']
+        for line in data.get('update', []):
+            if line['product_id'] in update:
+                raise serializers.ValidationError({'update': [f"Product {line['product_id']} is listed twice."]})
+            update[line['product_id']] = line['quantity']
+        remove = set(data.get('remove', []))
+
+        conflicting = (add.keys() & update.keys()) | ((add.keys() | update.keys()) & remove)
+        if conflicting:
+            raise serializers.ValidationError(
+                f"Products {sorted(conflicting)} appear in more than one of add, update and remove."
+            )
+        if not (add or update or remove):
+            raise serializers.ValidationError("Nothing to change.")
+        return {'add': add, 'update': update, 'remove': sorted(remove)}
+
 class WishlistSerializer(serializers.ModelSerializer):
-    product = ProductListSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
         source='product',
@@ -38,23 +67,34 @@ class WishlistSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+class WishlistMoveSerializer(serializers.Serializer):
+    # Omitted: move the whole wishlist
+    wishlist_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductListSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
     
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
         read_only_fields = ['price']
 
+class DeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Delivery
+        fields = '__all__'
+        read_only_fields = ['created_at', 'updated_at', 'order']
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
+    delivery = DeliverySerializer(read_only=True, allow_null=True)
     status = serializers.CharField(read_only=True)
     
     class Meta:
         model = Order
         fields = [
             'id', 'user', 'total_amount', 'status', 'razorpay_order_id',
-            'razorpay_payment_id', 'razorpay_signature', 'items',
+            'razorpay_payment_id', 'razorpay_signature', 'items', 'delivery',
             'created_at', 'updated_at'
         ]
         read_only_fields = [
@@ -62,16 +102,31 @@ class OrderSerializer(serializers.ModelSerializer):
             'razorpay_payment_id', 'razorpay_signature'
         ]
 
-class DeliverySerializer(serializers.ModelSerializer):
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Order history row; the counts and thumbnail are annotations (OrderViewSet.summary_queryset)."""
+    item_count = serializers.IntegerField(read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+    delivery_status = serializers.CharField(read_only=True, allow_null=True)
+    
     class Meta:
-        model = Delivery
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at', 'order']
+        model = Order
+        fields = [
+            'id', 'total_amount', 'status', 'item_count', 'line_count', 'thumbnail',
+            'delivery_status', 'created_at'
+        ]
+        read_only_fields = fields
+    
+    def get_thumbnail(self, obj):
+        if not obj.thumbnail:
+            return None
+        return ProductImage._meta.get_field('image').storage.url(obj.thumbnail)
 
 class CreateOrderSerializer(serializers.Serializer):
-    cart_items = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Cart.objects.all(),
+    # Plain ids: ownership is checked when checkout locks the lines
+    cart_items = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
         required=True
     )
     shipping_address = serializers.CharField(required=True)
@@ -81,14 +136,6 @@ class CreateOrderSerializer(serializers.Serializer):
     phone = serializers.CharField(required=True)
     expected_delivery = serializers.DateField(required=True)
 
-    def validate_cart_items(self, value):
-        user = self.context['request'].user
-        # Ensure all cart items belong to the current user
-        for item in value:
-            if item.user != user:
-                raise serializers.ValidationError("Cart items must belong to the current user")
-        return value
-
 class RazorpayWebhookSerializer(serializers.Serializer):
     razorpay_order_id = serializers.CharField(required=True)
     razorpay_payment_id = serializers.CharField(required=True)
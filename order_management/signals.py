@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from products.models import Product
+from .cart import invalidate_cart_summary
+from .models import Cart
+
+# Product fields copied into cart summaries
+CART_SUMMARY_FIELDS = ('price', 'vendor_id')
+
+
+def invalidate_carts_holding(product_id):
+    user_ids = list(Cart.objects.filter(product_id=product_id).order_by().values_list('user_id', flat=True))
+    if user_ids:
+        invalidate_cart_summary(*user_ids)
+
+
+@receiver(pre_save, sender=Product)
+def note_cart_summary_changes(sender, instance, raw=False, **kwargs):
+    # products.signals refreshes _loaded_values on post_save, so compare before the write
+    loaded = getattr(instance, '_loaded_values', {})
+    instance._cart_summary_stale = not raw and any(
+        field in loaded and loaded[field] != getattr(instance, field) for field in CART_SUMMARY_FIELDS
+    )
+
+
+@receiver(post_save, sender=Product)
+def invalidate_cart_summaries(sender, instance, **kwargs):
+    if getattr(instance, '_cart_summary_stale', False):
+        instance._cart_summary_stale = False
+        invalidate_carts_holding(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def invalidate_cart_summaries_on_delete(sender, instance, **kwargs):
+    # The cart lines go with the product
+    invalidate_carts_holding(instance.pk)
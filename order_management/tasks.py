@@ -0,0 +1,78 @@
+"""Background side effects of orders, run by the job workers (jobs/queue.py)."""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail, send_mass_mail
+from django.utils import timezone
+
+from jobs.queue import enqueue, task
+from .checkout import leave_pending
+from .models import Order, OrderItem
+
+
+def item_lines(items):
+    return '\n'.join(f"- {item.quantity} x {item.product.name} @ Rs. {item.price}" for item in items)
+
+
+@task('orders.send_confirmation')
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None or not order.user.email:
+        return
+    items = OrderItem.objects.filter(order_id=order_id).select_related('product').only(
+        'quantity', 'price', 'product__name'
+    )
+    send_mail(
+        f"Order #{order.pk} confirmed",
+        f"Thank you for your order.\n\n{item_lines(items)}\n\nTotal: Rs. {order.total_amount}",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+    )
+
+
+@task('orders.notify_vendors')
+def notify_vendors_of_order(order_id):
+    items = OrderItem.objects.filter(order_id=order_id).select_related('product__vendor').only(
+        'quantity', 'price', 'product__name', 'product__vendor__email'
+    )
+    by_vendor = defaultdict(list)
+    for item in items:
+        if item.product.vendor.email:
+            by_vendor[item.product.vendor.email].append(item)
+    send_mass_mail([
+        (
+            f"New paid order #{order_id}",
+            f"Order #{order_id} includes your products:\n\n{item_lines(vendor_items)}",
+            settings.DEFAULT_FROM_EMAIL,
+            [email],
+        )
+        for email, vendor_items in by_vendor.items()
+    ])
+
+
+@task('orders.expire_pending')
+def expire_pending_order(order_id):
+    """Cancel the order and release its stock if it has been PENDING for ORDER_PENDING_TIMEOUT."""
+    updated_at = Order.objects.filter(pk=order_id, status='PENDING').values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return
+    timeout = timedelta(seconds=getattr(settings, 'ORDER_PENDING_TIMEOUT', 3600))
+    remaining = (updated_at + timeout - timezone.now()).total_seconds()
+    if remaining > 0:
+        # A payment retry touched the order since this job was queued
+        enqueue('orders.expire_pending', delay=remaining, order_id=order_id)
+        return
+    leave_pending(order_id, 'CANCELLED', updated_at__lte=timezone.now() - timeout)
+
+
+@task('orders.payment_needs_refund')
+def alert_payment_needs_refund(order_id, payment_id):
+    """Tell the admins about a payment captured for a lapsed order whose stock is gone."""
+    mail_admins(
+        f"Refund due for payment {payment_id}",
+        f"Payment {payment_id} was captured after order #{order_id} was cancelled or failed, "
+        f"and its products are out of stock. The order was left as is; refund the payment "
+        f"from the Razorpay dashboard.",
+    )
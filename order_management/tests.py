@@ -1,3 +1,488 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import work
+from products.benchmarks import QueryBudgetTestCase, seed_catalog
+from products.models import Product
+from .cart import cart_summary_key
+from .models import Cart, Delivery, Order, OrderItem, PaymentEvent, Wishlist
+from .payments import (
+    CircuitBreaker, CircuitOpenError, FakeGateway, GatewayMetrics, PaymentGatewayError,
+    gateway_metrics, get_gateway
+)
+
+
+@override_settings(PAYMENT_GATEWAY='fake', PAYMENT_GATEWAY_FAKE_LATENCY_MS=0, PAYMENT_GATEWAY_FAKE_FAILURE_RATE=0)
+class OrderManagementQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets for every route in order_management/urls.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog()
+        cls.light = cls.catalog['light']
+        cls.heavy = cls.catalog['heavy']
+        cls.admin = cls.catalog['admin']
+        cls.orders = {}
+        for customer in (cls.light, cls.heavy):
+            lines = list(Cart.objects.filter(user=customer).select_related('product'))
+            for n in range(3):
+                order = Order.objects.create(
+                    user=customer,
+                    total_amount=sum(line.product.price * line.quantity for line in lines),
+                    razorpay_order_id=f'order_SEED{customer.pk}_{n}'
+                )
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+                    for line in lines
+                ])
+                Delivery.objects.create(
+                    order=order, shipping_address='Plot 7, MIDC', city='Pune', state='MH',
+                    pin_code='411019', phone='9999999999', expected_delivery=date.today() + timedelta(days=7)
+                )
+            cls.orders[customer.pk] = order
+
+    # Carts
+
+    def test_cart_list(self):
+        url = reverse('cart-list')
+        self.assertQueryBudget('get', url, 6, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_cart_create(self):
+        product = self.catalog['products'][-1]
+        self.assertQueryBudget(
+            'post', reverse('cart-list'), 8, user=self.light,
+            data={'product_id': product.pk, 'quantity': 1}, expected_status=201
+        )
+
+    def test_cart_detail(self):
+        line = Cart.objects.filter(user=self.light).first()
+        url = reverse('cart-detail', args=[line.pk])
+        self.assertQueryBudget('get', url, 8, user=self.light)
+        self.assertQueryBudget('patch', url, 10, user=self.light, data={'quantity': 4})
+        self.assertQueryBudget('delete', url, 4, user=self.light, expected_status=204)
+
+    def test_cart_bulk(self):
+        url = reverse('cart-bulk')
+        products = self.catalog['products']
+        existing = Cart.objects.filter(user=self.light).select_related('product').first()
+        in_cart = set(Cart.objects.filter(user=self.light).values_list('product_id', flat=True))
+        new = [product for product in products if product.pk not in in_cart and product.is_active]
+
+        counts = []
+        for batch in (new[:1], new[1:21]):
+            response, result, _ = self.measure('post', url, user=self.light, data={
+                'add': [{'product_id': product.pk, 'quantity': 2} for product in batch],
+            })
+            self.assertEqual(response.status_code, 200, response.data)
+            counts.append(result['queries'])
+        self.assertEqual(counts[0], counts[1], f"bulk cart query count grows with lines: {counts}")
+
+        response = self.assertQueryBudget('post', url, 13, user=self.light, data={
+            'add': [{'product_id': existing.product_id, 'quantity': 3}, {'product_id': existing.product_id, 'quantity': 1}],
+            'update': [{'product_id': new[0].pk, 'quantity': 7}],
+            'remove': [new[1].pk],
+        })
+        quantities = {line['product']['id']: line['quantity'] for line in response.data}
+        self.assertEqual(quantities[existing.product_id], existing.quantity + 4)
+        self.assertEqual(quantities[new[0].pk], 7)
+        self.assertNotIn(new[1].pk, quantities)
+        self.assertEqual(quantities[new[2].pk], 2)
+
+    def test_cart_bulk_rejects_bad_lines(self):
+        url = reverse('cart-bulk')
+        product = self.catalog['products'][0]
+        self.assertQueryBudget('post', url, 0, user=self.light, data={
+            'update': [{'product_id': product.pk, 'quantity': 1}], 'remove': [product.pk],
+        }, expected_status=400)
+        self.assertQueryBudget('post', url, 1, user=self.light, data={
+            'add': [{'product_id': 0, 'quantity': 1}],
+        }, expected_status=400)
+
+    def test_cart_summary(self):
+        cache.clear()
+        url = reverse('cart-summary')
+        lines = list(Cart.objects.filter(user=self.heavy).select_related('product'))
+
+        response = self.assertQueryBudget('get', url, 2, user=self.heavy)
+        summary = response.data
+        self.assertEqual(summary['line_count'], len(lines))
+        self.assertEqual(summary['item_count'], sum(line.quantity for line in lines))
+        self.assertEqual(Decimal(summary['total']), sum(line.product.price * line.quantity for line in lines))
+        self.assertEqual(sum(Decimal(vendor['subtotal']) for vendor in summary['vendors']), Decimal(summary['total']))
+        # Cached until the cart or a product price changes
+        self.assertQueryBudget('get', url, 0, user=self.heavy)
+
+        line = lines[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            line.product.price += 10
+            line.product.save()
+            # Dropped on commit, so a concurrent read cannot cache the old cart again
+            self.assertIsNotNone(cache.get(cart_summary_key(self.heavy.pk)))
+        self.assertIsNone(cache.get(cart_summary_key(self.heavy.pk)))
+        response = self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertEqual(Decimal(response.data['total']), Decimal(summary['total']) + 10 * line.quantity)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.measure('post', reverse('cart-bulk'), user=self.heavy, data={'remove': [line.product_id]})
+        response = self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertEqual(response.data['line_count'], len(lines) - 1)
+
+    # Wishlists
+
+    def test_wishlist_list(self):
+        url = reverse('wishlist-list')
+        self.assertQueryBudget('get', url, 6, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_wishlist_create(self):
+        product = self.catalog['products'][-1]
+        self.assertQueryBudget(
+            'post', reverse('wishlist-list'), 8, user=self.light,
+            data={'product_id': product.pk}, expected_status=201
+        )
+
+    def test_wishlist_detail(self):
+        line = Wishlist.objects.filter(user=self.light).first()
+        url = reverse('wishlist-detail', args=[line.pk])
+        self.assertQueryBudget('get', url, 8, user=self.light)
+        self.assertQueryBudget('delete', url, 4, user=self.light, expected_status=204)
+
+    def test_wishlist_add_to_cart(self):
+        line = Wishlist.objects.filter(user=self.light).first()
+        self.assertQueryBudget(
+            'post', reverse('wishlist-add-to-cart'), 6, user=self.light,
+            data={'wishlist_id': line.pk}, expected_status=201
+        )
+        self.assertFalse(Wishlist.objects.filter(pk=line.pk).exists())
+        self.assertTrue(Cart.objects.filter(user=self.light, product_id=line.product_id).exists())
+
+    def test_wishlist_move_to_cart(self):
+        url = reverse('wishlist-move-to-cart')
+        self.assertConstantQueries('post', (url, self.light), (url, self.heavy), expected_status=201)
+        self.assertFalse(Wishlist.objects.filter(user__in=[self.light, self.heavy]).exists())
+
+        products = list(Cart.objects.filter(user=self.light).values_list('product_id', 'quantity'))
+        Wishlist.objects.bulk_create([Wishlist(user=self.light, product_id=pk) for pk, _ in products])
+        response = self.assertQueryBudget('post', url, 12, user=self.light, expected_status=201)
+        quantities = {line['product']['id']: line['quantity'] for line in response.data}
+        self.assertEqual(quantities, {pk: quantity + 1 for pk, quantity in products})
+
+    # Orders
+
+    def test_order_list(self):
+        url = reverse('order-list')
+        # COUNT, orders + delivery, items, products, images
+        response = self.assertQueryBudget('get', url, 5, user=self.heavy)
+        self.assertEqual(response.data['count'], 3)
+        order = response.data['results'][0]
+        self.assertEqual(len(order['items']), Cart.objects.filter(user=self.heavy).count())
+        self.assertEqual(order['delivery']['city'], 'Pune')
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+        self.assertQueryBudget('get', f"{url}?pagination=cursor&page_size=2", 4, user=self.heavy)
+
+    def test_order_list_summary(self):
+        url = f"{reverse('order-list')}?mode=summary"
+        response = self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+        row = response.data['results'][0]
+        order = Order.objects.get(pk=row['id'])
+        self.assertEqual(row['line_count'], order.items.count())
+        self.assertEqual(row['item_count'], sum(order.items.values_list('quantity', flat=True)))
+        self.assertEqual(row['delivery_status'], 'PROCESSING')
+        self.assertTrue(row['thumbnail'])
+        self.assertNotIn('items', row)
+
+    def test_order_detail(self):
+        order = self.orders[self.heavy.pk]
+        response = self.assertQueryBudget('get', reverse('order-detail', args=[order.pk]), 4, user=self.heavy)
+        self.assertEqual(response.data['delivery']['order'], order.pk)
+
+    def checkout_data(self, customer):
+        return {
+            'cart_items': list(Cart.objects.filter(user=customer).values_list('pk', flat=True)),
+            'shipping_address': 'Plot 7, MIDC',
+            'city': 'Pune',
+            'state': 'MH',
+            'pin_code': '411019',
+            'phone': '9999999999',
+            'expected_delivery': (date.today() + timedelta(days=7)).isoformat(),
+        }
+
+    def test_order_create(self):
+        url = reverse('order-list')
+        counts = []
+        for customer in (self.light, self.heavy):
+            response, result, _ = self.measure('post', url, user=customer, data=self.checkout_data(customer))
+            self.assertEqual(response.status_code, 201, response.data)
+            counts.append(result['queries'])
+        self.assertEqual(counts[0], counts[1], f"checkout query count grows with cart lines: {counts}")
+
+        data = self.checkout_data(self.heavy)
+        # lock, reserve, order, items, delivery, gateway id, plus SAVEPOINT/RELEASE
+        self.assertQueryBudget('post', url, 8, user=self.heavy, data=data, expected_status=201)
+
+        order = Order.objects.filter(user=self.heavy).latest('pk')
+        self.assertEqual(order.items.count(), len(data['cart_items']))
+        self.assertTrue(order.razorpay_order_id.startswith('order_FAKE'))
+
+    def test_order_create_reserves_stock(self):
+        line = Cart.objects.filter(user=self.light).select_related('product').first()
+        Product.objects.filter(pk=line.product_id).update(stock_quantity=line.quantity + 1)
+        url = reverse('order-list')
+        data = self.checkout_data(self.light)
+
+        self.assertQueryBudget('post', url, 8, user=self.light, data=data, expected_status=201)
+        self.assertEqual(Product.objects.get(pk=line.product_id).stock_quantity, 1)
+
+        response = self.assertQueryBudget('post', url, 4, user=self.light, data=data, expected_status=400)
+        self.assertIn('stock', response.data)
+        self.assertEqual(Order.objects.filter(user=self.light).count(), 4)
+
+    def test_order_create_rejects_foreign_cart_items(self):
+        data = self.checkout_data(self.light)
+        data['cart_items'] += self.checkout_data(self.heavy)['cart_items'][:1]
+        self.assertQueryBudget('post', reverse('order-list'), 4, user=self.light, data=data, expected_status=400)
+
+    def test_order_retry_payment(self):
+        order = self.orders[self.light.pk]
+        self.assertQueryBudget('post', reverse('order-retry-payment', args=[order.pk]), 3, user=self.light)
+
+    def test_order_from_wishlist(self):
+        line = Wishlist.objects.filter(user=self.light).first()
+        self.assertQueryBudget(
+            'post', reverse('order-from-wishlist'), 8, user=self.light,
+            data={'wishlist_id': line.pk}, expected_status=201
+        )
+
+    # Deliveries
+
+    def test_delivery_list(self):
+        url = reverse('delivery-list')
+        self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_delivery_detail(self):
+        delivery = self.orders[self.light.pk].delivery
+        self.assertQueryBudget('get', reverse('delivery-detail', args=[delivery.pk]), 2, user=self.light)
+        self.assertQueryBudget('get', reverse('delivery-track', args=[delivery.pk]), 2, user=self.light)
+
+    # Payment webhook
+
+    def webhook_data(self, order, payment_id='pay_FAKE123'):
+        return {
+            'order_id': order.pk,
+            'razorpay_order_id': order.razorpay_order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': get_gateway().sign(order.razorpay_order_id, payment_id),
+        }
+
+    def test_razorpay_webhook(self):
+        order = self.orders[self.light.pk]
+        url = reverse('razorpay-webhook')
+        response = self.assertQueryBudget('post', url, 7, data=self.webhook_data(order))
+        self.assertEqual(response.data['outcome'], 'PAID')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+        self.assertEqual(order.razorpay_payment_id, 'pay_FAKE123')
+        # The ordered products left the cart; the order keeps its items
+        self.assertFalse(Cart.objects.filter(user=self.light).exists())
+        self.assertTrue(order.items.exists())
+
+        # Redeliveries are answered from the idempotency record
+        for _ in range(3):
+            response = self.assertQueryBudget('post', url, 1, data=self.webhook_data(order))
+            self.assertEqual((response.data['outcome'], response.data['duplicate']), ('PAID', True))
+        self.assertEqual(PaymentEvent.objects.filter(payment_id='pay_FAKE123').count(), 1)
+
+        # A different payment for an order that is no longer pending changes nothing
+        response = self.assertQueryBudget('post', url, 6, data=self.webhook_data(order, 'pay_FAKE456'))
+        self.assertEqual(response.data['outcome'], 'IGNORED')
+        order.refresh_from_db()
+        self.assertEqual(order.razorpay_payment_id, 'pay_FAKE123')
+
+        # Paid orders cannot be sent back to the gateway
+        self.assertQueryBudget(
+            'post', reverse('order-retry-payment', args=[order.pk]), 2, user=self.light, expected_status=409
+        )
+
+    def test_paid_order_notifications(self):
+        order = self.orders[self.light.pk]
+        self.light.email = 'buyer@example.com'
+        self.light.save(update_fields=['email'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.measure('post', reverse('razorpay-webhook'), data=self.webhook_data(order))
+        self.assertEqual(
+            sorted(Job.objects.values_list('name', flat=True)),
+            ['orders.notify_vendors', 'orders.send_confirmation']
+        )
+        work('test-worker')
+        self.assertEqual(Job.objects.filter(status='done').count(), 2)
+        self.assertIn('buyer@example.com', [message.to[0] for message in mail.outbox])
+
+    def stock(self, order):
+        return dict(Product.objects.filter(order_items__order=order).values_list('pk', 'stock_quantity'))
+
+    def test_razorpay_webhook_bad_signature(self):
+        order = self.orders[self.light.pk]
+        stock = self.stock(order)
+        data = {**self.webhook_data(order), 'razorpay_signature': 'forged'}
+        # fail, item quantities, stock, plus SAVEPOINT/RELEASE
+        self.assertQueryBudget('post', reverse('razorpay-webhook'), 5, data=data, expected_status=400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'FAILED')
+        self.assertFalse(PaymentEvent.objects.exists())
+        # The reservation is released once
+        released = {item.product_id: stock[item.product_id] + item.quantity for item in order.items.all()}
+        self.assertEqual(self.stock(order), released)
+        self.measure('post', reverse('razorpay-webhook'), data=data)
+        self.assertEqual(self.stock(order), released)
+
+    def test_order_create_gateway_down(self):
+        data = self.checkout_data(self.light)
+        before = dict(Product.objects.filter(in_carts__user=self.light).values_list('pk', 'stock_quantity'))
+        with override_settings(PAYMENT_GATEWAY_FAKE_FAILURE_RATE=1, PAYMENT_GATEWAY_BACKOFF=0):
+            # checkout, then fail and release as for a bad signature
+            response = self.assertQueryBudget('post', reverse('order-list'), 12, user=self.light,
+                                              data=data, expected_status=502)
+        # The order is committed, FAILED, and holds no stock
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertIsNone(order.razorpay_order_id)
+        self.assertEqual(order.status, 'FAILED')
+        self.assertEqual(self.stock(order), before)
+
+        # retry_payment reserves the stock again
+        self.assertQueryBudget('post', reverse('order-retry-payment', args=[order.pk]), 9, user=self.light)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PENDING')
+        self.assertEqual(self.stock(order), {
+            item.product_id: before[item.product_id] - item.quantity for item in order.items.all()
+        })
+
+    def test_retry_payment_without_stock(self):
+        order = self.orders[self.light.pk]
+        Order.objects.filter(pk=order.pk).update(status='FAILED')
+        Product.objects.filter(order_items__order=order).update(stock_quantity=0)
+        response = self.assertQueryBudget(
+            'post', reverse('order-retry-payment', args=[order.pk]), 7, user=self.light, expected_status=400
+        )
+        self.assertIn('stock', response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'FAILED')
+
+    def test_abandoned_orders_expire(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _, _ = self.measure('post', reverse('order-list'), user=self.light,
+                                          data=self.checkout_data(self.light))
+        order = Order.objects.get(pk=response.data['order_id'])
+        reserved = self.stock(order)
+        job = Job.objects.get(name='orders.expire_pending')
+        self.assertEqual(job.payload, {'order_id': order.pk})
+
+        # Not due yet: the job requeues itself for the rest of the timeout
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            work('test-worker')
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'PENDING')
+        self.assertEqual(Job.objects.filter(name='orders.expire_pending', status='queued').count(), 1)
+
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        Job.objects.filter(status='queued').update(run_after=timezone.now())
+        work('test-worker')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+        self.assertEqual(self.stock(order), {
+            item.product_id: reserved[item.product_id] + item.quantity for item in order.items.all()
+        })
+
+        # A payment captured after expiry reserves the stock again and settles the order
+        response = self.assertQueryBudget('post', reverse('razorpay-webhook'), 12, data=self.webhook_data(order))
+        self.assertEqual(response.data['outcome'], 'PAID')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+        self.assertEqual(self.stock(order), reserved)
+
+    @override_settings(ADMINS=[('Admin', 'admin@example.com')])
+    def test_payment_for_lapsed_order_without_stock(self):
+        order = self.orders[self.light.pk]
+        Order.objects.filter(pk=order.pk).update(status='CANCELLED')
+        Product.objects.filter(order_items__order=order).update(stock_quantity=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.assertQueryBudget('post', reverse('razorpay-webhook'), 8,
+                                              data=self.webhook_data(order))
+        self.assertEqual(response.data['outcome'], 'REFUND')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+        self.assertEqual(PaymentEvent.objects.get(payment_id='pay_FAKE123').order_id, order.pk)
+
+        # The admins are told to refund it
+        self.assertEqual(list(Job.objects.values_list('name', flat=True)), ['orders.payment_needs_refund'])
+        work('test-worker')
+        self.assertEqual(mail.outbox[-1].to, ['admin@example.com'])
+        self.assertIn('pay_FAKE123', mail.outbox[-1].subject)
+
+    def test_retry_payment_gateway_down(self):
+        # An order whose first attempt reached the gateway still gives its stock back
+        order = self.orders[self.light.pk]
+        stock = self.stock(order)
+        with override_settings(PAYMENT_GATEWAY_FAKE_FAILURE_RATE=1, PAYMENT_GATEWAY_BACKOFF=0):
+            self.assertQueryBudget('post', reverse('order-retry-payment', args=[order.pk]), 6,
+                                   user=self.light, expected_status=502)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'FAILED')
+        self.assertEqual(self.stock(order), {
+            item.product_id: stock[item.product_id] + item.quantity for item in order.items.all()
+        })
+
+    def test_payment_gateway_metrics(self):
+        gateway_metrics.reset()
+        self.measure('post', reverse('order-retry-payment', args=[self.orders[self.light.pk].pk]), user=self.light)
+        url = reverse('payment-gateway-metrics')
+        self.assertQueryBudget('get', url, 0, user=self.light, expected_status=403)
+        response = self.assertQueryBudget('get', url, 0, user=self.admin)
+        self.assertEqual(response.data['gateway'], 'fake')
+        self.assertEqual(response.data['operations']['create_order']['succeeded'], 1)
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    def make_gateway(self, failure_rate, **kwargs):
+        return FakeGateway(
+            failure_rate=failure_rate, backoff=0, metrics=GatewayMetrics(),
+            breaker=CircuitBreaker(threshold=2, reset_after=60), **kwargs
+        )
+
+    def test_retries_transient_failures(self):
+        gateway = self.make_gateway(failure_rate=1, max_retries=2)
+        with self.assertRaises(PaymentGatewayError):
+            gateway.create_order(1000)
+        stats = gateway.metrics.snapshot()['create_order']
+        self.assertEqual((stats['failed'], stats['retries']), (1, 2))
+
+    def test_circuit_opens_after_threshold(self):
+        gateway = self.make_gateway(failure_rate=1, max_retries=0)
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayError):
+                gateway.create_order(1000)
+        self.assertEqual(gateway.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            gateway.create_order(1000)
+
+        gateway.breaker.reset_after = 0
+        gateway.failure_rate = 0
+        self.assertEqual(gateway.breaker.state, 'half-open')
+        gateway.create_order(1000)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_signatures(self):
+        gateway = self.make_gateway(failure_rate=0)
+        signature = gateway.sign('order_1', 'pay_1')
+        self.assertTrue(gateway.verify_payment_signature('order_1', 'pay_1', signature))
+        self.assertFalse(gateway.verify_payment_signature('order_1', 'pay_2', signature))
@@ -11,4 +11,5 @@ router.register(r'deliveries', views.DeliveryViewSet, basename='delivery')
 urlpatterns = [
     path('', include(router.urls)),
     path('razorpay/webhook/', views.RazorpayWebhookView.as_view({'post': 'create'}), name='razorpay-webhook'),
+    path('payments/gateway/metrics/', views.PaymentGatewayMetricsView.as_view(), name='payment-gateway-metrics'),
 ]
\ No newline at end of file
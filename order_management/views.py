@@ -2,210 +2,222 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
-import razorpay
+import logging
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
 
-from .models import Cart, OrderItem, Wishlist, Order, Delivery
+from products.models import Product, ProductImage
+from products.pagination import StandardResultsSetPagination
+from products.serializers import ProductCardSerializer
+from .cart import cart_summary, invalidate_cart_summary, move_wishlist_to_cart, update_cart
+from .checkout import (
+    checkout_cart, checkout_wishlist_item, leave_pending, mark_payment_failed, reopen_order, settle_payment
+)
+from .models import Cart, Wishlist, Order, OrderItem, Delivery
+from .payments import PaymentGatewayError, gateway_metrics, get_gateway
 from .serializers import (
-    CartSerializer, WishlistSerializer, OrderSerializer,
-    DeliverySerializer, CreateOrderSerializer, RazorpayWebhookSerializer
+    CartSerializer, CartBulkSerializer, WishlistSerializer, WishlistMoveSerializer, OrderSerializer,
+    OrderSummarySerializer, DeliverySerializer, CreateOrderSerializer, RazorpayWebhookSerializer
 )
-from products.models import Product
+
+logger = logging.getLogger(__name__)
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        # Compare ids: loading obj.user would cost a query per object
+        return obj.user_id == request.user.pk
+
+def product_cards(lookup='product'):
+    """Prefetch of the products behind `lookup` with only what ProductCardSerializer reads."""
+    return Prefetch(lookup, queryset=ProductCardSerializer.optimize_queryset(Product.objects.all()))
+
+def cart_response(request, response_status=status.HTTP_200_OK):
+    """The user's whole cart, as CartViewSet lists it."""
+    lines = Cart.objects.filter(user=request.user).prefetch_related(product_cards())
+    return Response(CartSerializer(lines, many=True, context={'request': request}).data, status=response_status)
 
 class CartViewSet(viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user).select_related('product')
+        queryset = Cart.objects.filter(user=self.request.user)
+        if self.action != 'destroy':
+            queryset = queryset.prefetch_related(product_cards())
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        invalidate_cart_summary(self.request.user.pk)
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_cart_summary(self.request.user.pk)
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_cart_summary(self.request.user.pk)
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Totals, per-vendor subtotals and line quantities, served from the per-user cache."""
+        return Response(cart_summary(request.user.pk))
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Add, update and remove many lines at once; responds with the whole cart."""
+        serializer = CartBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        update_cart(request.user, **serializer.validated_data)
+        return cart_response(request)
 
 class WishlistViewSet(viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
     
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user).select_related('product')
+        queryset = Wishlist.objects.filter(user=self.request.user)
+        if self.action != 'destroy':
+            queryset = queryset.prefetch_related(product_cards())
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
-        wishlist_item = get_object_or_404(
-            Wishlist,
-            id=request.data.get('wishlist_id'),
-            user=request.user
-        )
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            product=wishlist_item.product,
-            defaults={'quantity': 1}
-        )
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-        
-        wishlist_item.delete()
+        if not move_wishlist_to_cart(request.user, [request.data.get('wishlist_id')]):
+            raise Http404("No Wishlist matches the given query.")
         return Response(status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'])
+    def move_to_cart(self, request):
+        """Move every wishlist line (or `wishlist_ids`) to the cart; responds with the whole cart."""
+        serializer = WishlistMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        move_wishlist_to_cart(request.user, serializer.validated_data.get('wishlist_ids'))
+        return cart_response(request, status.HTTP_201_CREATED)
 
 class OrderViewSet(viewsets.ModelViewSet):
+    """
+    Order history is paginated (page numbers, or keyset with ?pagination=cursor).
+    `?mode=summary` lists one compact row per order with annotated counts and the
+    first product thumbnail; the default full mode nests items, product cards
+    and the delivery.
+    """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    pagination_class = StandardResultsSetPagination
+    payable_statuses = ('PENDING', 'FAILED')
+    
+    def is_summary(self):
+        return self.action == 'list' and self.request.query_params.get('mode') == 'summary'
+    
+    def get_serializer_class(self):
+        if self.is_summary():
+            return OrderSummarySerializer
+        return super().get_serializer_class()
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items__product')
+        queryset = Order.objects.filter(user=self.request.user)
+        if self.is_summary():
+            return self.summary_queryset(queryset)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.select_related('delivery').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.order_by('pk')),
+                product_cards('items__product'),
+            )
+        return queryset
+    
+    def summary_queryset(self, queryset):
+        first_image = ProductImage.objects.filter(
+            product__order_items__order=OuterRef('pk')
+        ).order_by('product__order_items__pk', '-is_main', 'created_at').values('image')[:1]
+        return queryset.only('id', 'total_amount', 'status', 'created_at').annotate(
+            item_count=Coalesce(Sum('items__quantity'), 0),
+            line_count=Count('items'),
+            thumbnail=Subquery(first_image),
+            delivery_status=F('delivery__status'),
+        ).order_by('-created_at', '-pk')  # GROUP BY queries drop Meta.ordering
     
     def create(self, request):
         serializer = CreateOrderSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         
-        # Calculate total amount
-        total = 0
-        cart_items = data['cart_items']
-        for item in cart_items:
-            total += item.product.price * item.quantity
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=total,
-            status='PENDING'
-        )
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
+        delivery = {
+            field: data[field]
+            for field in ('shipping_address', 'city', 'state', 'pin_code', 'phone', 'expected_delivery')
+        }
+        # Commits before the gateway call below
+        order = checkout_cart(request.user, data['cart_items'], delivery)
+        return self.start_payment(order, status.HTTP_201_CREATED)
+    
+    def start_payment(self, order, response_status, **updates):
+        """
+        Create the gateway order for a committed Order, store its id (plus `updates`)
+        and return the checkout payload.
+        """
+        try:
+            gateway_order = get_gateway().create_order(
+                amount=int(order.total_amount * 100),  # Amount in paise
+                receipt=f"order_{order.pk}"
+            )
+        except PaymentGatewayError:
+            logger.exception("Gateway order creation failed for order %s", order.pk)
+            # Give the stock back until retry_payment reserves it again. A payment still
+            # made on an earlier attempt's gateway order reserves it in settle_payment
+            leave_pending(order.pk, 'FAILED')
+            return Response(
+                {'error': 'Payment gateway unavailable, retry payment later', 'order_id': order.id},
+                status=status.HTTP_502_BAD_GATEWAY
             )
         
-        # Create delivery
-        Delivery.objects.create(
-            order=order,
-            shipping_address=data['shipping_address'],
-            city=data['city'],
-            state=data['state'],
-            pin_code=data['pin_code'],
-            phone=data['phone'],
-            expected_delivery=data['expected_delivery']
-        )
-        
-        # Initialize Razorpay client
-        client = razorpay.Client(auth=(
-            settings.RAZORPAY_KEY_ID,
-            settings.RAZORPAY_KEY_SECRET
-        ))
-        
-        # Create Razorpay order
-        razorpay_order = client.order.create({
-            'amount': int(total * 100),  # Amount in paise
-            'currency': 'INR',
-            'payment_capture': 1  # Auto capture payment
-        })
-        
-        # Update order with Razorpay ID
-        order.razorpay_order_id = razorpay_order['id']
-        order.save()
+        # Update order with the gateway order ID, unless a webhook settled it meanwhile
+        updates = {'razorpay_order_id': gateway_order['id'], 'updated_at': timezone.now(), **updates}
+        if not Order.objects.filter(pk=order.pk, status__in=self.payable_statuses).update(**updates):
+            return Response(
+                {'error': 'Order is no longer awaiting payment', 'order_id': order.id},
+                status=status.HTTP_409_CONFLICT
+            )
+        for field, value in updates.items():
+            setattr(order, field, value)
         
         return Response({
             'order_id': order.id,
-            'razorpay_order_id': razorpay_order['id'],
-            'amount': total,
+            'razorpay_order_id': gateway_order['id'],
+            'amount': order.total_amount,
             'currency': 'INR',
             'key': settings.RAZORPAY_KEY_ID
-        }, status=status.HTTP_201_CREATED)
+        }, status=response_status)
     
     @action(detail=True, methods=['post'])
     def retry_payment(self, request, pk=None):
         order = self.get_object()
-        
-        # Initialize Razorpay client
-        client = razorpay.Client(auth=(
-            settings.RAZORPAY_KEY_ID,
-            settings.RAZORPAY_KEY_SECRET
-        ))
-        
-        # Create new Razorpay order
-        razorpay_order = client.order.create({
-            'amount': int(order.total_amount * 100),  # Amount in paise
-            'currency': 'INR',
-            'payment_capture': 1  # Auto capture payment
-        })
-        
-        # Update order with new Razorpay ID
-        order.razorpay_order_id = razorpay_order['id']
-        order.status = 'PENDING'
-        order.save()
-        
-        return Response({
-            'order_id': order.id,
-            'razorpay_order_id': razorpay_order['id'],
-            'amount': order.total_amount,
-            'currency': 'INR',
-            'key': settings.RAZORPAY_KEY_ID
-        })
+        if order.status not in self.payable_statuses:
+            return Response(
+                {'error': 'Order is no longer awaiting payment', 'order_id': order.id},
+                status=status.HTTP_409_CONFLICT
+            )
+        # FAILED orders gave their stock back; reserve it again before paying
+        if order.status == 'FAILED' and not reopen_order(order.pk):
+            return Response(
+                {'error': 'Order is no longer awaiting payment', 'order_id': order.id},
+                status=status.HTTP_409_CONFLICT
+            )
+        return self.start_payment(order, status.HTTP_200_OK)
     
     @action(detail=False, methods=['post'])
     def from_wishlist(self, request):
-        wishlist_item = get_object_or_404(
-            Wishlist,
-            id=request.data.get('wishlist_id'),
-            user=request.user
-        )
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=wishlist_item.product.price,
-            status='PENDING'
-        )
-        
-        # Create order item
-        OrderItem.objects.create(
-            order=order,
-            product=wishlist_item.product,
-            quantity=1,
-            price=wishlist_item.product.price
-        )
-        
-        # Initialize Razorpay client
-        client = razorpay.Client(auth=(
-            settings.RAZORPAY_KEY_ID,
-            settings.RAZORPAY_KEY_SECRET
-        ))
-        
-        # Create Razorpay order
-        razorpay_order = client.order.create({
-            'amount': int(wishlist_item.product.price * 100),  # Amount in paise
-            'currency': 'INR',
-            'payment_capture': 1  # Auto capture payment
-        })
-        
-        # Update order with Razorpay ID
-        order.razorpay_order_id = razorpay_order['id']
-        order.save()
-        
-        # Delete wishlist item
-        wishlist_item.delete()
-        
-        return Response({
-            'order_id': order.id,
-            'razorpay_order_id': razorpay_order['id'],
-            'amount': wishlist_item.product.price,
-            'currency': 'INR',
-            'key': settings.RAZORPAY_KEY_ID
-        }, status=status.HTTP_201_CREATED)
+        order = checkout_wishlist_item(request.user, request.data.get('wishlist_id'))
+        if order is None:
+            raise Http404("No Wishlist matches the given query.")
+        return self.start_payment(order, status.HTTP_201_CREATED)
 
 class DeliveryViewSet(viewsets.ModelViewSet):
     serializer_class = DeliverySerializer
@@ -237,39 +249,41 @@ class RazorpayWebhookView(viewsets.ViewSet):
         data = serializer.validated_data
         
         # Verify payment signature
-        client = razorpay.Client(auth=(
-            settings.RAZORPAY_KEY_ID,
-            settings.RAZORPAY_KEY_SECRET
-        ))
-        
-        params = {
-            'razorpay_order_id': data['razorpay_order_id'],
-            'razorpay_payment_id': data['razorpay_payment_id'],
-            'razorpay_signature': data['razorpay_signature']
-        }
-        
-        try:
-            client.utility.verify_payment_signature(params)
-            
-            # Update order status
-            order = Order.objects.get(id=data['order_id'])
-            order.status = 'PAID'
-            order.razorpay_payment_id = data['razorpay_payment_id']
-            order.razorpay_signature = data['razorpay_signature']
-            order.save()
-            
-            # Clear cart items
-            order.items.all().delete()
-            
-            return Response({'status': 'success'}, status=status.HTTP_200_OK)
-        
-        except Exception as e:
-            # Handle verification failure
-            order = Order.objects.get(id=data['order_id'])
-            order.status = 'FAILED'
-            order.save()
-            
+        if not get_gateway().verify_payment_signature(
+            data['razorpay_order_id'],
+            data['razorpay_payment_id'],
+            data['razorpay_signature']
+        ):
+            # Unverified callbacks are not recorded, so they cannot claim a payment id
+            mark_payment_failed(data['order_id'], data['razorpay_order_id'])
             return Response(
                 {'error': 'Signature verification failed'},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+        
+        outcome, duplicate = settle_payment(
+            data['order_id'],
+            data['razorpay_order_id'],
+            data['razorpay_payment_id'],
+            data['razorpay_signature']
+        )
+        return Response(
+            {'status': 'success', 'outcome': outcome, 'duplicate': duplicate},
+            status=status.HTTP_200_OK
+        )
+
+class PaymentGatewayMetricsView(APIView):
+    """Gateway call outcomes, retries and latency percentiles; DELETE clears them."""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        gateway = get_gateway()
+        return Response({
+            'gateway': gateway.name,
+            'circuit': gateway.breaker.state,
+            'operations': gateway_metrics.snapshot()
+        })
+    
+    def delete(self, request):
+        gateway_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,193 @@
+"""
+Async read path for the hot anonymous catalog endpoints.
+
+Plain Django `async def` views (DRF views are sync only) that return the same
+JSON as their DRF counterparts:
+
+    /api/async/products/                          ProductListView
+    /api/async/products/<slug>/                   ProductDetailView
+    /api/async/products/<id>/stats/               product_stats
+    /api/async/products/<id>/availability/        product_availability_check
+
+Queries go through the async ORM (`acount`, `aget`, `aiterator`), and a request
+waiting on the database or on a slow client does not hold a worker thread. That
+only pays off under an ASGI server: the `mhebazar-api-async` service in
+render.yaml runs config.asgi under uvicorn workers, while the sync service keeps
+serving everything else.
+
+The list supports the sync view's filters, ordering, `?fields=`/`?expand=` and
+page-number pagination. Full-text search and cursor pagination stay on the sync
+endpoint.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.http import HttpResponse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from config.renderers import default_renderer
+
+from .availability import ais_range_available
+from .models import Product
+from .pagination import StandardResultsSetPagination
+from .serializers import ProductDetailSerializer, ProductListSerializer, split_param
+from .views import ProductFieldSelectionMixin, ProductListView, date_range_from_params
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def json_response(data, status=200):
+    return HttpResponse(default_renderer().render(data), content_type='application/json', status=status)
+
+
+def not_found(model=Product):
+    return json_response({'detail': f"No {model._meta.object_name} matches the given query."}, status=404)
+
+
+def field_selection(request):
+    return split_param(request.GET.get('fields')) or None, split_param(request.GET.get('expand')) or None
+
+
+def filter_products(queryset, params):
+    """ProductListView's filters, parsed without queries. Returns (queryset, errors)."""
+    filters, errors = {}, {}
+    for name in ('category', 'subcategory', 'vendor'):
+        value = params.get(name)
+        if value:
+            if value.isdigit():
+                filters[f'{name}_id'] = int(value)
+            else:
+                errors[name] = ["Select a valid choice. That choice is not one of the available choices."]
+    for name in ('type', 'selling_method'):
+        value = params.get(name)
+        if value:
+            if value in dict(Product._meta.get_field(name).choices):
+                filters[name] = value
+            else:
+                errors[name] = [f"Select a valid choice. {value} is not one of the available choices."]
+    value = params.get('is_rental_available')
+    if value:
+        if value.lower() in BOOLEAN_VALUES:
+            filters['is_rental_available'] = BOOLEAN_VALUES[value.lower()]
+        else:
+            errors['is_rental_available'] = ["Select a valid choice."]
+    for name, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        value = params.get(name)
+        if value:
+            try:
+                filters[lookup] = Decimal(value)
+            except InvalidOperation:
+                errors[name] = ["Enter a number."]
+    if params.get('search'):
+        errors['search'] = ["Search is served by /api/products/."]
+    return queryset.filter(**filters), errors
+
+
+def order_products(queryset, params):
+    allowed = ProductListView.ordering_fields
+    for term in params.get('ordering', '').split(','):
+        term = term.strip()
+        if term.lstrip('-') in allowed:
+            return queryset.order_by(term)
+    return queryset.order_by(*ProductListView.ordering)
+
+
+def page_params(params):
+    """(page number, page size) like StandardResultsSetPagination, or None for a bad page."""
+    pagination = StandardResultsSetPagination
+    try:
+        page_size = min(int(params[pagination.page_size_query_param]), pagination.max_page_size)
+        if page_size <= 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        page_size = pagination.page_size
+    page = params.get('page', '1')
+    if page == 'last':
+        return 'last', page_size
+    return (int(page), page_size) if page.isdigit() and int(page) > 0 else (None, page_size)
+
+
+def page_link(request, page):
+    url = request.build_absolute_uri()
+    if page == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', page)
+
+
+async def product_list(request):
+    fields, expand = field_selection(request)
+    queryset = ProductListSerializer.optimize_queryset(
+        Product.objects.filter(is_active=True), fields, expand,
+        extra_columns=ProductFieldSelectionMixin.required_columns
+    )
+    queryset, errors = filter_products(queryset, request.GET)
+    if errors:
+        return json_response(errors, status=400)
+    queryset = order_products(queryset, request.GET)
+
+    page, page_size = page_params(request.GET)
+    count = await queryset.acount()
+    pages = max((count + page_size - 1) // page_size, 1)
+    if page == 'last':
+        page = pages
+    if page is None or page > pages:
+        return json_response({'detail': "Invalid page."}, status=404)
+
+    offset = (page - 1) * page_size
+    products = [
+        product async for product in queryset[offset:offset + page_size].aiterator(chunk_size=page_size)
+    ]
+    serializer = ProductListSerializer(
+        products, many=True, fields=fields, expand=expand, context={'request': request}
+    )
+    return json_response({
+        'count': count,
+        'next': page_link(request, page + 1) if page < pages else None,
+        'previous': page_link(request, page - 1) if page > 1 else None,
+        'results': serializer.data,
+    })
+
+
+async def product_detail(request, slug):
+    fields, expand = field_selection(request)
+    queryset = ProductDetailSerializer.optimize_queryset(
+        Product.objects.filter(is_active=True), fields, expand, extra_columns=('slug',)
+    )
+    try:
+        product = await queryset.aget(slug=slug)
+    except Product.DoesNotExist:
+        return not_found()
+    serializer = ProductDetailSerializer(product, fields=fields, expand=expand, context={'request': request})
+    return json_response(serializer.data)
+
+
+async def product_stats(request, product_id):
+    try:
+        product = await Product.objects.select_related('rating_summary').aget(id=product_id)
+    except Product.DoesNotExist:
+        return not_found()
+    return json_response({
+        "average_rating": product.get_average_rating(),
+        "review_count": product.get_review_count(),
+        "rating_distribution": product.get_rating_distribution()
+    })
+
+
+async def product_availability_check(request, product_id):
+    try:
+        product = await Product.objects.only(
+            'id', 'is_rental_available', 'rental_price_per_day'
+        ).aget(id=product_id)
+    except Product.DoesNotExist:
+        return not_found()
+    start_date, end_date, error = date_range_from_params(request.GET)
+    if error:
+        return json_response({"error": error}, status=400)
+
+    is_available = product.is_rental_available and await ais_range_available(product.pk, start_date, end_date)
+    rental_price = product.calculate_rental_price(start_date, end_date) if is_available else 0
+    return json_response({
+        "available": is_available,
+        "rental_price": rental_price,
+        "days": (end_date - start_date).days + 1
+    })
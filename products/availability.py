@@ -0,0 +1,101 @@
+"""
+Rental availability engine.
+
+Bookings are the `approved` and `active` Rental rows of a product. They are loaded
+for a date window in one indexed query (rental_availability_idx), merged into
+non-overlapping inclusive [start, end] intervals, and the free intervals are the
+complement of those within the window. All dates are inclusive, matching
+Rental.total_days = (end - start).days + 1.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from .models import Rental
+
+BLOCKING_STATUSES = ('approved', 'active')
+ONE_DAY = timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or back-to-back (start, end) date pairs."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(booked, window_start, window_end):
+    """Complement of merged `booked` intervals within [window_start, window_end]."""
+    free = []
+    cursor = window_start
+    for start, end in booked:
+        if start > cursor:
+            free.append((cursor, min(start - ONE_DAY, window_end)))
+        cursor = max(cursor, end + ONE_DAY)
+        if cursor > window_end:
+            break
+    if cursor <= window_end:
+        free.append((cursor, window_end))
+    return free
+
+
+def booking_rows(product_ids, window_start, window_end):
+    return Rental.objects.filter(
+        product_id__in=product_ids,
+        status__in=BLOCKING_STATUSES,
+        start_date__lte=window_end,
+        end_date__gte=window_start,
+    ).order_by().values_list('product_id', 'start_date', 'end_date')
+
+
+def merge_booking_rows(rows, product_ids, window_start, window_end):
+    intervals = defaultdict(list)
+    for product_id, start, end in rows:
+        intervals[product_id].append((max(start, window_start), min(end, window_end)))
+    return {
+        product_id: merge_intervals(intervals.get(product_id, []))
+        for product_id in product_ids
+    }
+
+
+def booked_intervals(product_ids, window_start, window_end):
+    """
+    Merged booked intervals per product id overlapping the window, clipped to it.
+    One query regardless of the number of products.
+    """
+    rows = booking_rows(product_ids, window_start, window_end)
+    return merge_booking_rows(rows, product_ids, window_start, window_end)
+
+
+def is_range_available(product_id, start_date, end_date):
+    return not booked_intervals([product_id], start_date, end_date)[product_id]
+
+
+async def ais_range_available(product_id, start_date, end_date):
+    rows = [row async for row in booking_rows([product_id], start_date, end_date)]
+    return not merge_booking_rows(rows, [product_id], start_date, end_date)[product_id]
+
+
+def availability_calendar(products, window_start, window_end):
+    """
+    Booked and free intervals over the window for each of `products`, keyed by
+    product id. Products that are not offered for rent have no free intervals.
+    """
+    products = list(products)
+    booked = booked_intervals([product.pk for product in products], window_start, window_end)
+
+    calendar = {}
+    for product in products:
+        product_booked = booked[product.pk]
+        free = free_intervals(product_booked, window_start, window_end) if product.is_rental_available else []
+        calendar[product.pk] = {
+            'rental_available': product.is_rental_available,
+            'booked': [{'start_date': start, 'end_date': end} for start, end in product_booked],
+            'free': [{'start_date': start, 'end_date': end} for start, end in free],
+        }
+    return calendar
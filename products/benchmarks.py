@@ -0,0 +1,235 @@
+"""
+Query-count budget harness shared by the products and order_management test suites.
+
+`seed_catalog()` bulk-loads a realistic catalog (vendors, products with images and
+reviews, carts, quotes, rentals) and `QueryBudgetTestCase` hits endpoints while
+recording SQL query count, DB time and wall time per request.
+
+Run locally with no network:
+
+    DB_ENGINE=sqlite python manage.py test products order_management
+
+Environment knobs:
+    QUERY_BUDGET_PRODUCTS   number of seeded products (default 2000)
+    QUERY_BUDGET_REPORT     path of a JSON file the per-request results are written to
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from .models import (
+    Category, Subcategory, Product, ProductImage, Cart, Wishlist,
+    Quote, Rental, Review
+)
+
+User = get_user_model()
+
+BUDGET_RESULTS = []
+
+
+def make_user(label, is_vendor=False, is_staff=False):
+    fields = {User.USERNAME_FIELD: f"{label}@example.com", 'is_staff': is_staff}
+    if User.USERNAME_FIELD != 'email':
+        fields['email'] = f"{label}@example.com"
+    if any(field.name == 'is_vendor' for field in User._meta.get_fields()):
+        fields['is_vendor'] = is_vendor
+    user = User.objects.create(**fields)
+    # Views check request.user.is_vendor; keep it on the instance for force_authenticate
+    user.is_vendor = is_vendor
+    return user
+
+
+def seed_catalog(products=None, vendors=20, categories=8, subcategories_per_category=4,
+                 images_per_product=2, reviewers=5, heavy_lines=30):
+    """
+    Bulk-create a catalog and the per-customer rows the user-facing endpoints read.
+
+    Returns a dict with the interesting objects: vendors, a `light` customer with a
+    couple of cart/wishlist/quote/rental rows and a `heavy` customer with
+    `heavy_lines` of each, so list endpoints can be checked for N+1 growth.
+    """
+    from order_management.models import Cart as OrderCart, Wishlist as OrderWishlist
+
+    products = products or int(os.getenv('QUERY_BUDGET_PRODUCTS', 2000))
+
+    vendor_users = [make_user(f"vendor{i}", is_vendor=True) for i in range(vendors)]
+    reviewer_users = [make_user(f"reviewer{i}") for i in range(reviewers)]
+    light = make_user("light")
+    heavy = make_user("heavy")
+    admin = make_user("admin", is_staff=True)
+
+    category_objs = Category.objects.bulk_create([
+        Category(name=f"Category {i}", slug=f"category-{i}") for i in range(categories)
+    ])
+    subcategory_objs = Subcategory.objects.bulk_create([
+        Subcategory(category=category, name=f"{category.name} Sub {j}", slug=f"sub-{j}")
+        for category in category_objs
+        for j in range(subcategories_per_category)
+    ])
+
+    product_objs = []
+    for i in range(products):
+        subcategory = subcategory_objs[i % len(subcategory_objs)]
+        rental = i % 3 == 0
+        product_objs.append(Product(
+            vendor=vendor_users[i % vendors],
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            name=f"Forklift {i}",
+            slug=f"forklift-{i}",
+            description=f"Electric forklift model {i} with {i % 5 + 1} ton capacity",
+            manufacturer=f"Maker {i % 17}",
+            model=f"FL-{i}",
+            price=Decimal(1000 + i),
+            type=('new', 'used', 'rental')[i % 3],
+            selling_method=('direct', 'quote', 'both')[i % 3],
+            stock_quantity=1000,
+            is_rental_available=rental,
+            rental_price_per_day=Decimal(50 + i % 10) if rental else None,
+        ))
+    product_objs = Product.objects.bulk_create(product_objs, batch_size=500)
+
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=f"uploads/products/{product.pk}/images/{n}.jpg", is_main=n == 0)
+        for product in product_objs
+        for n in range(images_per_product)
+    ], batch_size=1000)
+
+    Review.objects.bulk_create([
+        Review(
+            user=reviewer, product=product, stars=(product.pk + n) % 5 + 1,
+            title="Solid machine", message="Works as described", is_approved=n % 4 != 3
+        )
+        for product in product_objs[:max(products // 2, 1)]
+        for n, reviewer in enumerate(reviewer_users)
+    ], batch_size=1000)
+    call_command('rebuild_rating_summaries', verbosity=0, stdout=open(os.devnull, 'w'))
+
+    rental_products = [product for product in product_objs if product.is_rental_available]
+    for customer, lines in ((light, 2), (heavy, heavy_lines)):
+        picked = product_objs[:lines]
+        Cart.objects.bulk_create([Cart(user=customer, product=p, quantity=2) for p in picked])
+        Wishlist.objects.bulk_create([Wishlist(user=customer, product=p) for p in picked])
+        OrderCart.objects.bulk_create([OrderCart(user=customer, product=p, quantity=2) for p in picked])
+        OrderWishlist.objects.bulk_create([OrderWishlist(user=customer, product=p) for p in picked])
+        Quote.objects.bulk_create([
+            Quote(user=customer, product=p, quantity=1, message="Need a quote")
+            for p in picked
+        ])
+        start = date.today() + timedelta(days=30)
+        Rental.objects.bulk_create([
+            Rental(
+                user=customer, product=p, start_date=start, end_date=start + timedelta(days=4),
+                total_days=5, total_price=p.rental_price_per_day * 5,
+                delivery_address="Plot 7, MIDC", status='approved'
+            )
+            for p in rental_products[:lines]
+        ])
+    call_command('refresh_vendor_stats', verbosity=0, stdout=open(os.devnull, 'w'))
+
+    return {
+        'vendors': vendor_users,
+        'light': light,
+        'heavy': heavy,
+        'admin': admin,
+        'categories': category_objs,
+        'products': product_objs,
+        'rental_products': rental_products,
+    }
+
+
+def write_budget_report(path=None):
+    path = path or os.getenv('QUERY_BUDGET_REPORT')
+    if not path:
+        return
+    with open(path, 'w') as report:
+        json.dump(BUDGET_RESULTS, report, indent=2)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    APITestCase with assertions over per-request SQL query counts.
+
+    Every measured request is appended to BUDGET_RESULTS and written out to
+    QUERY_BUDGET_REPORT when the class finishes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Cached catalog data would outlive the per-test transaction rollback
+        cache.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        write_budget_report()
+
+    def measure(self, method, url, user=None, data=None, name=None, **extra):
+        if method != 'get':
+            extra.setdefault('format', 'json')
+        db_time = 0.0
+
+        def timed_execute(execute, sql, params, many, context):
+            nonlocal db_time
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db_time += time.perf_counter() - started
+
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries, connection.execute_wrapper(timed_execute):
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data=data, **extra)
+            wall_time = time.perf_counter() - started
+        self.client.force_authenticate(user=None)
+
+        result = {
+            'endpoint': name or url,
+            'method': method.upper(),
+            'url': url,
+            'status': response.status_code,
+            'queries': len(queries),
+            'db_time_ms': round(db_time * 1000, 3),
+            'wall_time_ms': round(wall_time * 1000, 3),
+        }
+        return response, result, queries
+
+    def assertQueryBudget(self, method, url, budget, user=None, data=None, name=None,
+                          expected_status=200, **extra):
+        response, result, queries = self.measure(method, url, user=user, data=data, name=name, **extra)
+        result['budget'] = budget
+        BUDGET_RESULTS.append(result)
+
+        self.assertEqual(
+            response.status_code, expected_status,
+            f"{result['method']} {url} returned {response.status_code}: {getattr(response, 'data', '')}"
+        )
+        self.assertLessEqual(
+            result['queries'], budget,
+            f"{result['method']} {url} ran {result['queries']} queries (budget {budget}):\n"
+            + "\n".join(q['sql'] for q in queries.captured_queries)
+        )
+        return response
+
+    def assertConstantQueries(self, method, small, large, name=None, expected_status=200):
+        """
+        Run the same endpoint against a small and a large result set, each given as
+        (url, user), and fail when the query count grows with the number of rows.
+        """
+        counts = []
+        for url, user in (small, large):
+            response, result, _ = self.measure(method, url, user=user, name=name)
+            self.assertEqual(response.status_code, expected_status, f"{url}: {getattr(response, 'data', '')}")
+            counts.append(result['queries'])
+        self.assertEqual(counts[0], counts[1], f"{name or small[0]} query count grows with rows: {counts}")
@@ -0,0 +1,269 @@
+"""
+Bulk product import and export for vendors.
+
+Imports read CSV or JSONL incrementally and handle `chunk_size` rows at a time:
+each row is validated with ProductImportRowSerializer (the ProductCreateUpdateSerializer
+rules, with categories resolved from an in-memory lookup), then the chunk is upserted
+by slug in its own transaction: a plain bulk_create for new slugs and an
+INSERT ... ON CONFLICT DO UPDATE bulk_create for the vendor's existing ones.
+Memory is bounded by the chunk size and the error report cap, not the file size.
+
+Bulk writes skip model signals, so search vectors are refreshed per chunk and the
+catalog cache version and vendor stats once at the end.
+
+Exports stream the vendor's catalog with iterator(), in the same columns the
+importer accepts, so an export can be edited and imported back.
+"""
+
+import codecs
+import csv
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .cache import bump_catalog_version
+from .models import Category, Product, Subcategory, VendorStats
+from .response_cache import CATALOG_TAG, invalidate_tags
+from .search import update_search_vectors
+from .serializers import ProductImportRowSerializer
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+PRODUCT_FIELDS = (
+    'slug', 'name', 'category', 'subcategory', 'description', 'meta_title',
+    'meta_description', 'manufacturer', 'model', 'product_details', 'price', 'type',
+    'selling_method', 'is_active', 'stock_quantity', 'min_order_quantity',
+    'is_rental_available', 'rental_price_per_day', 'min_rental_days',
+    'online_payment_enabled',
+)
+JSON_FIELDS = ('product_details',)
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def guess_format(filename, default='csv'):
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return default
+
+
+def decode_lines(lines, encoding='utf-8-sig'):
+    """Decode an iterable of byte lines (an uploaded or opened binary file) lazily."""
+    return codecs.iterdecode(lines, encoding)
+
+
+def iter_csv_rows(lines):
+    """
+    Yield (line number, values, error) from CSV text lines. Empty cells are left out
+    so the field keeps its default or current value; JSON columns are parsed.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        values = {}
+        error = None
+        for field, value in row.items():
+            if field is None or value is None or value == '':
+                continue
+            field = field.strip()
+            if field in JSON_FIELDS:
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    error = {field: ["Value must be valid JSON."]}
+            values[field] = value
+        yield reader.line_num, values, error
+
+
+def iter_jsonl_rows(lines):
+    """Yield (line number, values, error) from JSON Lines text, skipping blank lines."""
+    for line_num, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            values = json.loads(line)
+        except ValueError:
+            yield line_num, {}, {'non_field_errors': ["Line is not valid JSON."]}
+            continue
+        if not isinstance(values, dict):
+            yield line_num, {}, {'non_field_errors': ["Line must be a JSON object."]}
+            continue
+        yield line_num, values, None
+
+
+def iter_rows(lines, file_format):
+    if file_format == 'csv':
+        return iter_csv_rows(lines)
+    if file_format == 'jsonl':
+        return iter_jsonl_rows(lines)
+    raise ImportFormatError(f"Unsupported format {file_format!r}; expected one of {', '.join(FORMATS)}")
+
+
+class ProductImporter:
+    """
+    Upserts a vendor's products from parsed rows and collects a per-row report.
+
+        importer = ProductImporter(vendor)
+        report = importer.run(iter_rows(lines, 'csv'))
+    """
+
+    def __init__(self, vendor, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.vendor = vendor
+        self.chunk_size = chunk_size
+        self.context = {
+            'categories': Category.objects.in_bulk(),
+            'subcategories': Subcategory.objects.in_bulk(),
+        }
+        # One serializer validates every row: building ModelSerializer fields per row
+        # costs more than the validation itself
+        self.serializer = ProductImportRowSerializer(context=self.context)
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+
+        if self.created or self.updated:
+            bump_catalog_version()
+            invalidate_tags(CATALOG_TAG)
+            VendorStats.rebuild_for(self.vendor.pk)
+        return self.report()
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+    def add_error(self, line, slug, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'slug': slug, 'errors': errors})
+
+    def validate_chunk(self, chunk):
+        valid = {}
+        for line, values, error in chunk:
+            self.rows += 1
+            slug = values.get('slug')
+            if error:
+                self.add_error(line, slug, error)
+                continue
+
+            try:
+                data = self.serializer.run_validation(values)
+            except ValidationError as exc:
+                self.add_error(line, slug, as_serializer_error(exc))
+                continue
+
+            if data['subcategory'].category_id != data['category'].pk:
+                self.add_error(line, slug, {'subcategory': ["Subcategory does not belong to the category."]})
+                continue
+            if data['slug'] in valid:
+                self.add_error(line, slug, {'slug': ["Duplicate slug in the same chunk."]})
+                continue
+            valid[data['slug']] = (line, data)
+        return valid
+
+    def import_chunk(self, chunk):
+        valid = self.validate_chunk(chunk)
+        if not valid:
+            return
+
+        with transaction.atomic():
+            existing = Product.objects.select_for_update().filter(slug__in=list(valid)).in_bulk(field_name='slug')
+            to_create, to_update, update_fields = [], [], set()
+
+            for slug, (line, data) in valid.items():
+                product = existing.get(slug)
+                if product is None:
+                    to_create.append(Product(vendor=self.vendor, **data))
+                elif product.vendor_id != self.vendor.pk:
+                    self.add_error(line, slug, {'slug': ["Slug is already used by another vendor."]})
+                else:
+                    for field, value in data.items():
+                        setattr(product, field, value)
+                    update_fields.update(data)
+                    to_update.append(product)
+
+            if to_create:
+                Product.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            if to_update:
+                # INSERT ... ON CONFLICT (slug) DO UPDATE: one statement per batch, where
+                # bulk_update builds a CASE per field and row. The rows are ours and locked.
+                update_fields.discard('slug')
+                Product.objects.bulk_create(
+                    to_update,
+                    batch_size=self.chunk_size,
+                    update_conflicts=True,
+                    unique_fields=['slug'],
+                    update_fields=sorted(update_fields) + ['updated_at'],
+                )
+            update_search_vectors(Product.objects.filter(slug__in=list(valid), vendor=self.vendor))
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_value(field, value):
+    if value is None:
+        return ''
+    if field in JSON_FIELDS:
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def iter_export(queryset, file_format, chunk_size=2000):
+    """Yield the products in `queryset` as CSV or JSONL text chunks, one row at a time."""
+    rows = queryset.order_by('pk').values_list(*PRODUCT_FIELDS).iterator(chunk_size=chunk_size)
+
+    if file_format == 'jsonl':
+        for row in rows:
+            record = {field: export_value(value) for field, value in zip(PRODUCT_FIELDS, row)}
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+        return
+
+    if file_format != 'csv':
+        raise ImportFormatError(f"Unsupported format {file_format!r}; expected one of {', '.join(FORMATS)}")
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(PRODUCT_FIELDS)
+    for row in rows:
+        yield writer.writerow([csv_value(field, value) for field, value in zip(PRODUCT_FIELDS, row)])
@@ -0,0 +1,67 @@
+"""
+Cache helpers for catalog-derived data.
+
+Catalog aggregates (facet counts and friends) are cached under keys that embed a
+catalog version. Product, Category and Subcategory writes bump the version (see
+products.signals) once they commit, which orphans every older entry at once
+instead of hunting down individual keys. The version lives in the default cache,
+which settings point at a backend shared by all workers (Redis or the database),
+so a write in one worker retires the entries of every other.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'products:catalog-version'
+
+
+def initial_version():
+    # Start from the clock, not 1: in-process snapshots (products.tree) outlive a
+    # cache flush and must not match a recreated counter
+    return time.time_ns()
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Retire cached catalog aggregates once the current transaction commits (at
+    once outside one). Bumping earlier would let a concurrent read cache the
+    pre-commit catalog under the new version.
+    """
+    transaction.on_commit(_incr_catalog_version)
+
+
+def _incr_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key evicted or never set: any fresh value differs from cached entries' versions
+        cache.add(CATALOG_VERSION_KEY, initial_version(), timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def normalized_params_key(params, ignore=()):
+    """Stable digest of query params regardless of their order in the URL."""
+    items = sorted(
+        (key, value)
+        for key in params
+        if key not in ignore
+        for value in params.getlist(key)
+        if value != ''
+    )
+    return hashlib.md5(urlencode(items).encode('utf-8')).hexdigest()
+
+
+def catalog_cache_key(prefix, params, ignore=()):
+    return f"products:{prefix}:v{get_catalog_version()}:{normalized_params_key(params, ignore)}"
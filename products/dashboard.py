@@ -0,0 +1,102 @@
+"""
+Vendor dashboard data.
+
+Totals come from the VendorStats counters (one primary-key lookup) or, when
+VENDOR_STATS_MATERIALIZED is off, from VendorStats.compute's conditional
+aggregates. Daily series are one GROUP BY per source over the requested window.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from order_management.models import OrderItem
+
+from .models import Quote, Rental, VendorStats
+
+DEFAULT_SERIES_DAYS = 30
+MAX_SERIES_DAYS = 366
+
+
+def vendor_stats(vendor_id):
+    if getattr(settings, 'VENDOR_STATS_MATERIALIZED', True):
+        return VendorStats.for_vendor(vendor_id)
+    totals = VendorStats.compute([vendor_id]).get(vendor_id, {})
+    return VendorStats(vendor_id=vendor_id, **totals)
+
+
+def dashboard_payload(stats):
+    return {
+        "products": {
+            "total": stats.products_total,
+            "active": stats.products_active,
+            "inactive": stats.products_total - stats.products_active
+        },
+        "quotes": {
+            "total": stats.quotes_total,
+            "pending": stats.quotes_pending
+        },
+        "rentals": {
+            "total": stats.rentals_total,
+            "active": stats.rentals_active
+        },
+        "reviews": {
+            "total": stats.reviews_total,
+            "average_rating": stats.average_rating
+        }
+    }
+
+
+def daily_series(vendor_id, days=DEFAULT_SERIES_DAYS):
+    """
+    Per-day quotes, rentals, orders and paid revenue for the vendor's products over
+    the last `days` days (today included), with zero-filled gaps.
+    """
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    since = datetime.combine(first_day, time.min)
+    if settings.USE_TZ:
+        since = timezone.make_aware(since)
+
+    quotes = (
+        Quote.objects.filter(product__vendor_id=vendor_id, created_at__gte=since)
+        .order_by().annotate(day=TruncDate('created_at'))
+        .values('day').annotate(count=Count('id'))
+    )
+    rentals = (
+        Rental.objects.filter(product__vendor_id=vendor_id, created_at__gte=since)
+        .order_by().annotate(day=TruncDate('created_at'))
+        .values('day').annotate(count=Count('id'))
+    )
+    orders = (
+        OrderItem.objects.filter(product__vendor_id=vendor_id, order__created_at__gte=since)
+        .order_by().annotate(day=TruncDate('order__created_at'))
+        .values('day').annotate(
+            count=Count('order', distinct=True),
+            revenue=Sum(
+                F('price') * F('quantity'),
+                filter=Q(order__status='PAID'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        )
+    )
+
+    series = {
+        first_day + timedelta(days=offset): {"quotes": 0, "rentals": 0, "orders": 0, "revenue": 0}
+        for offset in range(days)
+    }
+    for row in quotes:
+        if row['day'] in series:
+            series[row['day']]["quotes"] = row['count']
+    for row in rentals:
+        if row['day'] in series:
+            series[row['day']]["rentals"] = row['count']
+    for row in orders:
+        if row['day'] in series:
+            series[row['day']]["orders"] = row['count']
+            series[row['day']]["revenue"] = row['revenue'] or 0
+
+    return [{"date": day, **values} for day, values in series.items()]
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Product
+
+# Lower bounds of the price buckets; the last bucket is open ended
+PRICE_BUCKETS = getattr(
+    settings,
+    'PRODUCT_FACET_PRICE_BUCKETS',
+    [0, 10000, 50000, 100000, 500000, 1000000]
+)
+
+
+def price_bucket_ranges():
+    bounds = list(PRICE_BUCKETS)
+    return [
+        (low, bounds[i + 1] if i + 1 < len(bounds) else None)
+        for i, low in enumerate(bounds)
+    ]
+
+
+def price_bucket_filter(low, high):
+    condition = Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def compute_facets(queryset):
+    """
+    Facet counts for a filtered Product queryset in three grouped queries: one
+    conditional aggregate for the fixed-cardinality facets and one GROUP BY each
+    for categories and subcategories.
+    """
+    queryset = queryset.order_by()
+
+    aggregates = {'total': Count('id')}
+    for value, _ in Product.TYPE_CHOICES:
+        aggregates[f"type__{value}"] = Count('id', filter=Q(type=value))
+    for value, _ in Product.SELLING_METHOD_CHOICES:
+        aggregates[f"selling_method__{value}"] = Count('id', filter=Q(selling_method=value))
+    aggregates['rental__true'] = Count('id', filter=Q(is_rental_available=True))
+    buckets = price_bucket_ranges()
+    for i, (low, high) in enumerate(buckets):
+        aggregates[f"price__{i}"] = Count('id', filter=price_bucket_filter(low, high))
+    totals = queryset.aggregate(**aggregates)
+
+    categories = queryset.values('category_id', 'category__name').annotate(
+        count=Count('id')
+    ).order_by('category__name')
+    subcategories = queryset.values(
+        'subcategory_id', 'subcategory__name', 'subcategory__category_id'
+    ).annotate(count=Count('id')).order_by('subcategory__name')
+
+    return {
+        'total': totals['total'],
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'subcategories': [
+            {
+                'id': row['subcategory_id'],
+                'name': row['subcategory__name'],
+                'category_id': row['subcategory__category_id'],
+                'count': row['count'],
+            }
+            for row in subcategories
+        ],
+        'type': {value: totals[f"type__{value}"] for value, _ in Product.TYPE_CHOICES},
+        'selling_method': {
+            value: totals[f"selling_method__{value}"] for value, _ in Product.SELLING_METHOD_CHOICES
+        },
+        'is_rental_available': {
+            'true': totals['rental__true'],
+            'false': totals['total'] - totals['rental__true'],
+        },
+        'price': [
+            {'min': low, 'max': high, 'count': totals[f"price__{i}"]}
+            for i, (low, high) in enumerate(buckets)
+        ],
+    }
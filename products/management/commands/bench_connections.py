@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the same GET with a new database connection per request and with "
+        "reused connections. Point it at the Postgres you want to measure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='/api/products/?page_size=20',
+            help="Path to request."
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help="Requests per mode."
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=60,
+            help="CONN_MAX_AGE of the reused mode."
+        )
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        pooled = 'pool' in connection.settings_dict.get('OPTIONS', {})
+        modes = [
+            ('pooled' if pooled else 'per-request', 0),
+            ('persistent', options['max_age']),
+        ]
+        if pooled:
+            # Django refuses persistent connections on top of a pool
+            modes.pop()
+
+        connects = 0
+
+        def count_connect(sender, **kwargs):
+            nonlocal connects
+            connects += 1
+
+        client = Client()
+        original_max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection_created.connect(count_connect)
+        try:
+            # Cached responses would skip the database altogether
+            with override_settings(RESPONSE_CACHE_ENABLED=False):
+                for label, max_age in modes:
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                    connection.close()
+                    client.get(options['url'])  # warm up imports and the URL resolver
+                    close_old_connections()
+
+                    connects = 0
+                    timings = []
+                    for _ in range(options['requests']):
+                        started = time.perf_counter()
+                        response = client.get(options['url'])
+                        # What request_finished does in a real server
+                        close_old_connections()
+                        timings.append((time.perf_counter() - started) * 1000)
+                    self.report(label, response.status_code, timings, connects)
+        finally:
+            connection_created.disconnect(count_connect)
+            connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+            connection.close()
+
+    def report(self, label, status_code, timings, connects):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label:<12} status={status_code} requests={len(timings)} connects={connects} "
+            f"p50={statistics.median(timings):.2f}ms p95={p95:.2f}ms mean={statistics.fmean(timings):.2f}ms"
+        )
@@ -0,0 +1,83 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from config.renderers import ORJSONParser, ORJSONRenderer, orjson
+from products.models import Product
+from products.serializers import ProductListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Time DRF's JSONRenderer/JSONParser against the orjson ones on pages of "
+        "ProductListSerializer output from this database, and check that both "
+        "renderers produce the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help="Products per page.")
+        parser.add_argument('--pages', type=int, default=5, help="Pages to render.")
+        parser.add_argument('--repeat', type=int, default=50, help="Renders/parses per page and backend.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed")
+        page_size = options['page_size']
+        request = RequestFactory().get('/api/products/')
+        queryset = ProductListSerializer.optimize_queryset(
+            Product.objects.filter(is_active=True).order_by('-created_at', '-id'), None, None
+        )
+        # Serialize once up front: only encoding and decoding are timed
+        pages = []
+        for number in range(options['pages']):
+            products = list(queryset[number * page_size:(number + 1) * page_size])
+            if not products:
+                break
+            pages.append({
+                'count': len(products),
+                'next': None,
+                'previous': None,
+                'results': ProductListSerializer(products, many=True, context={'request': request}).data,
+            })
+        if not pages:
+            raise CommandError("No active products to serialize")
+
+        backends = (
+            ('stdlib', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+        )
+        rendered = {}
+        timings = {}
+        for label, renderer, parser in backends:
+            render_ms, parse_ms = [], []
+            rendered[label] = []
+            for page in pages:
+                content = renderer.render(page)
+                rendered[label].append(content)
+                render_ms.append(self.time(lambda: renderer.render(page), options['repeat']))
+                parse_ms.append(self.time(lambda: parser.parse(io.BytesIO(content)), options['repeat']))
+            timings[label] = (statistics.fmean(render_ms), statistics.fmean(parse_ms))
+
+        size = statistics.fmean(len(content) for content in rendered['stdlib'])
+        self.stdout.write(f"{len(pages)} pages of up to {page_size} products, {size / 1024:.1f} KiB each")
+        for label, (render, parse) in timings.items():
+            self.stdout.write(f"{label:<7} render={render:.3f}ms parse={parse:.3f}ms")
+        stdlib_render, stdlib_parse = timings['stdlib']
+        orjson_render, orjson_parse = timings['orjson']
+        self.stdout.write(
+            f"speedup render={stdlib_render / orjson_render:.1f}x parse={stdlib_parse / orjson_parse:.1f}x"
+        )
+        identical = rendered['stdlib'] == rendered['orjson']
+        self.stdout.write(f"identical bytes: {'yes' if identical else 'NO'}")
+
+    def time(self, func, repeat):
+        """Mean milliseconds per call."""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from products.bulk import FORMATS, iter_export
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream a vendor's products to stdout or a file as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, required=True, help="Vendor user id.")
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        chunks = iter_export(Product.objects.filter(vendor_id=options['vendor']), options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+            handle.writelines(chunks)
@@ -0,0 +1,45 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import (
+    DEFAULT_CHUNK_SIZE, FORMATS, ImportFormatError, ProductImporter, decode_lines, guess_format, iter_rows
+)
+
+
+class Command(BaseCommand):
+    help = "Create or update a vendor's products by slug from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file to import.")
+        parser.add_argument('--vendor', type=int, required=True, help="Vendor user id.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows validated and written per transaction."
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            vendor = User.objects.get(pk=options['vendor'])
+        except User.DoesNotExist:
+            raise CommandError(f"Vendor {options['vendor']} does not exist.")
+
+        file_format = options['format'] or guess_format(options['path'])
+        importer = ProductImporter(vendor, chunk_size=options['chunk_size'])
+        try:
+            with open(options['path'], 'rb') as handle:
+                report = importer.run(iter_rows(decode_lines(handle), file_format))
+        except (OSError, ImportFormatError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(json.dumps(error, default=str))
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['error_count']} rejected."
+        ))
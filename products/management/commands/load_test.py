@@ -0,0 +1,126 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class LoadTest:
+    """Closed-loop HTTP/1.1 load generator: `concurrency` clients, one request in flight each."""
+
+    def __init__(self, url, concurrency, duration, slow_clients, timeout):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError("--url must be an absolute http:// URL")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        self.request = (
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "Accept: application/json\r\nConnection: close\r\n\r\n"
+        ).encode('ascii')
+        self.concurrency = concurrency
+        self.duration = duration
+        self.slow_clients = slow_clients
+        self.timeout = timeout
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    async def fetch(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(self.request)
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()  # Connection: close, so the body ends at EOF
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+    async def client(self, deadline):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(self.fetch(), self.timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                self.errors += 1
+                continue
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def slow_client(self, deadline):
+        """Sends its request headers one byte per second, like a client on a bad link."""
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            return
+        try:
+            for byte in self.request:
+                if time.perf_counter() >= deadline:
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(1)
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        deadline = time.perf_counter() + self.duration
+        slow = [asyncio.create_task(self.slow_client(deadline)) for _ in range(self.slow_clients)]
+        started = time.perf_counter()
+        await asyncio.gather(*(self.client(deadline) for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+        return elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure throughput and latency of one URL on a running server, e.g. the sync "
+        "service (gunicorn config.wsgi) against the ASGI one (gunicorn config.asgi -k "
+        "uvicorn.workers.UvicornWorker) with /api/products/ and /api/async/products/. "
+        "--slow-clients adds connections that trickle their request, which tie up "
+        "sync workers but not an event loop. Run both services with "
+        "RESPONSE_CACHE_ENABLED=false to compare views rather than cache hits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True, help="Absolute http:// URL to request.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to run.")
+        parser.add_argument(
+            '--slow-clients',
+            type=int,
+            default=0,
+            help="Extra connections that send their request one byte per second."
+        )
+        parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds.")
+
+    def handle(self, *args, **options):
+        test = LoadTest(
+            options['url'], options['concurrency'], options['duration'],
+            options['slow_clients'], options['timeout']
+        )
+        elapsed = asyncio.run(test.run())
+
+        latencies = sorted(test.latencies)
+        self.stdout.write(
+            f"{len(latencies)} responses, {test.errors} errors in {elapsed:.1f}s: "
+            f"{len(latencies) / elapsed:.1f} req/s, statuses {test.statuses}"
+        )
+        if latencies:
+            def percentile(share):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * share))]
+
+            self.stdout.write(
+                f"latency ms: p50={statistics.median(latencies):.1f} p95={percentile(0.95):.1f} "
+                f"p99={percentile(0.99):.1f} max={latencies[-1]:.1f}"
+            )
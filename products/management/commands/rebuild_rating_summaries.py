@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import ProductRatingSummary, Review
+
+
+class Command(BaseCommand):
+    help = "Rebuild ProductRatingSummary rows from approved reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of summaries written per INSERT."
+        )
+
+    def handle(self, *args, **options):
+        rows = (
+            Review.objects.filter(is_approved=True)
+            .order_by()
+            .values('product_id')
+            .annotate(**ProductRatingSummary.aggregate_expressions())
+        )
+        summaries = [ProductRatingSummary(**row) for row in rows]
+
+        with transaction.atomic():
+            ProductRatingSummary.objects.all().delete()
+            ProductRatingSummary.objects.bulk_create(summaries, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(summaries)} product rating summaries."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import supports_full_text_search, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.search_vector for the whole catalog (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Number of products updated per statement."
+        )
+
+    def handle(self, *args, **options):
+        if not supports_full_text_search():
+            self.stdout.write("Database has no full-text search support; nothing to do.")
+            return
+
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                Product.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            updated += update_search_vectors(Product.objects.filter(pk__in=pks))
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {updated} products."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import VendorStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild VendorStats dashboard counters from products, quotes, rentals and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vendor',
+            type=int,
+            action='append',
+            dest='vendors',
+            help="Only refresh this vendor id (repeatable)."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of rows written per INSERT."
+        )
+
+    def handle(self, *args, **options):
+        vendor_ids = options['vendors']
+        totals = VendorStats.compute(vendor_ids)
+        stats = [VendorStats(vendor_id=vendor_id, **counters) for vendor_id, counters in totals.items()]
+
+        with transaction.atomic():
+            existing = VendorStats.objects.all()
+            if vendor_ids is not None:
+                existing = existing.filter(vendor_id__in=vendor_ids)
+            existing.delete()
+            VendorStats.objects.bulk_create(stats, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed stats for {len(stats)} vendors."))
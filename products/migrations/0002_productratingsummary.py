@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+STAR_FIELDS = ('one_star', 'two_star', 'three_star', 'four_star', 'five_star')
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    Review = apps.get_model('products', 'Review')
+    ProductRatingSummary = apps.get_model('products', 'ProductRatingSummary')
+
+    expressions = {'review_count': Count('id'), 'stars_total': Sum('stars')}
+    for stars, field in enumerate(STAR_FIELDS, start=1):
+        expressions[field] = Count('id', filter=Q(stars=stars))
+
+    rows = Review.objects.filter(is_approved=True).order_by().values('product_id').annotate(**expressions)
+    ProductRatingSummary.objects.bulk_create(
+        [ProductRatingSummary(**row) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='products.product')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('stars_total', models.PositiveIntegerField(default=0)),
+                ('one_star', models.PositiveIntegerField(default=0)),
+                ('two_star', models.PositiveIntegerField(default=0)),
+                ('three_star', models.PositiveIntegerField(default=0)),
+                ('four_star', models.PositiveIntegerField(default=0)),
+                ('five_star', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product rating summaries',
+            },
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
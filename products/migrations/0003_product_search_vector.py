@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:23
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+SEARCH_INDEX = 'products_product_search_vector_gin'
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes and tsvector functions only exist on PostgreSQL; SQLite keeps the
+    # column unused and falls back to ILIKE search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON products_product USING gin (search_vector)"
+    )
+    # Backfill with the same text search configuration products.search queries with
+    config = getattr(settings, 'PRODUCT_SEARCH_CONFIG', 'english')
+    schema_editor.execute("""
+        UPDATE products_product AS p SET search_vector =
+            setweight(to_tsvector(%(config)s::regconfig, coalesce(p.name, '')), 'A')
+            || setweight(to_tsvector(%(config)s::regconfig, coalesce(p.model, '') || ' ' || coalesce(p.manufacturer, '')), 'B')
+            || setweight(to_tsvector(%(config)s::regconfig, coalesce(c.name, '') || ' ' || coalesce(s.name, '')), 'C')
+            || setweight(to_tsvector(%(config)s::regconfig, coalesce(p.description, '')), 'D')
+        FROM products_category AS c, products_subcategory AS s
+        WHERE c.id = p.category_id AND s.id = p.subcategory_id
+    """, {'config': config})
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {SEARCH_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_productratingsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
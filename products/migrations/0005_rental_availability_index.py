@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rental',
+            index=models.Index(fields=['product', 'status', 'start_date', 'end_date'], name='rental_availability_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+COUNTER_FIELDS = (
+    'products_total', 'products_active', 'quotes_total', 'quotes_pending',
+    'rentals_total', 'rentals_active', 'reviews_total', 'review_stars_total',
+)
+
+
+def backfill_vendor_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Quote = apps.get_model('products', 'Quote')
+    Rental = apps.get_model('products', 'Rental')
+    Review = apps.get_model('products', 'Review')
+    VendorStats = apps.get_model('products', 'VendorStats')
+
+    sources = (
+        Product.objects.order_by().values(owner=F('vendor_id')).annotate(
+            products_total=Count('id'),
+            products_active=Count('id', filter=Q(is_active=True)),
+        ),
+        Quote.objects.order_by().values(owner=F('product__vendor_id')).annotate(
+            quotes_total=Count('id'),
+            quotes_pending=Count('id', filter=Q(status='pending')),
+        ),
+        Rental.objects.order_by().values(owner=F('product__vendor_id')).annotate(
+            rentals_total=Count('id'),
+            rentals_active=Count('id', filter=Q(status='active')),
+        ),
+        Review.objects.order_by().values(owner=F('product__vendor_id')).annotate(
+            reviews_total=Count('id'),
+            review_stars_total=Sum('stars'),
+        ),
+    )
+
+    totals = {}
+    for rows in sources:
+        for row in rows:
+            counters = totals.setdefault(row.pop('owner'), dict.fromkeys(COUNTER_FIELDS, 0))
+            counters.update({field: value or 0 for field, value in row.items()})
+
+    VendorStats.objects.bulk_create(
+        [VendorStats(vendor_id=vendor_id, **counters) for vendor_id, counters in totals.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('products', '0005_rental_availability_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vendor_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('products_total', models.PositiveIntegerField(default=0)),
+                ('products_active', models.PositiveIntegerField(default=0)),
+                ('quotes_total', models.PositiveIntegerField(default=0)),
+                ('quotes_pending', models.PositiveIntegerField(default=0)),
+                ('rentals_total', models.PositiveIntegerField(default=0)),
+                ('rentals_active', models.PositiveIntegerField(default=0)),
+                ('reviews_total', models.PositiveIntegerField(default=0)),
+                ('review_stars_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Vendor stats',
+            },
+        ),
+        migrations.RunPython(backfill_vendor_stats, migrations.RunPython.noop),
+    ]
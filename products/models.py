@@ -1,8 +1,12 @@
 import os
 import uuid
 import logging
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
@@ -34,6 +38,25 @@ def review_media_upload_path(instance, filename):
     filename = f"review_media_{instance.review.id}_{uuid.uuid4().hex}.{ext}"
     return os.path.join("uploads", "reviews", str(instance.review.id), filename)
 
+class LoadedValuesMixin:
+    """
+    Remembers the values of `tracked_fields` as loaded from the database in
+    `instance._loaded_values`, so signal handlers can compute what changed.
+    Deferred fields are left out of the snapshot.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def remember_loaded_values(self):
+        self._loaded_values = {
+            field: self.__dict__[field] for field in self.tracked_fields if field in self.__dict__
+        }
+
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True)
@@ -82,7 +105,7 @@ class Subcategory(models.Model):
     def __str__(self):
         return f"{self.category.name} - {self.name}"
 
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
     TYPE_CHOICES = (
         ('new', 'New'),
         ('used', 'Used'),
@@ -95,6 +118,8 @@ class Product(models.Model):
         ('both', 'Both'),
     )
 
+    tracked_fields = ('vendor_id', 'is_active', 'price', 'category_id')
+
     vendor = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
@@ -131,6 +156,8 @@ class Product(models.Model):
     )
     min_rental_days = models.PositiveIntegerField(default=1)
     online_payment_enabled = models.BooleanField(default=False)
+    # Maintained by products.search; GIN indexed on PostgreSQL (see migration 0003)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -149,36 +176,54 @@ class Product(models.Model):
             models.Index(fields=['price']),
             models.Index(fields=['created_at']),
             models.Index(fields=['vendor']),
+            # Keyset pagination: (ordering field, id)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
         ]
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.name} ({self.manufacturer or 'Unknown'} - {self.model or 'N/A'})"
         
+    def get_main_image(self):
+        # Resolve from prefetch_related('images') when present instead of querying per product
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            images = self.images.all()
+            return images[0] if images else None
+        return self.images.first()
+
     def get_main_image_url(self):
-        main_image = self.images.first()
+        main_image = self.get_main_image()
         return main_image.image.url if main_image else None
         
+    def get_rating_summary(self):
+        # Served from select_related('rating_summary') when the queryset asked for it
+        try:
+            return self.rating_summary
+        except ObjectDoesNotExist:
+            return None
+
     def get_average_rating(self):
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews:
-            total_stars = sum(review.stars for review in reviews)
-            return round(total_stars / len(reviews), 1)
-        return None
+        summary = self.get_rating_summary()
+        return summary.average_rating if summary else None
         
     def get_review_count(self):
-        return self.reviews.filter(is_approved=True).count()
+        summary = self.get_rating_summary()
+        return summary.review_count if summary else 0
+
+    def get_rating_distribution(self):
+        summary = self.get_rating_summary()
+        if summary:
+            return summary.get_distribution()
+        return {str(i): 0 for i in range(1, 6)}
         
     def is_available_for_rental(self, start_date, end_date):
         if not self.is_rental_available:
             return False
-            
-        conflicting_rentals = self.rentals.filter(
-            status__in=['approved', 'active'],
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
-        return not conflicting_rentals.exists()
+
+        from .availability import is_range_available
+        return is_range_available(self.pk, start_date, end_date)
         
     def calculate_rental_price(self, start_date, end_date):
         if not self.rental_price_per_day:
@@ -231,7 +276,7 @@ class Wishlist(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.product.name}"
 
-class Quote(models.Model):
+class Quote(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -239,6 +284,8 @@ class Quote(models.Model):
         ('expired', 'Expired'),
     )
 
+    tracked_fields = ('product_id', 'status')
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quotes')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='quotes')
     quantity = models.PositiveIntegerField(default=1)
@@ -254,11 +301,14 @@ class Quote(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='quote_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Quote for {self.product.name} by {self.user.email}"
 
-class Rental(models.Model):
+class Rental(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -268,6 +318,8 @@ class Rental(models.Model):
         ('overdue', 'Overdue'),
     )
 
+    tracked_fields = ('product_id', 'status')
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='rentals')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='rentals')
     start_date = models.DateField()
@@ -284,6 +336,10 @@ class Rental(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='rental_created_id_idx'),
+            models.Index(fields=['product', 'status', 'start_date', 'end_date'], name='rental_availability_idx'),
+        ]
 
     def __str__(self):
         return f"Rental: {self.product.name} by {self.user.email}"
@@ -295,7 +351,10 @@ class Rental(models.Model):
                 self.total_price = self.product.rental_price_per_day * self.total_days
         super().save(*args, **kwargs)
 
-class Review(models.Model):
+class Review(LoadedValuesMixin, models.Model):
+    # Product is tracked so a move can refresh both rating summaries
+    tracked_fields = ('product_id', 'stars')
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     stars = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
@@ -313,6 +372,7 @@ class Review(models.Model):
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.email} - {self.stars} stars"
 
+
 class ReviewMedia(models.Model):
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='media')
     file = models.FileField(upload_to=review_media_upload_path)
@@ -320,4 +380,184 @@ class ReviewMedia(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Media for review {self.review.id}"
\ No newline at end of file
+        return f"Media for review {self.review.id}"
+
+class ProductRatingSummary(models.Model):
+    """Approved-review aggregates for a product, kept in sync by products.signals."""
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rating_summary'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    stars_total = models.PositiveIntegerField(default=0)
+    one_star = models.PositiveIntegerField(default=0)
+    two_star = models.PositiveIntegerField(default=0)
+    three_star = models.PositiveIntegerField(default=0)
+    four_star = models.PositiveIntegerField(default=0)
+    five_star = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STAR_FIELDS = ('one_star', 'two_star', 'three_star', 'four_star', 'five_star')
+
+    class Meta:
+        verbose_name_plural = "Product rating summaries"
+
+    def __str__(self):
+        return f"Rating summary for product {self.product_id}"
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.stars_total / self.review_count, 1)
+
+    def get_distribution(self):
+        return {
+            str(stars): getattr(self, field)
+            for stars, field in enumerate(self.STAR_FIELDS, start=1)
+        }
+
+    @classmethod
+    def aggregate_expressions(cls):
+        expressions = {
+            'review_count': Count('id'),
+            'stars_total': Sum('stars'),
+        }
+        for stars, field in enumerate(cls.STAR_FIELDS, start=1):
+            expressions[field] = Count('id', filter=Q(stars=stars))
+        return expressions
+
+    @classmethod
+    def rebuild_for(cls, product_id):
+        """Recompute the summary of a single product from its approved reviews."""
+        with transaction.atomic():
+            # Serialize rebuilds per product: without the lock two concurrent review
+            # writes can each count before seeing the other's row, or both insert
+            if not Product.objects.select_for_update().filter(pk=product_id).exists():
+                return None
+            totals = Review.objects.filter(
+                product_id=product_id,
+                is_approved=True
+            ).aggregate(**cls.aggregate_expressions())
+            totals['stars_total'] = totals['stars_total'] or 0
+
+            if not totals['review_count']:
+                cls.objects.filter(product_id=product_id).delete()
+                return None
+
+            summary, _ = cls.objects.update_or_create(product_id=product_id, defaults=totals)
+            return summary
+
+class VendorStats(models.Model):
+    """
+    Dashboard counters for a vendor. products.signals applies per-row deltas on every
+    save and delete, and `refresh_vendor_stats` rebuilds them from scratch.
+    """
+    vendor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vendor_stats'
+    )
+    products_total = models.PositiveIntegerField(default=0)
+    products_active = models.PositiveIntegerField(default=0)
+    quotes_total = models.PositiveIntegerField(default=0)
+    quotes_pending = models.PositiveIntegerField(default=0)
+    rentals_total = models.PositiveIntegerField(default=0)
+    rentals_active = models.PositiveIntegerField(default=0)
+    reviews_total = models.PositiveIntegerField(default=0)
+    review_stars_total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTER_FIELDS = (
+        'products_total', 'products_active', 'quotes_total', 'quotes_pending',
+        'rentals_total', 'rentals_active', 'reviews_total', 'review_stars_total',
+    )
+
+    class Meta:
+        verbose_name_plural = "Vendor stats"
+
+    def __str__(self):
+        return f"Stats for vendor {self.vendor_id}"
+
+    @property
+    def average_rating(self):
+        if not self.reviews_total:
+            return 0
+        return round(self.review_stars_total / self.reviews_total, 1)
+
+    @classmethod
+    def compute(cls, vendor_ids=None):
+        """
+        Counters per vendor id using one conditional aggregate per source table.
+        Limited to `vendor_ids` when given, otherwise every vendor with products.
+        """
+        products = Product.objects.order_by()
+        quotes = Quote.objects.order_by()
+        rentals = Rental.objects.order_by()
+        reviews = Review.objects.order_by()
+        if vendor_ids is not None:
+            products = products.filter(vendor_id__in=vendor_ids)
+            quotes = quotes.filter(product__vendor_id__in=vendor_ids)
+            rentals = rentals.filter(product__vendor_id__in=vendor_ids)
+            reviews = reviews.filter(product__vendor_id__in=vendor_ids)
+
+        sources = (
+            products.values(owner=F('vendor_id')).annotate(
+                products_total=Count('id'),
+                products_active=Count('id', filter=Q(is_active=True)),
+            ),
+            quotes.values(owner=F('product__vendor_id')).annotate(
+                quotes_total=Count('id'),
+                quotes_pending=Count('id', filter=Q(status='pending')),
+            ),
+            rentals.values(owner=F('product__vendor_id')).annotate(
+                rentals_total=Count('id'),
+                rentals_active=Count('id', filter=Q(status='active')),
+            ),
+            reviews.values(owner=F('product__vendor_id')).annotate(
+                reviews_total=Count('id'),
+                review_stars_total=Sum('stars'),
+            ),
+        )
+
+        totals = {}
+        for rows in sources:
+            for row in rows:
+                counters = totals.setdefault(row.pop('owner'), dict.fromkeys(cls.COUNTER_FIELDS, 0))
+                counters.update({field: value or 0 for field, value in row.items()})
+        return totals
+
+    @classmethod
+    def rebuild_for(cls, vendor_id):
+        """Recompute the counters of a single vendor; vendors with nothing to count get no row."""
+        with transaction.atomic():
+            totals = cls.compute([vendor_id]).get(vendor_id)
+            if totals is None:
+                cls.objects.filter(vendor_id=vendor_id).delete()
+                return None
+
+            stats, _ = cls.objects.update_or_create(vendor_id=vendor_id, defaults=totals)
+            return stats
+
+    @classmethod
+    def apply_deltas(cls, vendor_id, deltas):
+        """Add `deltas` to the vendor's counters in one UPDATE, building the row if missing."""
+        changes = {
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items() if delta
+        }
+        if not changes:
+            return
+        if not cls.objects.filter(vendor_id=vendor_id).update(updated_at=timezone.now(), **changes):
+            cls.rebuild_for(vendor_id)
+
+    @classmethod
+    def for_vendor(cls, vendor_id):
+        """Stored counters for the vendor, rebuilt on first use; unsaved zeros for empty vendors."""
+        stats = cls.objects.filter(vendor_id=vendor_id).first()
+        if stats is None:
+            stats = cls.rebuild_for(vendor_id) or cls(vendor_id=vendor_id)
+        return stats
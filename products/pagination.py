@@ -0,0 +1,182 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    Pages are fetched with `WHERE (field, id) < (last_field, last_id)` style
+    predicates, so there is no COUNT(*) and no OFFSET: page 500 costs the same as
+    page 1 provided a matching composite index exists. The ordering field comes
+    from `?ordering=` when the view allows it (`ordering_fields`), otherwise from
+    the view or model default ordering.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['d'] == 'prev'
+
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f"{prefix}{self.field}", f"{prefix}id")
+
+        if cursor is not None:
+            lookup = 'lt' if descending else 'gt'
+            value = self.parse_value(queryset.model, cursor['v'])
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value})
+                | Q(**{self.field: value, f"id__{lookup}": cursor['id']})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        allowed = getattr(view, 'ordering_fields', None) or []
+        requested = request.query_params.get(self.ordering_param, '')
+        for term in requested.split(','):
+            term = term.strip()
+            if term.lstrip('-') in allowed:
+                return term.lstrip('-'), term.startswith('-')
+
+        default = getattr(view, 'ordering', None) or queryset.model._meta.ordering or ['-id']
+        if isinstance(default, str):
+            default = [default]
+        term = default[0]
+        return term.lstrip('-'), term.startswith('-')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if (
+                cursor['d'] not in ('next', 'prev')
+                or not isinstance(cursor['id'], int)
+                or not isinstance(cursor['v'], str)
+            ):
+                raise ValueError
+            return cursor
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.field)
+        cursor = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'id': obj.pk,
+            'd': direction,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def parse_value(self, model, raw):
+        try:
+            return model._meta.get_field(self.field).to_python(raw)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], 'next')
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], 'prev')
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode.
+
+    Clients that send `?pagination=cursor` (or follow a `cursor` link) get
+    KeysetPagination instead: no total count and constant cost per page, which
+    is what infinite-scroll clients want.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    cursor_class = KeysetPagination
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            self.cursor_paginator.page_size = self.page_size
+            self.cursor_paginator.max_page_size = self.max_page_size
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if getattr(self, 'cursor_paginator', None) is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
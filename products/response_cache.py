@@ -0,0 +1,212 @@
+"""
+Response cache for anonymous catalog reads.
+
+`cache_anonymous_response` stores the rendered body of successful anonymous GET
+responses in two tiers: a small in-process LRU in front of the shared Django
+cache. Keys are built from the path and the normalized query string, so
+`?a=1&b=2` and `?b=2&a=1` share an entry.
+
+Every entry carries tags (`product:<id>`, `category:<id>`, `vendor:<id>`,
+`product-list`, and `catalog`, which category edits and bulk imports bump).
+Each tag has a version number in the shared cache. An entry records the
+versions it was built against, and a read is a hit only if they are still
+current. `invalidate_tags` bumps versions once the write commits, so a write
+drops exactly the entries that depend on it without listing keys
+(products.signals calls it). Checking the versions costs one get_many per hit,
+and it reaches the other workers' local copies too, provided CACHES points at a
+backend they share (see settings).
+
+A miss reads the versions before running the view. A write that commits while
+the view runs then bumps a version past the recorded one, and the entry built
+from the older rows is never served.
+
+Responses carry an ETag. A request whose If-None-Match matches a cached entry
+gets a 304 with no body, without running the view or the serializer.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .cache import initial_version, normalized_params_key
+
+TAG_PREFIX = 'rc:tag:'
+CATALOG_TAG = 'catalog'
+
+
+def response_cache_setting(name, default):
+    return getattr(settings, f'RESPONSE_CACHE_{name}', default)
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU of at most `size` entries."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ResponseCache:
+    def __init__(self, alias='default', local_size=512):
+        self.alias = alias
+        self.local = LocalLRU(local_size)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def tag_versions(self, tags):
+        keys = [TAG_PREFIX + tag for tag in tags]
+        versions = self.shared.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A tag evicted and recreated never matches a version recorded before
+                self.shared.add(key, initial_version(), timeout=None)
+                versions[key] = self.shared.get(key)
+        return versions
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None or entry['expires'] < time.monotonic():
+            entry = self.shared.get(key)
+            if entry is None:
+                return None
+            self.local.set(key, {**entry, 'expires': time.monotonic() + response_cache_setting('LOCAL_TIMEOUT', 60)})
+        if self.shared.get_many(list(entry['tags'])) != entry['tags']:
+            return None
+        return entry
+
+    def set(self, key, content, content_type, etag, versions, timeout):
+        """Store an entry built against `versions`, read with tag_versions before building it."""
+        entry = {
+            'content': content,
+            'content_type': content_type,
+            'etag': etag,
+            'tags': versions,
+        }
+        self.shared.set(key, entry, timeout)
+        self.local.set(key, {**entry, 'expires': time.monotonic() + min(timeout, response_cache_setting('LOCAL_TIMEOUT', 60))})
+
+    def invalidate(self, tags):
+        for tag in set(tags):
+            key = TAG_PREFIX + tag
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                # Never cached anything, or evicted: entries already fail validation
+                pass
+
+    def clear_local(self):
+        self.local.clear()
+
+
+response_cache = ResponseCache(
+    alias=response_cache_setting('ALIAS', 'default'),
+    local_size=response_cache_setting('LOCAL_SIZE', 512),
+)
+
+
+def invalidate_tags(*tags):
+    """
+    Bump the tags' versions once the current transaction commits (at once outside
+    one). Bumping earlier would let a concurrent miss cache the pre-commit rows
+    under the new versions.
+    """
+    transaction.on_commit(lambda: response_cache.invalidate(tags))
+
+
+def is_anonymous(request):
+    """No credentials sent and no session login: the response cannot be user-specific."""
+    user = getattr(request, 'user', None)
+    return (
+        'HTTP_AUTHORIZATION' not in request.META
+        and (user is None or not user.is_authenticated)
+    )
+
+
+def cache_key(request, prefix):
+    return f"rc:{prefix}:{request.path}:{normalized_params_key(request.GET)}"
+
+
+def not_modified(request, etag):
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in etags or '*' in etags
+
+
+def cache_anonymous_response(prefix, tags, timeout=None):
+    """
+    Cache successful anonymous GET responses of a Django-level view. `tags` is
+    called with (request, view kwargs) before the view runs and returns the
+    entry's tags.
+    For class-based views, decorate `dispatch` with method_decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ('GET', 'HEAD')
+                or not response_cache_setting('ENABLED', True)
+                or not is_anonymous(request)
+            ):
+                return view(request, *args, **kwargs)
+
+            key = cache_key(request, prefix)
+            entry = response_cache.get(key)
+            if entry is not None:
+                if not_modified(request, entry['etag']):
+                    response = HttpResponseNotModified()
+                else:
+                    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                response['ETag'] = entry['etag']
+                response['X-Cache'] = 'HIT'
+                return response
+
+            versions = response_cache.tag_versions([CATALOG_TAG, *tags(request, kwargs)])
+            response = view(request, *args, **kwargs)
+            # DRF authentication may still have found a user (e.g. a forced test login)
+            api_request = getattr(response, 'renderer_context', {}).get('request')
+            if response.status_code != 200 or not is_anonymous(api_request or request):
+                return response
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+            response_cache.set(
+                key, response.content, response['Content-Type'], etag, versions,
+                timeout or response_cache_setting('TIMEOUT', 300),
+            )
+            response['ETag'] = etag
+            response['X-Cache'] = 'MISS'
+            if not_modified(request, etag):
+                not_modified_response = HttpResponseNotModified()
+                not_modified_response['ETag'] = etag
+                return not_modified_response
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,89 @@
+"""
+Full-text product search.
+
+On PostgreSQL every product carries a weighted `search_vector` (name > model and
+manufacturer > category and subcategory names > description) backed by a GIN index,
+and `ProductSearchFilter` matches prefixes of every term against it and ranks the
+results. Other backends (SQLite in tests) keep DRF's ILIKE based SearchFilter.
+
+PRODUCT_SEARCH_CONFIG (default 'english') names the PostgreSQL text search
+configuration used both to build the vectors and to parse queries. Stored
+vectors are not rebuilt when it changes: run `manage.py rebuild_search_vectors`
+after changing it, or stemmed queries stop matching the existing rows.
+"""
+
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, OuterRef, Subquery
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+from .models import Product
+
+SEARCH_CONFIG = getattr(settings, 'PRODUCT_SEARCH_CONFIG', 'english')
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def supports_full_text_search(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def product_search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('model', 'manufacturer', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('category__name', 'subcategory__name', weight='C', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None, using='default'):
+    """
+    Recompute `search_vector` for the products in `queryset` (all products by default)
+    with a single UPDATE. A no-op on backends without full-text search.
+    """
+    if not supports_full_text_search(using):
+        return 0
+
+    if queryset is None:
+        queryset = Product.objects.all()
+    vector = Product.objects.filter(pk=OuterRef('pk')).order_by().annotate(
+        vector=product_search_vector()
+    ).values('vector')[:1]
+    return queryset.using(using).update(search_vector=Subquery(vector))
+
+
+def build_search_query(terms):
+    """Prefix-match every token: 'fork toyo' -> 'fork:* & toyo:*'."""
+    tokens = [token for term in terms for token in TOKEN_RE.findall(term)]
+    if not tokens:
+        return None
+    raw = ' & '.join(f"{token}:*" for token in tokens)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    `?search=` over the product search vector, ranked by relevance unless the
+    client asked for an explicit `?ordering=`. Falls back to SearchFilter when
+    the database has no full-text search.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not supports_full_text_search(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        query = build_search_query(self.get_search_terms(request))
+        if query is None:
+            return queryset
+
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import (
     Category, Subcategory, Product, ProductImage, Cart, Wishlist, 
     Quote, Rental, Review, ReviewMedia
 )
+from .availability import is_range_available
 
 User = get_user_model()
 
@@ -27,44 +29,113 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['created_at']
 
-class ProductListSerializer(serializers.ModelSerializer):
-    vendor_name = serializers.CharField(source='vendor.name', read_only=True)
-    vendor_company = serializers.CharField(source='vendor.vendor_profile.company_name', read_only=True)
-    category_name = serializers.CharField(source='category.name', read_only=True)
-    subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
+def split_param(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+class TieredProductSerializer(serializers.ModelSerializer):
+    """
+    Base of the card / list / detail product serializers. Every tier lists its
+    fields explicitly; views may narrow them with `?fields=` and add the tier's
+    `expandable_fields` with `?expand=` (see ProductFieldSelectionMixin), and
+    `optimize_queryset` loads only the columns and relations the chosen fields read.
+    """
+    # Sent only when asked for through ?expand= (or named in ?fields=)
+    expandable_fields = ()
+    # Output fields that are not plain model columns, mapped to the column paths
+    # they read; paths through a relation also select_related it
+    field_sources = {}
+    # Output fields that read a prefetched relation
+    field_prefetches = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields or expand or self.expandable_fields:
+            keep = set(self.selected_fields(fields, expand))
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, fields=None, expand=None):
+        if fields:
+            return [name for name in cls.Meta.fields if name in fields or name == 'id']
+        expand = expand or ()
+        return [
+            name for name in cls.Meta.fields
+            if name not in cls.expandable_fields or name in expand
+        ]
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None, extra_columns=()):
+        """
+        Restrict a Product queryset to the columns, joins and prefetches the selected
+        fields read. Nested uses pass it to Prefetch('product', queryset=...).
+        """
+        columns, related, prefetch = cls.field_requirements(cls.selected_fields(fields, expand))
+        queryset = queryset.only(*columns, *extra_columns)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    @classmethod
+    def field_requirements(cls, names):
+        columns, related, prefetch = {'id'}, set(), set()
+        for name in names:
+            if name in cls.field_prefetches:
+                prefetch.add(cls.field_prefetches[name])
+            for path in cls.field_sources.get(name, (name,)):
+                columns.add(path)
+                if '__' in path:
+                    related.add(path.rsplit('__', 1)[0])
+        return columns, related, prefetch
+
+class ProductCardSerializer(TieredProductSerializer):
+    """The few fields a product needs when nested in carts, wishlists and orders."""
     main_image = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    field_sources = {'main_image': ()}
+    field_prefetches = {'main_image': 'images'}
     
     class Meta:
         model = Product
-        exclude = ['vendor', 'category', 'subcategory']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'slug', 'price', 'type', 'selling_method', 'is_active',
+            'stock_quantity', 'vendor', 'main_image',
+        ]
+        read_only_fields = fields
     
     def get_main_image(self, obj):
         return obj.get_main_image_url()
-    
-    def get_average_rating(self, obj):
-        return obj.get_average_rating()
-    
-    def get_review_count(self, obj):
-        return obj.get_review_count()
 
-class ProductDetailSerializer(serializers.ModelSerializer):
-    vendor_name = serializers.CharField(source='vendor.name', read_only=True)
-    vendor_company = serializers.CharField(source='vendor.vendor_profile.company_name', read_only=True)
-    vendor_email = serializers.CharField(source='vendor.email', read_only=True)
-    vendor_phone = serializers.CharField(source='vendor.phone', read_only=True)
+class ProductListSerializer(ProductCardSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
-    images = ProductImageSerializer(many=True, read_only=True)
     average_rating = serializers.SerializerMethodField()
     review_count = serializers.SerializerMethodField()
+    # The default payload is the one list clients have always received; use
+    # ?fields= for a smaller one
+    expandable_fields = ('vendor', 'category', 'subcategory')
+    field_sources = {
+        **ProductCardSerializer.field_sources,
+        'category_name': ('category__name',),
+        'subcategory_name': ('subcategory__name',),
+        'average_rating': ('rating_summary__review_count', 'rating_summary__stars_total'),
+        'review_count': ('rating_summary__review_count',),
+    }
     
     class Meta:
         model = Product
-        fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'slug', 'description', 'meta_title', 'meta_description',
+            'manufacturer', 'model', 'product_details', 'price', 'brochure', 'type',
+            'selling_method', 'is_active', 'stock_quantity', 'min_order_quantity',
+            'is_rental_available', 'rental_price_per_day', 'min_rental_days',
+            'online_payment_enabled', 'created_at', 'updated_at', 'category_name',
+            'subcategory_name', 'main_image', 'average_rating', 'review_count',
+            'vendor', 'category', 'subcategory',
+        ]
+        read_only_fields = fields
     
     def get_average_rating(self, obj):
         return obj.get_average_rating()
@@ -72,12 +143,28 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     def get_review_count(self, obj):
         return obj.get_review_count()
 
+class ProductDetailSerializer(ProductListSerializer):
+    vendor_email = serializers.CharField(source='vendor.email', read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+    expandable_fields = ()
+    field_sources = {
+        **ProductListSerializer.field_sources,
+        'vendor_email': ('vendor__email',),
+        'images': (),
+    }
+    field_prefetches = {**ProductListSerializer.field_prefetches, 'images': 'images'}
+    
+    class Meta:
+        model = Product
+        fields = ProductListSerializer.Meta.fields + ['vendor_email', 'images']
+        read_only_fields = fields
+
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, required=False)
     
     class Meta:
         model = Product
-        exclude = ['vendor', 'created_at', 'updated_at']
+        exclude = ['vendor', 'search_vector', 'created_at', 'updated_at']
     
     def validate(self, data):
         if data.get('is_rental_available') and not data.get('rental_price_per_day'):
@@ -88,7 +175,7 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
-        vendor = self.context['request'].user
+        vendor = validated_data.pop('vendor', None) or self.context['request'].user
         
         if not vendor.is_vendor:
             raise serializers.ValidationError("Only vendors can create products.")
@@ -114,6 +201,51 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         
         return instance
 
+class LookupRelatedField(serializers.RelatedField):
+    """
+    Primary key field resolved from a `{pk: instance}` dict in the serializer context
+    instead of one query per value. Used by the bulk importer.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.',
+        'incorrect_type': 'Incorrect type. Expected pk value, received {data_type}.',
+    }
+
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        kwargs['read_only'] = False
+        super().__init__(queryset=None, **kwargs)
+
+    def get_queryset(self):
+        return None
+
+    def to_internal_value(self, data):
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context[self.context_key][pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+    def to_representation(self, value):
+        return value.pk
+
+class ProductImportRowSerializer(ProductCreateUpdateSerializer):
+    """
+    ProductCreateUpdateSerializer rules for one row of a bulk import. Categories and
+    subcategories come from context lookups, and the slug is the upsert key, so its
+    uniqueness is checked per chunk by products.bulk rather than per row.
+    """
+    images = None
+    category = LookupRelatedField('categories')
+    subcategory = LookupRelatedField('subcategories')
+
+    class Meta(ProductCreateUpdateSerializer.Meta):
+        exclude = ProductCreateUpdateSerializer.Meta.exclude + ['brochure']
+        extra_kwargs = {'slug': {'validators': []}}
+
 class CartSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
@@ -130,6 +262,10 @@ class CartSerializer(serializers.ModelSerializer):
         return obj.product.get_main_image_url()
     
     def get_total_price(self, obj):
+        # Listed lines come with the total computed in SQL (CartListView)
+        line_total = getattr(obj, 'line_total', None)
+        if line_total is not None:
+            return line_total
         return obj.product.price * obj.quantity
 
 class WishlistSerializer(serializers.ModelSerializer):
@@ -163,7 +299,7 @@ class QuoteCreateSerializer(serializers.ModelSerializer):
         fields = ['product', 'quantity', 'message', 'requirements', 'expected_delivery_date']
     
     def create(self, validated_data):
-        user = self.context['request'].user
+        user = validated_data.pop('user', None) or self.context['request'].user
         return Quote.objects.create(user=user, **validated_data)
 
 class RentalSerializer(serializers.ModelSerializer):
@@ -194,7 +330,7 @@ class RentalCreateSerializer(serializers.ModelSerializer):
             if not product.is_rental_available:
                 raise serializers.ValidationError("This product is not available for rental.")
             
-            if not product.is_available_for_rental(start_date, end_date):
+            if not is_range_available(product.pk, start_date, end_date):
                 raise serializers.ValidationError("Product is not available for the selected dates.")
             
             rental_days = (end_date - start_date).days + 1
@@ -206,8 +342,14 @@ class RentalCreateSerializer(serializers.ModelSerializer):
         return data
     
     def create(self, validated_data):
-        user = self.context['request'].user
-        return Rental.objects.create(user=user, **validated_data)
+        user = validated_data.pop('user', None) or self.context['request'].user
+        with transaction.atomic():
+            # Serialize bookings per product so two requests can't both pass the check
+            product = Product.objects.select_for_update().get(pk=validated_data['product'].pk)
+            if not is_range_available(product.pk, validated_data['start_date'], validated_data['end_date']):
+                raise serializers.ValidationError("Product is not available for the selected dates.")
+            validated_data['product'] = product
+            return Rental.objects.create(user=user, **validated_data)
 
 class ReviewMediaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -243,7 +385,7 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         media_files = validated_data.pop('media_files', [])
-        user = self.context['request'].user
+        user = validated_data.pop('user', None) or self.context['request'].user
         
         if Review.objects.filter(user=user, product=validated_data['product']).exists():
             raise serializers.ValidationError("You have already reviewed this product.")
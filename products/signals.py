@@ -0,0 +1,254 @@
+import threading
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import (
+    Category, Product, ProductImage, ProductRatingSummary, Quote, Rental, Review, Subcategory, VendorStats
+)
+from .response_cache import CATALOG_TAG, invalidate_tags
+from .search import update_search_vectors
+
+
+@receiver(post_save, sender=Review)
+def refresh_rating_summary_on_save(sender, instance, **kwargs):
+    ProductRatingSummary.rebuild_for(instance.product_id)
+
+    previous_product_id = getattr(instance, '_loaded_values', {}).get('product_id')
+    if previous_product_id and previous_product_id != instance.product_id:
+        ProductRatingSummary.rebuild_for(previous_product_id)
+
+
+@receiver(post_delete, sender=Review)
+def refresh_rating_summary_on_delete(sender, instance, **kwargs):
+    # A deleted product's summary goes with it in the same cascade
+    if instance.product_id in _deleting_product_ids():
+        return
+    ProductRatingSummary.rebuild_for(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def refresh_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        update_search_vectors(Product.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=Subcategory)
+def refresh_subcategory_search_vectors(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        update_search_vectors(Product.objects.filter(subcategory=instance))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_catalog_caches(sender, **kwargs):
+    bump_catalog_version()
+
+
+# Vendor dashboard counters
+
+VENDOR_STATS_COUNTERS = {
+    Product: lambda values: {
+        'products_total': 1,
+        'products_active': int(bool(values['is_active'])),
+    },
+    Quote: lambda values: {
+        'quotes_total': 1,
+        'quotes_pending': int(values['status'] == 'pending'),
+    },
+    Rental: lambda values: {
+        'rentals_total': 1,
+        'rentals_active': int(values['status'] == 'active'),
+    },
+    Review: lambda values: {
+        'reviews_total': 1,
+        'review_stars_total': values['stars'],
+    },
+}
+
+# Products being deleted by the current thread. Their cascaded quotes, rentals and
+# reviews skip the per-row deltas; the product's own post_delete rebuilds the vendor.
+_cascade = threading.local()
+
+
+def _deleting_product_ids():
+    if not hasattr(_cascade, 'product_ids'):
+        _cascade.product_ids = set()
+    return _cascade.product_ids
+
+
+def _current_values(instance):
+    return {field: getattr(instance, field) for field in instance.tracked_fields}
+
+
+def _loaded_values(instance):
+    """The values the row was loaded with, or None when they are not all known."""
+    values = getattr(instance, '_loaded_values', {})
+    return values if len(values) == len(instance.tracked_fields) else None
+
+
+def _vendor_id(instance, values):
+    if isinstance(instance, Product):
+        return values['vendor_id']
+    product = instance._state.fields_cache.get('product')
+    if product is not None and product.pk == values['product_id']:
+        return product.vendor_id
+    return Product.objects.filter(pk=values['product_id']).order_by().values_list('vendor_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Quote)
+@receiver(post_save, sender=Rental)
+@receiver(post_save, sender=Review)
+def update_vendor_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counters = VENDOR_STATS_COUNTERS[sender]
+    current = _current_values(instance)
+    vendor_id = _vendor_id(instance, current)
+
+    if created:
+        VendorStats.apply_deltas(vendor_id, counters(current))
+        return
+
+    previous = _loaded_values(instance)
+    if previous is None:
+        VendorStats.rebuild_for(vendor_id)
+        return
+    if previous == current:
+        return
+
+    if sender is Product or previous['product_id'] != current['product_id']:
+        previous_vendor_id = _vendor_id(instance, previous)
+    else:
+        previous_vendor_id = vendor_id
+    if sender is Product and previous_vendor_id != vendor_id:
+        # The product takes its quotes, rentals and reviews along
+        VendorStats.rebuild_for(previous_vendor_id)
+        VendorStats.rebuild_for(vendor_id)
+        return
+
+    old, new = counters(previous), counters(current)
+    if previous_vendor_id == vendor_id:
+        VendorStats.apply_deltas(vendor_id, {field: new[field] - old[field] for field in new})
+    else:
+        if previous_vendor_id is not None:
+            VendorStats.apply_deltas(previous_vendor_id, {field: -value for field, value in old.items()})
+        VendorStats.apply_deltas(vendor_id, new)
+
+
+@receiver(pre_delete, sender=Product)
+def mark_product_deleting(sender, instance, **kwargs):
+    _deleting_product_ids().add(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Quote)
+@receiver(post_delete, sender=Rental)
+@receiver(post_delete, sender=Review)
+def update_vendor_stats_on_delete(sender, instance, **kwargs):
+    if sender is Product:
+        _deleting_product_ids().discard(instance.pk)
+        VendorStats.rebuild_for(instance.vendor_id)
+        return
+    if instance.product_id in _deleting_product_ids():
+        return
+
+    values = _loaded_values(instance) or _current_values(instance)
+    vendor_id = _vendor_id(instance, values)
+    if vendor_id is not None:
+        VendorStats.apply_deltas(
+            vendor_id,
+            {field: -value for field, value in VENDOR_STATS_COUNTERS[sender](values).items()}
+        )
+
+
+# Response cache tags (products.response_cache)
+
+def product_tags(product_id, vendor_ids, category_ids):
+    return [
+        f'product:{product_id}',
+        'product-list',
+        *{f'vendor:{vendor_id}' for vendor_id in vendor_ids if vendor_id is not None},
+        *{f'category:{category_id}' for category_id in category_ids if category_id is not None},
+    ]
+
+
+def related_product_tags(instance, product_id):
+    product = instance._state.fields_cache.get('product')
+    if product is not None and product.pk == product_id:
+        vendor_id, category_id = product.vendor_id, product.category_id
+    else:
+        row = Product.objects.filter(pk=product_id).order_by().values_list('vendor_id', 'category_id').first()
+        if row is None:
+            return [f'product:{product_id}']
+        vendor_id, category_id = row
+    return product_tags(product_id, [vendor_id], [category_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Runs before remember_saved_values, so _loaded_values still holds the old row
+    loaded = getattr(instance, '_loaded_values', {})
+    invalidate_tags(*product_tags(
+        instance.pk,
+        [instance.vendor_id, loaded.get('vendor_id')],
+        [instance.category_id, loaded.get('category_id')],
+    ))
+
+
+# No post_delete for ProductImage: it would cost product deletes their fast cascade
+# delete, and images only go away with their product or through its admin page,
+# which saves the product too
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_product_child_responses(sender, instance, raw=False, **kwargs):
+    if raw or instance.product_id in _deleting_product_ids():
+        return
+    tags = related_product_tags(instance, instance.product_id)
+    previous_product_id = getattr(instance, '_loaded_values', {}).get('product_id')
+    if previous_product_id and previous_product_id != instance.product_id:
+        tags += related_product_tags(instance, previous_product_id)
+    invalidate_tags(*tags)
+
+
+@receiver(post_save, sender=Rental)
+@receiver(post_delete, sender=Rental)
+def invalidate_availability_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    product_ids = {instance.product_id, getattr(instance, '_loaded_values', {}).get('product_id')}
+    invalidate_tags(*(f'product:{product_id}' for product_id in product_ids if product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_category_responses(sender, **kwargs):
+    # Names show up in every product payload
+    invalidate_tags(CATALOG_TAG)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Quote)
+@receiver(post_save, sender=Rental)
+@receiver(post_save, sender=Review)
+def remember_saved_values(sender, instance, raw=False, **kwargs):
+    # Connected last: later saves of the same instance diff against what was just written
+    instance.remember_loaded_values()
@@ -0,0 +1,56 @@
+"""Background notifications for quotes and rentals, run by the job workers (jobs/queue.py)."""
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from jobs.queue import task
+from .models import Quote, Rental
+
+
+def notify(recipient, subject, message):
+    if recipient.email:
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient.email])
+
+
+@task('quotes.notify_vendor')
+def notify_vendor_of_quote(quote_id):
+    quote = Quote.objects.select_related('user', 'product__vendor').filter(pk=quote_id).first()
+    if quote is not None:
+        notify(
+            quote.product.vendor,
+            f"New quote request for {quote.product.name}",
+            f"{quote.user.username} asked for {quote.quantity} x {quote.product.name}.\n\n{quote.message}",
+        )
+
+
+@task('quotes.notify_customer')
+def notify_customer_of_quote(quote_id):
+    quote = Quote.objects.select_related('user', 'product').filter(pk=quote_id).first()
+    if quote is not None:
+        notify(
+            quote.user,
+            f"Your quote for {quote.product.name} is {quote.get_status_display().lower()}",
+            quote.vendor_response or '',
+        )
+
+
+@task('rentals.notify_vendor')
+def notify_vendor_of_rental(rental_id):
+    rental = Rental.objects.select_related('user', 'product__vendor').filter(pk=rental_id).first()
+    if rental is not None:
+        notify(
+            rental.product.vendor,
+            f"New rental request for {rental.product.name}",
+            f"{rental.user.username} wants {rental.product.name} from {rental.start_date} to {rental.end_date}.",
+        )
+
+
+@task('rentals.notify_customer')
+def notify_customer_of_rental(rental_id):
+    rental = Rental.objects.select_related('user', 'product').filter(pk=rental_id).first()
+    if rental is not None:
+        notify(
+            rental.user,
+            f"Your rental of {rental.product.name} is {rental.get_status_display().lower()}",
+            rental.notes or '',
+        )
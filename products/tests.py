@@ -1,3 +1,1006 @@
-from django.test import TestCase
+import base64
+import contextvars
+import io
+import json
+import os
+import random
+import runpy
+import uuid
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from config.db_routers import (
+    PIN_COOKIE, CatalogReplicaRouter, PrimaryPinningMiddleware, primary, use_primary
+)
+from config.instrumentation import registry
+from config.renderers import ORJSONParser, ORJSONRenderer
+from order_management.models import Order
+
+from .benchmarks import QueryBudgetTestCase, make_user, seed_catalog
+from .cache import CATALOG_VERSION_KEY, get_catalog_version
+from .models import Category, Product, ProductRatingSummary, Quote, Rental, Review, VendorStats
+from .response_cache import ResponseCache, cache_anonymous_response, response_cache
+from .serializers import ProductListSerializer
+from .tree import catalog_tree
+
+
+class ProductEndpointQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets for every route in products/urls.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog()
+        cls.vendor = cls.catalog['vendors'][0]
+        cls.light = cls.catalog['light']
+        cls.heavy = cls.catalog['heavy']
+        cls.product = cls.catalog['products'][0]
+        cls.rental_product = cls.catalog['rental_products'][-1]
+        cls.category = cls.catalog['categories'][0]
+
+    # Catalog
+
+    def test_category_list(self):
+        self.assertQueryBudget('get', reverse('products:category-list'), 3, user=self.light)
+
+    def test_category_create(self):
+        self.assertQueryBudget(
+            'post', reverse('products:category-list'), 4, user=self.light,
+            data={'name': 'Stackers', 'slug': 'stackers'}, expected_status=201
+        )
+
+    def test_category_detail(self):
+        url = reverse('products:category-detail', args=[self.category.pk])
+        self.assertQueryBudget('get', url, 2, user=self.light)
+        self.assertQueryBudget('patch', url, 4, user=self.light, data={'description': 'Updated'})
+
+    def test_category_tree(self):
+        url = reverse('products:category-tree')
+        # categories and subcategories with their counts, then the snapshot
+        first = self.assertQueryBudget('get', url, 2)
+        second = self.assertQueryBudget('get', url, 0)
+        self.assertEqual(second.content, first.content)
+        self.assertQueryBudget('get', url, 0, expected_status=304, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        tree = json.loads(first.content)['categories']
+        category = next(node for node in tree if node['id'] == self.category.pk)
+        self.assertEqual(
+            category['product_count'],
+            Product.objects.filter(category=self.category, is_active=True).count()
+        )
+        self.assertEqual(
+            sum(node['product_count'] for node in category['subcategories']), category['product_count']
+        )
+
+        Category.objects.filter(pk=self.category.pk).get().save()
+        self.assertQueryBudget('get', url, 2)
+
+    def test_subcategory_list(self):
+        url = reverse('products:subcategory-list')
+        self.assertQueryBudget('get', f"{url}?category={self.category.pk}", 2, user=self.light)
+
+    def test_subcategory_detail(self):
+        subcategory = self.product.subcategory
+        self.assertQueryBudget(
+            'get', reverse('products:subcategory-detail', args=[subcategory.pk]), 2, user=self.light
+        )
+
+    def test_product_list(self):
+        url = reverse('products:product-list')
+        self.assertQueryBudget('get', f"{url}?page_size=100", 6)
+        self.assertQueryBudget('get', f"{url}?page_size=100&category={self.category.pk}&min_price=1500", 6)
+
+    def test_product_list_field_selection(self):
+        url = reverse('products:product-list')
+        response, _, queries = self.measure('get', f"{url}?page_size=10&fields=id,name,price")
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price'})
+        # No joins or image prefetch for fields that do not need them
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries.captured_queries[-1]['sql'])
+
+        # By default the list keeps its full payload, relation ids only on request
+        first = self.client.get(f"{url}?page_size=10").data['results'][0]
+        for name in ('description', 'meta_title', 'meta_description', 'product_details', 'brochure', 'category_name'):
+            self.assertIn(name, first)
+        self.assertEqual(first['description'], Product.objects.get(pk=first['id']).description)
+        self.assertNotIn('vendor', first)
+        first = self.client.get(f"{url}?page_size=10&expand=vendor,category").data['results'][0]
+        self.assertEqual(first['vendor'], Product.objects.get(pk=first['id']).vendor_id)
+        self.assertIn('category', first)
+
+    def test_product_search(self):
+        url = reverse('products:product-list')
+        response = self.assertQueryBudget('get', f"{url}?search=forklift 12&page_size=100", 6)
+        self.assertTrue(response.data['count'])
+
+    def test_product_list_constant_in_page_size(self):
+        url = reverse('products:product-list')
+        self.assertConstantQueries('get', (f"{url}?page_size=5", None), (f"{url}?page_size=100", None))
+
+    def test_product_list_cursor_mode(self):
+        url = reverse('products:product-list')
+        response = self.assertQueryBudget('get', f"{url}?pagination=cursor&page_size=100&ordering=-price", 5)
+        self.assertNotIn('count', response.data)
+
+        seen = []
+        next_url = f"{url}?pagination=cursor&page_size=10&ordering=price&category={self.category.pk}"
+        while next_url:
+            response = self.client.get(next_url)
+            seen.extend(item['id'] for item in response.data['results'])
+            next_url = response.data['next']
+        expected = Product.objects.filter(is_active=True, category=self.category).order_by('price', 'id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+        previous = self.client.get(response.data['previous']).data
+        self.assertEqual(previous['results'][-1]['id'], seen[-len(response.data['results']) - 1])
+
+        for cursor in ({'d': 'next', 'id': 1}, {'d': 'next', 'id': 1, 'v': 5}, ['next'], 'next'):
+            encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            response = self.client.get(f"{url}?pagination=cursor&ordering=price&cursor={encoded}")
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_product_facets(self):
+        url = f"{reverse('products:product-facets')}?category={self.category.pk}&min_price=1200"
+        # category filter validation + aggregate + two GROUP BYs
+        response = self.assertQueryBudget('get', url, 4)
+        expected = Product.objects.filter(is_active=True, category=self.category, price__gte=1200)
+        self.assertEqual(response.data['total'], expected.count())
+        self.assertEqual(sum(row['count'] for row in response.data['subcategories']), expected.count())
+        self.assertEqual(sum(response.data['type'].values()), expected.count())
+
+        self.assertQueryBudget('get', url, 0)
+
+        product = expected.first()
+        product.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.assertQueryBudget('get', url, 4)
+        self.assertEqual(response.data['total'], expected.count())
+
+    def test_product_detail(self):
+        # response cache tag lookup + product + images
+        self.assertQueryBudget('get', reverse('products:product-detail', args=[self.product.slug]), 3)
+
+    def test_product_create(self):
+        data = {
+            'category': self.category.pk,
+            'subcategory': self.product.subcategory_id,
+            'name': 'Reach Truck',
+            'slug': 'reach-truck',
+            'price': '250000.00',
+        }
+        self.assertQueryBudget(
+            'post', reverse('products:product-create'), 6, user=self.vendor, data=data, expected_status=201
+        )
+
+    def test_product_update(self):
+        url = reverse('products:product-update', args=[self.product.pk])
+        self.assertQueryBudget('patch', url, 5, user=self.vendor, data={'price': '1999.00'})
+
+    def test_product_delete(self):
+        product = Product.objects.filter(vendor=self.vendor, reviews__isnull=True).first()
+        url = reverse('products:product-delete', args=[product.pk])
+        # includes the vendor stats rebuild once the cascade is done
+        self.assertQueryBudget('delete', url, 24, user=self.vendor, expected_status=204)
+
+    def test_vendor_product_list(self):
+        url = reverse('products:vendor-product-list')
+        self.assertQueryBudget('get', f"{url}?page_size=100", 5, user=self.vendor)
+        self.assertConstantQueries(
+            'get', (f"{url}?page_size=5", self.vendor), (f"{url}?page_size=100", self.vendor)
+        )
+
+    def stream(self, url, user):
+        response, _, _ = self.measure('get', url, user=user)
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(response.streaming_content)
+        return response, content, queries
+
+    def test_streaming_lists(self):
+        url = reverse('products:vendor-product-list')
+        paged = self.measure('get', f"{url}?page_size=100", user=self.vendor)[0].data['results']
+        # Streams come in id order
+        paged = json.loads(json.dumps(sorted(paged, key=lambda item: item['id'])))
+
+        response, content, queries = self.stream(f"{url}?stream=json", self.vendor)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(content), paged)
+        per_chunk = len(queries)
+
+        with override_settings(STREAM_CHUNK_SIZE=4):
+            response, content, queries = self.stream(f"{url}?stream=ndjson", self.vendor)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(lines, paged)
+        # Keyset queries of at most 4 rows until one comes back short, and the
+        # image prefetch for every non-empty chunk
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if '"products_product"."vendor_id" =' in query['sql']
+        ]
+        self.assertEqual(len(selects), len(paged) // 4 + 1)
+        self.assertTrue(all('LIMIT 4' in sql for sql in selects))
+        self.assertTrue(all('"products_product"."id" >' in sql for sql in selects[1:]))
+        self.assertEqual(len(queries), len(selects) + -(-len(paged) // 4) * (per_chunk - 1))
+
+        quotes = self.stream(f"{reverse('products:vendor-quote-list')}?stream=json", self.vendor)[1]
+        self.assertEqual(len(json.loads(quotes)), Quote.objects.filter(product__vendor=self.vendor).count())
+        empty = self.stream(f"{reverse('products:rental-list')}?stream=json", self.catalog['admin'])[1]
+        self.assertEqual(empty, b'[]')
+        self.assertQueryBudget('get', f"{url}?stream=xml", 1, user=self.vendor, expected_status=400)
+
+    def import_file(self, rows, budget, name='products.jsonl'):
+        content = "".join(json.dumps(row) + "\n" for row in rows).encode()
+        return self.assertQueryBudget(
+            'post', reverse('products:vendor-product-import'), budget, user=self.vendor,
+            data={'file': SimpleUploadedFile(name, content)}, format='multipart'
+        )
+
+    def test_vendor_product_import(self):
+        subcategory = self.category.subcategories.first()
+        own = Product.objects.filter(vendor=self.vendor).first()
+        foreign = Product.objects.exclude(vendor=self.vendor).first()
+        new_rows = [
+            {'slug': f"bulk-{n}", 'name': f"Bulk {n}", 'category': self.category.pk,
+             'subcategory': subcategory.pk, 'price': '100.00'}
+            for n in range(50)
+        ]
+        rows = new_rows + [
+            {'slug': own.slug, 'name': own.name, 'category': own.category_id,
+             'subcategory': own.subcategory_id, 'price': '123.00'},
+            {'slug': foreign.slug, 'name': 'Taken', 'category': self.category.pk,
+             'subcategory': subcategory.pk, 'price': '1.00'},
+            {'slug': 'bulk-bad', 'name': 'Bad', 'category': self.category.pk,
+             'subcategory': subcategory.pk, 'price': '-1'},
+        ]
+
+        # lookups, one locked chunk upsert and the vendor stats rebuild; SQLite splits
+        # the INSERT into a few batches
+        response = self.import_file(rows, 20)
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'created', 'updated', 'error_count')},
+            {'rows': 53, 'created': 50, 'updated': 1, 'error_count': 2}
+        )
+        self.assertEqual({error['slug'] for error in response.data['errors']}, {foreign.slug, 'bulk-bad'})
+        own.refresh_from_db()
+        self.assertEqual(str(own.price), '123.00')
+        self.assertEqual(VendorStats.objects.get(vendor=self.vendor).products_total,
+                         Product.objects.filter(vendor=self.vendor).count())
+
+        # Twice the rows, same chunk: the query count does not follow the row count
+        self.import_file(new_rows * 2, 20)
+
+    def test_vendor_product_export(self):
+        url = reverse('products:vendor-product-export')
+        response = self.assertQueryBudget('get', url, 1, user=self.vendor)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), Product.objects.filter(vendor=self.vendor).count() + 1)
+
+        response = self.assertQueryBudget('get', f"{url}?file_format=jsonl", 1, user=self.vendor)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        # An export imports back as updates only
+        report = self.import_file(rows, 20).data
+        self.assertEqual((report['created'], report['updated'], report['error_count']), (0, len(rows), 0))
+
+    # Cart and wishlist
+
+    def test_cart_list(self):
+        url = reverse('products:cart-list')
+        self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_cart_create(self):
+        product = self.catalog['products'][-1]
+        self.assertQueryBudget(
+            'post', reverse('products:cart-list'), 6, user=self.light,
+            data={'product': product.pk, 'quantity': 1}, expected_status=201
+        )
+
+    def test_cart_detail(self):
+        line = self.light.cart_items.first()
+        url = reverse('products:cart-detail', args=[line.pk])
+        self.assertQueryBudget('get', url, 5, user=self.light)
+        self.assertQueryBudget('patch', url, 6, user=self.light, data={'quantity': 3})
+        self.assertQueryBudget('delete', url, 3, user=self.light, expected_status=204)
+
+    def test_wishlist_list(self):
+        url = reverse('products:wishlist-list')
+        self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_wishlist_create(self):
+        product = self.catalog['products'][-1]
+        self.assertQueryBudget(
+            'post', reverse('products:wishlist-list'), 6, user=self.light,
+            data={'product': product.pk}, expected_status=201
+        )
+
+    def test_wishlist_detail(self):
+        line = self.light.wishlist_items.first()
+        url = reverse('products:wishlist-detail', args=[line.pk])
+        self.assertQueryBudget('get', url, 5, user=self.light)
+        self.assertQueryBudget('delete', url, 3, user=self.light, expected_status=204)
+
+    # Quotes
+
+    def test_quote_list(self):
+        url = reverse('products:quote-list')
+        self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_quote_create(self):
+        self.assertQueryBudget(
+            'post', reverse('products:quote-list'), 3, user=self.light,
+            data={'product': self.product.pk, 'quantity': 2, 'message': 'Need 2 units'},
+            expected_status=201
+        )
+
+    def test_quote_detail(self):
+        quote = Quote.objects.filter(user=self.light).first()
+        self.assertQueryBudget('get', reverse('products:quote-detail', args=[quote.pk]), 4, user=self.light)
+
+    def test_vendor_quote_list(self):
+        url = reverse('products:vendor-quote-list')
+        self.assertQueryBudget('get', f"{url}?page_size=100", 3, user=self.vendor)
+        self.assertConstantQueries(
+            'get', (f"{url}?page_size=1", self.vendor), (f"{url}?page_size=100", self.vendor)
+        )
+
+    def test_vendor_quote_update(self):
+        quote = Quote.objects.filter(product__vendor=self.vendor).first()
+        url = reverse('products:vendor-quote-update', args=[quote.pk])
+        self.assertQueryBudget(
+            'patch', url, 3, user=self.vendor,
+            data={'status': 'approved', 'quoted_price': '1500.00'}
+        )
+
+    # Rentals
+
+    def test_rental_list(self):
+        url = reverse('products:rental-list')
+        self.assertQueryBudget('get', url, 2, user=self.heavy)
+        self.assertConstantQueries('get', (url, self.light), (url, self.heavy))
+
+    def test_rental_create(self):
+        start = date.today() + timedelta(days=90)
+        data = {
+            'product': self.rental_product.pk,
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=3)).isoformat(),
+            'delivery_address': 'Plot 7, MIDC',
+        }
+        # validate + locked re-check + insert + vendor stats delta, plus SAVEPOINT/RELEASE
+        # inside the test transaction
+        self.assertQueryBudget(
+            'post', reverse('products:rental-list'), 8, user=self.light, data=data, expected_status=201
+        )
+
+    def test_rental_detail(self):
+        rental = Rental.objects.filter(user=self.light).first()
+        self.assertQueryBudget('get', reverse('products:rental-detail', args=[rental.pk]), 4, user=self.light)
+
+    def test_vendor_rental_list(self):
+        url = reverse('products:vendor-rental-list')
+        self.assertQueryBudget('get', f"{url}?page_size=100", 3, user=self.vendor)
+        self.assertConstantQueries(
+            'get', (f"{url}?page_size=1", self.vendor), (f"{url}?page_size=100", self.vendor)
+        )
+
+    def test_vendor_rental_update(self):
+        rental = Rental.objects.filter(product__vendor=self.vendor).first()
+        url = reverse('products:vendor-rental-update', args=[rental.pk])
+        self.assertQueryBudget('patch', url, 3, user=self.vendor, data={'status': 'active'})
+
+    # Reviews
+
+    def test_review_list(self):
+        url = reverse('products:review-list', args=[self.product.pk])
+        self.assertQueryBudget('get', url, 3, user=self.light)
+
+    def test_review_create(self):
+        self.assertQueryBudget(
+            'post', reverse('products:review-list', args=[self.product.pk]), 12, user=self.light,
+            data={'product': self.product.pk, 'stars': 5, 'title': 'Great', 'message': 'Runs all day'},
+            expected_status=201
+        )
+
+    def test_review_detail(self):
+        review = Review.objects.create(
+            user=self.light, product=self.product, stars=4, title='Good', message='Fine'
+        )
+        self.assertQueryBudget('get', reverse('products:review-detail', args=[review.pk]), 4, user=self.light)
+
+    # Utility and dashboard
+
+    def test_product_availability(self):
+        url = reverse('products:product-availability', args=[self.rental_product.pk])
+        self.assertQueryBudget('get', f"{url}?start_date=2030-01-01&end_date=2030-01-05", 2)
+
+    def test_product_availability_calendar(self):
+        product = self.catalog['rental_products'][0]
+        booked_start = date.today() + timedelta(days=30)
+        Rental.objects.create(
+            user=self.light, product=product, start_date=booked_start + timedelta(days=5),
+            end_date=booked_start + timedelta(days=6), total_days=2, total_price=100,
+            delivery_address='Plot 7, MIDC', status='active'
+        )
+        window_start, window_end = booked_start - timedelta(days=2), booked_start + timedelta(days=10)
+        url = reverse('products:product-availability-calendar', args=[product.pk])
+        response = self.assertQueryBudget(
+            'get', f"{url}?start_date={window_start}&end_date={window_end}", 2
+        )
+        # Seeded approved rental covers days 0-4, the active one days 5-6: merged into one interval
+        self.assertEqual(response.data['booked'], [
+            {'start_date': booked_start, 'end_date': booked_start + timedelta(days=6)}
+        ])
+        self.assertEqual(response.data['free'], [
+            {'start_date': window_start, 'end_date': booked_start - timedelta(days=1)},
+            {'start_date': booked_start + timedelta(days=7), 'end_date': window_end},
+        ])
+
+    def test_rental_availability_many_products(self):
+        ids = ','.join(str(product.pk) for product in self.catalog['rental_products'][:50])
+        url = f"{reverse('products:rental-availability')}?products={ids}&start_date=2030-01-01&end_date=2030-01-31"
+        response = self.assertQueryBudget('get', url, 2)
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_rental_create_rejects_double_booking(self):
+        product = self.catalog['rental_products'][0]
+        start = date.today() + timedelta(days=32)
+        data = {
+            'product': product.pk,
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=3)).isoformat(),
+            'delivery_address': 'Plot 7, MIDC',
+        }
+        self.assertQueryBudget(
+            'post', reverse('products:rental-list'), 4, user=self.light, data=data, expected_status=400
+        )
+
+    def test_product_stats(self):
+        self.assertQueryBudget('get', reverse('products:product-stats', args=[self.product.pk]), 1)
+
+    def test_vendor_dashboard_stats(self):
+        response = self.assertQueryBudget('get', reverse('products:vendor-dashboard-stats'), 1, user=self.vendor)
+        live = VendorStats.compute([self.vendor.pk])[self.vendor.pk]
+        self.assertEqual(response.data['products']['total'], live['products_total'])
+        self.assertEqual(response.data['reviews']['total'], live['reviews_total'])
+
+    def test_vendor_stats_follow_writes(self):
+        product = Product.objects.filter(vendor=self.vendor).first()
+        quote = Quote.objects.create(user=self.light, product=product, message="Need a quote")
+        quote = Quote.objects.get(pk=quote.pk)
+        quote.status = 'approved'
+        quote.save()
+        Review.objects.create(user=self.vendor, product=product, stars=2, title="Ok", message="Ok")
+        product.is_active = False
+        product.save()
+        Quote.objects.filter(product=product).first().delete()
+
+        stats = VendorStats.objects.get(vendor=self.vendor)
+        live = VendorStats.compute([self.vendor.pk])[self.vendor.pk]
+        self.assertEqual({field: getattr(stats, field) for field in VendorStats.COUNTER_FIELDS}, live)
+
+        product.delete()
+        stats = VendorStats.objects.get(vendor=self.vendor)
+        live = VendorStats.compute([self.vendor.pk])[self.vendor.pk]
+        self.assertEqual({field: getattr(stats, field) for field in VendorStats.COUNTER_FIELDS}, live)
+
+    def test_vendor_dashboard_series(self):
+        url = reverse('products:vendor-dashboard-series')
+        response = self.assertQueryBudget('get', f"{url}?days=7", 3, user=self.vendor)
+        self.assertEqual(len(response.data['series']), 7)
+        self.assertEqual(response.data['series'][-1]['date'], date.today())
+        self.assertQueryBudget('get', f"{url}?days=0", 0, user=self.vendor, expected_status=400)
+
+
+class RatingSummaryTests(QueryBudgetTestCase):
+    """ProductRatingSummary follows review writes and `rebuild_rating_summaries`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog(products=4)
+        # The second half of a seeded catalog has no reviews
+        cls.product, cls.other = cls.catalog['products'][-2:]
+        cls.reviewers = [make_user(f"rater{i}") for i in range(3)]
+
+    def summary(self, product):
+        return ProductRatingSummary.objects.filter(product=product).first()
+
+    def review(self, reviewer, stars, product=None, is_approved=True):
+        return Review.objects.create(
+            user=reviewer, product=product or self.product, stars=stars,
+            title="Review", message="Text", is_approved=is_approved
+        )
+
+    def test_create_update_delete(self):
+        first = self.review(self.reviewers[0], 5)
+        self.review(self.reviewers[1], 2)
+        pending = self.review(self.reviewers[2], 1, is_approved=False)
+        summary = self.summary(self.product)
+        self.assertEqual((summary.review_count, summary.stars_total), (2, 7))
+        self.assertEqual(summary.get_distribution(), {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+
+        pending.is_approved = True
+        pending.save()
+        first.stars = 4
+        first.save()
+        summary = self.summary(self.product)
+        self.assertEqual((summary.review_count, summary.stars_total, summary.four_star), (3, 7, 1))
+        self.assertEqual(summary.average_rating, 2.3)
+
+        Review.objects.filter(product=self.product).exclude(pk=first.pk).delete()
+        self.assertEqual(self.summary(self.product).review_count, 1)
+        first.delete()
+        self.assertIsNone(self.summary(self.product))
+
+    def test_moving_a_review_refreshes_both_products(self):
+        review = self.review(self.reviewers[0], 3)
+        review = Review.objects.get(pk=review.pk)
+        review.product = self.other
+        review.save()
+        self.assertIsNone(self.summary(self.product))
+        self.assertEqual(self.summary(self.other).stars_total, 3)
+
+    def test_product_delete_skips_rebuilds(self):
+        for reviewer in self.reviewers:
+            self.review(reviewer, 4)
+        with mock.patch.object(ProductRatingSummary, 'rebuild_for') as rebuild_for:
+            Product.objects.get(pk=self.product.pk).delete()
+        rebuild_for.assert_not_called()
+        self.assertIsNone(self.summary(self.product))
+
+    def test_rebuild_command(self):
+        self.review(self.reviewers[0], 4)
+        ProductRatingSummary.objects.filter(product=self.product).update(review_count=9, stars_total=1)
+        ProductRatingSummary.objects.filter(product=self.catalog['products'][0]).delete()
+        expected = {
+            row['product_id']: row for row in Review.objects.filter(is_approved=True).order_by()
+            .values('product_id').annotate(**ProductRatingSummary.aggregate_expressions())
+        }
+
+        out = io.StringIO()
+        call_command('rebuild_rating_summaries', stdout=out)
+        self.assertIn(f"Rebuilt {len(expected)} product rating summaries.", out.getvalue())
+        rebuilt = {
+            row['product_id']: row for row in ProductRatingSummary.objects.values(
+                'product_id', 'review_count', 'stars_total', *ProductRatingSummary.STAR_FIELDS
+            )
+        }
+        self.assertEqual(rebuilt, expected)
+
+
+class ResponseCacheTests(QueryBudgetTestCase):
+    """products.response_cache on the anonymous catalog endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog(products=20)
+        cls.product = cls.catalog['products'][0]
+
+    def test_hits_skip_the_database(self):
+        url = reverse('products:product-list')
+        first, _, _ = self.measure('get', f"{url}?page_size=5&ordering=price")
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.assertQueryBudget('get', f"{url}?ordering=price&page_size=5", 0)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match(self):
+        url = reverse('products:product-detail', args=[self.product.slug])
+        etag = self.measure('get', url)[0]['ETag']
+        response = self.assertQueryBudget('get', url, 0, expected_status=304, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.content, b'')
+        self.assertQueryBudget('get', url, 0, HTTP_IF_NONE_MATCH='"stale"')
+
+    def test_writes_invalidate_by_tag(self):
+        detail_url = reverse('products:product-detail', args=[self.product.slug])
+        stats_url = reverse('products:product-stats', args=[self.product.pk])
+        other = Product.objects.exclude(category=self.product.category).first()
+        category_url = f"{reverse('products:product-list')}?category={other.category_id}"
+        for url in (detail_url, stats_url, category_url):
+            self.measure('get', url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).save(update_fields=['price'])
+        self.assertEqual(self.measure('get', detail_url)[0]['X-Cache'], 'MISS')
+        self.assertEqual(self.measure('get', stats_url)[0]['X-Cache'], 'MISS')
+        self.assertEqual(self.measure('get', category_url)[0]['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.catalog['light'], stars=5, message='Solid')
+        self.assertEqual(self.measure('get', stats_url)[0]['X-Cache'], 'MISS')
+        self.assertEqual(self.measure('get', category_url)[0]['X-Cache'], 'HIT')
+
+    def test_writes_during_a_miss(self):
+        def product_tags(request, kwargs):
+            return [f'product:{self.product.pk}']
+
+        def view(request):
+            # A write to the product commits while the response is being built
+            response_cache.invalidate(product_tags(request, {}))
+            return HttpResponse(b'{}', content_type='application/json')
+
+        view = cache_anonymous_response('race', product_tags)(view)
+        request = RequestFactory().get('/race/')
+        self.assertEqual(view(request)['X-Cache'], 'MISS')
+        # The entry was built against the versions from before the write
+        self.assertEqual(view(request)['X-Cache'], 'MISS')
+
+    def test_invalidation_waits_for_commit(self):
+        url = reverse('products:product-stats', args=[self.product.pk])
+        self.measure('get', url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).save(update_fields=['price'])
+            self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'HIT')
+        self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'MISS')
+
+    def test_authenticated_requests_are_not_cached(self):
+        url = reverse('products:product-stats', args=[self.product.pk])
+        response, _, _ = self.measure('get', url, user=self.catalog['light'])
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'MISS')
+
+
+class AsyncCatalogViewTests(QueryBudgetTestCase):
+    """products.async_views return what their sync counterparts return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog(products=40)
+        cls.product = cls.catalog['products'][0]
+        cls.rental_product = cls.catalog['rental_products'][-1]
+
+    def assertSameResponse(self, sync_url, async_url, budget):
+        sync_response, _, sync_queries = self.measure('get', sync_url)
+        async_response = self.assertQueryBudget('get', async_url, budget)
+        self.assertLessEqual(budget, len(sync_queries))
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        return json.loads(sync_response.content), json.loads(async_response.content)
+
+    def test_product_list(self):
+        query = f"?page_size=5&page=2&ordering=price&category={self.product.category_id}&expand=vendor"
+        # count, page, images
+        sync_data, async_data = self.assertSameResponse(
+            reverse('products:product-list') + query, reverse('products:async-product-list') + query, 3
+        )
+        self.assertEqual(async_data['count'], sync_data['count'])
+        self.assertEqual(async_data['results'], sync_data['results'])
+        self.assertEqual(async_data['previous'] is None, sync_data['previous'] is None)
+        self.assertEqual(async_data['next'] is None, sync_data['next'] is None)
+
+    def test_product_list_errors(self):
+        url = reverse('products:async-product-list')
+        self.assertQueryBudget('get', f"{url}?type=broken&min_price=x", 0, expected_status=400)
+        self.assertQueryBudget('get', f"{url}?page=999", 1, expected_status=404)
+
+    def test_product_detail(self):
+        sync_data, async_data = self.assertSameResponse(
+            reverse('products:product-detail', args=[self.product.slug]),
+            reverse('products:async-product-detail', args=[self.product.slug]),
+            2
+        )
+        self.assertEqual(async_data, sync_data)
+        self.assertQueryBudget(
+            'get', reverse('products:async-product-detail', args=['missing']), 1, expected_status=404
+        )
+
+    def test_product_stats(self):
+        sync_data, async_data = self.assertSameResponse(
+            reverse('products:product-stats', args=[self.product.pk]),
+            reverse('products:async-product-stats', args=[self.product.pk]),
+            1
+        )
+        self.assertEqual(async_data, sync_data)
+
+    def test_product_availability(self):
+        query = f"?start_date={date.today() + timedelta(days=1)}&end_date={date.today() + timedelta(days=5)}"
+        sync_data, async_data = self.assertSameResponse(
+            reverse('products:product-availability', args=[self.rental_product.pk]) + query,
+            reverse('products:async-product-availability', args=[self.rental_product.pk]) + query,
+            2
+        )
+        self.assertEqual(async_data, sync_data)
+        url = reverse('products:async-product-availability', args=[self.rental_product.pk])
+        self.assertQueryBudget('get', url, 1, expected_status=400)
+
+
+class JSONBackendTests(QueryBudgetTestCase):
+    """config.renderers produce and accept what DRF's JSON classes do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog(products=20)
+
+    def test_renderer_matches_drf(self):
+        request = RequestFactory().get('/')
+        products = ProductListSerializer.optimize_queryset(Product.objects.all(), None, None)
+        page = {'count': 20, 'results': ProductListSerializer(products, many=True, context={'request': request}).data}
+        values = {
+            'price': Decimal('1250.50'),
+            'id': uuid.uuid4(),
+            'at': datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            'day': date(2025, 1, 2),
+            'time': time(3, 4, 5),
+            'label': gettext_lazy('Products'),
+            5: 'int key',
+            'text': 'फोर्कलिफ्ट \u2028 "quoted"',
+            'big': 2 ** 70,
+        }
+        for data in (page, values, [], None):
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(values, 'application/json; indent=2'),
+            JSONRenderer().render(values, 'application/json; indent=2'),
+        )
+
+    def test_parser(self):
+        body = '{"name": "फोर्कलिफ्ट", "price": 12.5, "tags": [1, null, true]}'.encode()
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            {'name': 'फोर्कलिफ्ट', 'price': 12.5, 'tags': [1, None, True]},
+        )
+        for body in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaisesMessage(ParseError, 'JSON parse error - '):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    def test_bench_command(self):
+        out = io.StringIO()
+        call_command('bench_json', pages=2, page_size=5, repeat=1, stdout=out)
+        self.assertIn('identical bytes: yes', out.getvalue())
+
+
+class RequestInstrumentationTests(QueryBudgetTestCase):
+    """config.instrumentation over the product endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catalog = seed_catalog(products=20)
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        response, result, _ = self.measure('get', reverse('products:product-list'))
+        timing = dict(
+            entry.split(';', 1) for entry in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'app', 'total'})
+        self.assertIn(f'desc="{result["queries"]} queries"', timing['db'])
+
+    def test_stats_endpoint(self):
+        url = reverse('products:product-list')
+        for _ in range(3):
+            self.measure('get', url)
+
+        stats_url = reverse('instrumentation-stats')
+        self.assertQueryBudget('get', stats_url, 0, user=self.catalog['light'], expected_status=403)
+        response = self.assertQueryBudget('get', stats_url, 0, user=self.catalog['admin'])
+        route = response.data['routes']['products:product-list']
+        self.assertEqual(route['count'], 3)
+        self.assertEqual(sum(route['histogram_ms'].values()), 3)
+
+        self.assertQueryBudget('delete', stats_url, 0, user=self.catalog['admin'], expected_status=204)
+        self.assertNotIn('products:product-list', registry.snapshot())
+
+
+@override_settings(DATABASE_REPLICAS={'replica_1': 3, 'replica_2': 1}, DATABASE_PIN_SECONDS=5)
+class CatalogReplicaRouterTests(SimpleTestCase):
+    """config.db_routers, without a transaction around each test so reads may leave the primary."""
+
+    router = CatalogReplicaRouter()
+
+    def run_isolated(self, func, *args):
+        # The router's pin lives in context variables: start from a clean context
+        return contextvars.Context().run(func, *args)
+
+    def test_weighted_replica_reads(self):
+        random.seed(7)
+        picks = Counter(self.run_isolated(self.router.db_for_read, Product) for _ in range(4000))
+        self.assertEqual(set(picks), {'replica_1', 'replica_2'})
+        self.assertAlmostEqual(picks['replica_1'] / 4000, 0.75, delta=0.03)
+
+    def test_only_catalog_reads_leave_the_primary(self):
+        self.assertEqual(self.run_isolated(self.router.db_for_read, Order), 'default')
+        self.assertEqual(self.run_isolated(self.router.db_for_write, Product), 'default')
+        product, category = Product(), Category()
+        product._state.db, category._state.db = 'replica_1', 'default'
+        self.assertTrue(self.router.allow_relation(product, category))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'products'))
+
+    def test_database_cache_model(self):
+        cache_model = DatabaseCache('cache_table', {}).cache_model_class
+        self.assertIsNone(self.run_isolated(self.router.db_for_read, cache_model))
+
+        # An anonymous GET that fills the cache still reads from a replica
+        def cache_write_then_read():
+            self.assertIsNone(self.router.db_for_write(cache_model))
+            return self.router.db_for_read(Product)
+
+        self.assertNotEqual(self.run_isolated(cache_write_then_read), 'default')
+
+    def test_reads_follow_writes_to_the_primary(self):
+        def write_then_read():
+            self.router.db_for_write(Product)
+            return self.router.db_for_read(Product)
+
+        self.assertEqual(self.run_isolated(write_then_read), 'default')
+
+    def test_primary_block_and_decorator(self):
+        def read():
+            return self.router.db_for_read(Product)
+
+        def read_in_block():
+            with primary():
+                return read()
+
+        self.assertEqual(self.run_isolated(read_in_block), 'default')
+        self.assertEqual(self.run_isolated(use_primary(read)), 'default')
+        self.assertNotEqual(self.run_isolated(read), 'default')
+
+    def test_middleware_pins_clients_that_wrote(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Product))
+            if request.GET.get('write'):
+                self.router.db_for_write(Review)
+                reads.append(self.router.db_for_read(Product))
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+
+        response = self.run_isolated(middleware, factory.get('/', {'write': 1}))
+        self.assertNotEqual(reads[0], 'default')
+        self.assertEqual(reads[1], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        reads.clear()
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.run_isolated(middleware, request)
+        self.run_isolated(middleware, factory.post('/'))
+        response = self.run_isolated(middleware, factory.get('/'))
+        self.assertEqual(reads[:2], ['default', 'default'])
+        self.assertNotEqual(reads[2], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+def load_settings(**env):
+    """Evaluate config/settings.py under `env` (variables set to None are unset)."""
+    with mock.patch.dict(os.environ):
+        for name, value in env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return runpy.run_path(os.path.join(settings.BASE_DIR, 'config', 'settings.py'))
+
+
+class SettingsTests(SimpleTestCase):
+    """Environment parsing in config/settings.py."""
+
+    def test_cache_backend(self):
+        def backend(**env):
+            return load_settings(**env)['CACHES']['default']['BACKEND'].rsplit('.', 2)[1]
+
+        self.assertEqual(backend(DB_ENGINE=None, REDIS_URL=None, CACHE_BACKEND=None), 'db')
+        self.assertEqual(backend(DB_ENGINE=None, REDIS_URL='redis://cache:6379/0', CACHE_BACKEND=None), 'redis')
+        self.assertEqual(backend(DB_ENGINE='sqlite', REDIS_URL=None, CACHE_BACKEND=None), 'locmem')
+        self.assertEqual(backend(DB_ENGINE='sqlite', CACHE_BACKEND='database'), 'db')
+
+
+    def test_database_connections(self):
+        default = load_settings(DB_ENGINE=None, DB_PGBOUNCER_TRANSACTION_POOLING=None, DB_CONN_MAX_AGE=None,
+                                DB_POOL=None)['DATABASES']['default']
+        # Server-side cursors stay on unless PgBouncer runs in transaction mode
+        self.assertFalse(default['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(default['CONN_MAX_AGE'], 60)
+        default = load_settings(DB_ENGINE=None, DB_PGBOUNCER_TRANSACTION_POOLING='true',
+                                DB_CONN_MAX_AGE='none')['DATABASES']['default']
+        self.assertTrue(default['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertIsNone(default['CONN_MAX_AGE'])
+
+    def test_database_pool(self):
+        with mock.patch.dict('sys.modules', {'psycopg_pool': None}):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'psycopg[pool]'):
+                load_settings(DB_ENGINE=None, DB_POOL='true')
+        with mock.patch.dict('sys.modules', {'psycopg_pool': mock.Mock()}):
+            default = load_settings(DB_ENGINE=None, DB_POOL='true', DB_POOL_MAX_SIZE='4')['DATABASES']['default']
+        self.assertEqual(default['CONN_MAX_AGE'], 0)
+        self.assertEqual(default['OPTIONS']['pool']['max_size'], 4)
+
+    def test_replicas(self):
+        loaded = load_settings(DB_ENGINE=None, DB_REPLICA_HOSTS='db-r1*3, db-r2:6432', PGPORT=None)
+        self.assertEqual(loaded['DATABASE_REPLICAS'], {'replica_1': 3, 'replica_2': 1})
+        replica = loaded['DATABASES']['replica_2']
+        self.assertEqual((replica['HOST'], replica['PORT']), ('db-r2', '6432'))
+        self.assertEqual(loaded['DATABASES']['replica_1']['PORT'], 5432)
+        self.assertEqual(replica['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(loaded['DATABASE_ROUTERS'], ['config.db_routers.CatalogReplicaRouter'])
+        middleware = loaded['MIDDLEWARE']
+        self.assertLess(
+            middleware.index('config.db_routers.PrimaryPinningMiddleware'),
+            middleware.index('django.contrib.sessions.middleware.SessionMiddleware')
+        )
+        self.assertNotIn('DATABASE_ROUTERS', load_settings(DB_ENGINE=None, DB_REPLICA_HOSTS=None))
+
+
+DATABASE_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_shared_cache'},
+}
+
+
+@override_settings(CACHES=DATABASE_CACHE)
+class SharedCacheTests(QueryBudgetTestCase):
+    """
+    Versions and entries live in the shared backend, so a write handled by one
+    worker is seen by the others. A fresh backend instance stands in for another
+    worker's connection.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('createcachetable', verbosity=0)
+        cls.catalog = seed_catalog(products=4)
+
+    def test_catalog_version(self):
+        version = get_catalog_version()
+        other_worker = caches.create_connection('default')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Shared", slug="shared")
+            # Not before the write commits
+            self.assertEqual(other_worker.get(CATALOG_VERSION_KEY), version)
+        self.assertEqual(other_worker.get(CATALOG_VERSION_KEY), version + 1)
+
+    def test_response_cache_invalidation(self):
+        url = reverse('products:product-detail', args=[self.catalog['products'][0].slug])
+        self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'MISS')
+        # Another worker: its own local tier, the same shared entries
+        response_cache.clear_local()
+        self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'HIT')
+
+        # A write through another worker's cache connection...
+        with mock.patch.object(ResponseCache, 'shared', caches.create_connection('default')):
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.get(slug=self.catalog['products'][0].slug).save(update_fields=['price'])
+        # ...invalidates this worker's local copy
+        self.assertEqual(self.measure('get', url)[0]['X-Cache'], 'MISS')
+
+    @override_settings(DATABASE_ROUTERS=['config.db_routers.CatalogReplicaRouter'])
+    def test_replica_router(self):
+        # The cache table is read through a pseudo-model, not a registered model
+        other_worker = caches.create_connection('default')
+        other_worker.set('routed', 1)
+        self.assertEqual(other_worker.get('routed'), 1)
+
+    def test_category_tree_snapshot(self):
+        version = catalog_tree().version
+        # A category edit handled by another worker
+        with mock.patch('products.cache.cache', caches.create_connection('default')):
+            with self.captureOnCommitCallbacks(execute=True):
+                Category.objects.create(name="Shared", slug="shared")
+        tree = catalog_tree()
+        self.assertNotEqual(tree.version, version)
+        self.assertIn("Shared", [node['name'] for node in tree.categories])
 
-# Create your tests here.
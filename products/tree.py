@@ -0,0 +1,98 @@
+"""
+The Category -> Subcategory navigation tree with active product counts.
+
+The taxonomy is read on every page render and changes rarely, so each process
+keeps one immutable snapshot: the tree plus its rendered JSON body and ETag.
+Requests compare the snapshot's catalog version (products.cache, bumped by
+Product, Category and Subcategory writes) with the current one and only rebuild
+on a mismatch. Reading an up-to-date snapshot costs a cache lookup and no
+queries; a rebuild costs two. The version lives in the shared cache (see CACHES
+in settings), so a write in one worker makes every worker rebuild on its next
+request.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass
+
+from django.db.models import Count, Q
+
+from config.renderers import default_renderer
+
+from .cache import get_catalog_version
+from .models import Category, Subcategory
+
+
+@dataclass(frozen=True)
+class CatalogTree:
+    version: int
+    categories: tuple
+    content: bytes
+    etag: str
+
+
+_snapshot = None
+_rebuild_lock = threading.Lock()
+
+
+def image_url(image):
+    return image.url if image else None
+
+
+def build_tree():
+    """The active categories and their active subcategories, as plain dicts."""
+    active_products = Count('products', filter=Q(products__is_active=True))
+    subcategories = {}
+    for subcategory in (
+        Subcategory.objects.filter(is_active=True, category__is_active=True)
+        .annotate(product_count=active_products)
+        .only('id', 'category_id', 'name', 'slug', 'sub_image')
+        .order_by('name', 'id')
+    ):
+        subcategories.setdefault(subcategory.category_id, []).append({
+            'id': subcategory.pk,
+            'name': subcategory.name,
+            'slug': subcategory.slug,
+            'image': image_url(subcategory.sub_image),
+            'product_count': subcategory.product_count,
+        })
+
+    return tuple(
+        {
+            'id': category.pk,
+            'name': category.name,
+            'slug': category.slug,
+            'image': image_url(category.cat_image),
+            'product_count': category.product_count,
+            'subcategories': subcategories.get(category.pk, []),
+        }
+        for category in (
+            Category.objects.filter(is_active=True)
+            .annotate(product_count=active_products)
+            .only('id', 'name', 'slug', 'cat_image')
+            .order_by('name', 'id')
+        )
+    )
+
+
+def catalog_tree():
+    """The current snapshot, rebuilt first if the catalog version moved on."""
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _rebuild_lock:
+        # Another thread may have rebuilt while this one waited
+        if _snapshot is not None and _snapshot.version == version:
+            return _snapshot
+        categories = build_tree()
+        content = default_renderer().render({'version': version, 'categories': categories})
+        _snapshot = CatalogTree(
+            version=version,
+            categories=categories,
+            content=content,
+            etag=f'"{hashlib.md5(content).hexdigest()}"',
+        )
+        return _snapshot
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'products'
 
@@ -8,6 +8,9 @@ urlpatterns = [
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
     path('categories/<int:pk>/', views.CategoryDetailView.as_view(), name='category-detail'),
     
+    # Navigation tree
+    path('catalog/tree/', views.category_tree, name='category-tree'),
+    
     # Subcategory URLs
     path('subcategories/', views.SubcategoryListView.as_view(), name='subcategory-list'),
     path('subcategories/<int:pk>/', views.SubcategoryDetailView.as_view(), name='subcategory-detail'),
@@ -15,12 +18,15 @@ urlpatterns = [
     # Product URLs
     path('products/', views.ProductListView.as_view(), name='product-list'),
     path('products/create/', views.ProductCreateView.as_view(), name='product-create'),
+    path('products/facets/', views.ProductFacetView.as_view(), name='product-facets'),
     path('products/<slug:slug>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:pk>/update/', views.ProductUpdateView.as_view(), name='product-update'),
     path('products/<int:pk>/delete/', views.ProductDestroyView.as_view(), name='product-delete'),
     
     # Vendor Product URLs
     path('vendor/products/', views.VendorProductListView.as_view(), name='vendor-product-list'),
+    path('vendor/products/import/', views.VendorProductImportView.as_view(), name='vendor-product-import'),
+    path('vendor/products/export/', views.VendorProductExportView.as_view(), name='vendor-product-export'),
     
     # Cart URLs
     path('cart/', views.CartListView.as_view(), name='cart-list'),
@@ -52,8 +58,17 @@ urlpatterns = [
     
     # Utility URLs
     path('products/<int:product_id>/availability/', views.product_availability_check, name='product-availability'),
+    path('products/<int:product_id>/availability/calendar/', views.product_availability_calendar, name='product-availability-calendar'),
+    path('rentals/availability/', views.rental_availability_calendar, name='rental-availability'),
     path('products/<int:product_id>/stats/', views.product_stats, name='product-stats'),
     
+    # Async read path (served by the ASGI service)
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<slug:slug>/', async_views.product_detail, name='async-product-detail'),
+    path('async/products/<int:product_id>/stats/', async_views.product_stats, name='async-product-stats'),
+    path('async/products/<int:product_id>/availability/', async_views.product_availability_check, name='async-product-availability'),
+    
     # Dashboard URLs
     path('vendor/dashboard/stats/', views.DashboardStatsView.as_view(), name='vendor-dashboard-stats'),
+    path('vendor/dashboard/series/', views.DashboardSeriesView.as_view(), name='vendor-dashboard-series'),
 ]
\ No newline at end of file
@@ -3,14 +3,36 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Avg, Count
+from django.utils.decorators import method_decorator
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q
 from django.utils import timezone
+from datetime import datetime
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.pagination import PageNumberPagination
 import logging
 
+from config.db_routers import PrimaryReadMixin
+from jobs.queue import enqueue
+
+from .availability import availability_calendar
+from .bulk import (
+    FORMATS, ImportFormatError, ProductImporter, decode_lines, guess_format, iter_export, iter_rows
+)
+from .cache import catalog_cache_key
+from .dashboard import (
+    DEFAULT_SERIES_DAYS, MAX_SERIES_DAYS, daily_series, dashboard_payload, vendor_stats
+)
+from .facets import compute_facets
+from .pagination import StandardResultsSetPagination
+from .response_cache import cache_anonymous_response, not_modified
+from .search import ProductSearchFilter
+from .streaming import StreamingListMixin
+from .tree import catalog_tree
+
 from .models import (
     Category, Subcategory, Product, ProductImage, Cart, Wishlist, 
     Quote, Rental, Review, ReviewMedia
@@ -21,16 +43,11 @@ from .serializers import (
     WishlistSerializer, QuoteSerializer, QuoteCreateSerializer,
     RentalSerializer, RentalCreateSerializer, ReviewSerializer,
     ReviewCreateSerializer, VendorQuoteResponseSerializer,
-    VendorRentalResponseSerializer
+    VendorRentalResponseSerializer, split_param
 )
 
 logger = logging.getLogger(__name__)
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 class IsVendor(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.is_vendor
@@ -39,10 +56,48 @@ class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.user == request.user
 
+class ProductFieldSelectionMixin:
+    """
+    `?fields=a,b` narrows and `?expand=c` extends the product serializer's fields.
+    `product_queryset` loads only the columns and relations those fields read.
+    """
+    # Columns always loaded, e.g. keys read by the paginator
+    required_columns = ('created_at', 'price', 'name')
+    
+    def get_field_selection(self):
+        params = self.request.query_params
+        fields = split_param(params.get('fields')) or None
+        expand = split_param(params.get('expand')) or None
+        return fields, expand
+    
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_field_selection()
+        kwargs.setdefault('fields', fields)
+        kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+    
+    def product_queryset(self, queryset):
+        fields, expand = self.get_field_selection()
+        return self.get_serializer_class().optimize_queryset(
+            queryset, fields, expand, extra_columns=self.required_columns
+        )
+
 class IsVendorOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.vendor == request.user
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def category_tree(request):
+    """Every active category with its subcategories and active product counts."""
+    tree = catalog_tree()
+    if not_modified(request, tree.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(tree.content, content_type='application/json')
+    response['ETag'] = tree.etag
+    return response
+
 class CategoryListView(generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -64,31 +119,48 @@ class SubcategoryListView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Subcategory.objects.all()
+        queryset = Subcategory.objects.select_related('category')
         category_id = self.request.query_params.get('category')
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         return queryset
 
 class SubcategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Subcategory.objects.all()
+    queryset = Subcategory.objects.select_related('category')
     serializer_class = SubcategorySerializer
     permission_classes = [IsAuthenticated]
 
-class ProductListView(generics.ListAPIView):
+def product_list_tags(request, kwargs):
+    # A list narrowed to one category or vendor only goes stale when that one changes
+    params = request.GET
+    if params.get('category', '').isdigit():
+        return [f"category:{params['category']}"]
+    if params.get('vendor', '').isdigit():
+        return [f"vendor:{params['vendor']}"]
+    return ['product-list']
+
+def product_detail_tags(request, kwargs):
+    # Tags are read before the view runs, so resolve the slug up front
+    product_id = Product.objects.filter(slug=kwargs['slug']).values_list('pk', flat=True).first()
+    return [f"product:{product_id}"] if product_id is not None else []
+
+def product_id_tags(request, kwargs):
+    return [f"product:{kwargs['product_id']}"]
+
+@method_decorator(cache_anonymous_response('product-list', product_list_tags), name='dispatch')
+class ProductListView(ProductFieldSelectionMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # Search runs last so relevance ordering wins unless ?ordering= is given
+    filter_backends = [DjangoFilterBackend, OrderingFilter, ProductSearchFilter]
     filterset_fields = ['category', 'subcategory', 'type', 'selling_method', 'is_rental_available']
     search_fields = ['name', 'description', 'manufacturer', 'model']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['-created_at']
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related(
-            'vendor', 'category', 'subcategory', 'vendor__vendor_profile'
-        ).prefetch_related('images')
+        queryset = self.product_queryset(Product.objects.filter(is_active=True))
         
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
@@ -103,16 +175,31 @@ class ProductListView(generics.ListAPIView):
         
         return queryset
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductFacetView(ProductListView):
+    """Sidebar facet counts for the product set ProductListView would return."""
+    pagination_class = None
+    cache_timeout = 300
+    # Paging and ordering don't change the counts, so keep them out of the cache key
+    ignored_params = ('page', 'page_size', 'ordering', 'cursor', 'pagination')
+    
+    def list(self, request, *args, **kwargs):
+        cache_key = catalog_cache_key('facets', request.query_params, self.ignored_params)
+        facets = cache.get(cache_key)
+        if facets is None:
+            facets = compute_facets(self.filter_queryset(self.get_queryset()))
+            cache.set(cache_key, facets, self.cache_timeout)
+        return Response(facets)
+
+@method_decorator(cache_anonymous_response('product-detail', product_detail_tags), name='dispatch')
+class ProductDetailView(ProductFieldSelectionMixin, generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductDetailSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
+    required_columns = ('slug',)
     
     def get_queryset(self):
-        return super().get_queryset().select_related(
-            'vendor', 'category', 'subcategory', 'vendor__vendor_profile'
-        ).prefetch_related('images', 'reviews')
+        return self.product_queryset(super().get_queryset())
 
 class ProductCreateView(generics.CreateAPIView):
     serializer_class = ProductCreateUpdateSerializer
@@ -134,22 +221,72 @@ class ProductDestroyView(generics.DestroyAPIView):
     def get_queryset(self):
         return Product.objects.filter(vendor=self.request.user)
 
-class VendorProductListView(generics.ListAPIView):
+# Vendors expect their own edits to show up at once, replication lag or not
+class VendorProductListView(PrimaryReadMixin, StreamingListMixin, ProductFieldSelectionMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticated, IsVendor]
     pagination_class = StandardResultsSetPagination
     
     def get_queryset(self):
-        return Product.objects.filter(vendor=self.request.user).select_related(
-            'category', 'subcategory'
-        ).prefetch_related('images')
+        return self.product_queryset(Product.objects.filter(vendor=self.request.user))
+
+class VendorProductImportView(APIView):
+    """
+    POST a CSV or JSONL file as `file` to create or update the vendor's products by
+    slug. Pass `file_format` when the file name does not end in .csv or .jsonl.
+    """
+    permission_classes = [IsAuthenticated, IsVendor]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file_format = request.data.get('file_format') or guess_format(upload.name)
+        try:
+            rows = iter_rows(decode_lines(upload), file_format)
+            report = ProductImporter(request.user).run(rows)
+        except ImportFormatError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"error": "File must be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(report)
+
+class VendorProductExportView(APIView):
+    """Stream the vendor's products as CSV (default) or JSONL (`?file_format=jsonl`)."""
+    permission_classes = [IsAuthenticated, IsVendor]
+    content_types = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+    
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response(
+                {"error": f"file_format must be one of {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response = StreamingHttpResponse(
+            iter_export(Product.objects.filter(vendor=request.user), file_format),
+            content_type=self.content_types[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
 
 class CartListView(generics.ListCreateAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user).select_related('product')
+        return Cart.objects.filter(user=self.request.user).select_related(
+            'product__vendor'
+        ).prefetch_related('product__images').annotate(
+            line_total=ExpressionWrapper(
+                F('quantity') * F('product__price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -166,7 +303,9 @@ class WishlistListView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user).select_related('product')
+        return Wishlist.objects.filter(user=self.request.user).select_related(
+            'product__vendor'
+        ).prefetch_related('product__images')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -178,12 +317,12 @@ class WishlistDetailView(generics.RetrieveDestroyAPIView):
     def get_queryset(self):
         return Wishlist.objects.filter(user=self.request.user)
 
-class QuoteListView(generics.ListCreateAPIView):
+class QuoteListView(StreamingListMixin, generics.ListCreateAPIView):
     serializer_class = QuoteSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Quote.objects.filter(user=self.request.user).select_related('product')
+        return Quote.objects.filter(user=self.request.user).select_related('user', 'product__vendor')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -191,7 +330,8 @@ class QuoteListView(generics.ListCreateAPIView):
         return QuoteSerializer
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        quote = serializer.save(user=self.request.user)
+        enqueue('quotes.notify_vendor', quote_id=quote.pk)
 
 class QuoteDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = QuoteSerializer
@@ -200,14 +340,14 @@ class QuoteDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Quote.objects.filter(user=self.request.user)
 
-class VendorQuoteListView(generics.ListAPIView):
+class VendorQuoteListView(StreamingListMixin, generics.ListAPIView):
     serializer_class = QuoteSerializer
     permission_classes = [IsAuthenticated, IsVendor]
     pagination_class = StandardResultsSetPagination
     
     def get_queryset(self):
         return Quote.objects.filter(product__vendor=self.request.user).select_related(
-            'user', 'product'
+            'user', 'product__vendor'
         )
 
 class VendorQuoteUpdateView(generics.UpdateAPIView):
@@ -215,14 +355,22 @@ class VendorQuoteUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated, IsVendor]
     
     def get_queryset(self):
-        return Quote.objects.filter(product__vendor=self.request.user)
+        return Quote.objects.filter(product__vendor=self.request.user).select_related(
+            'product'
+        ).defer('product__search_vector')
+    
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        quote = serializer.save()
+        if quote.status != previous_status:
+            enqueue('quotes.notify_customer', quote_id=quote.pk)
 
-class RentalListView(generics.ListCreateAPIView):
+class RentalListView(StreamingListMixin, generics.ListCreateAPIView):
     serializer_class = RentalSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Rental.objects.filter(user=self.request.user).select_related('product')
+        return Rental.objects.filter(user=self.request.user).select_related('user', 'product__vendor')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -230,7 +378,8 @@ class RentalListView(generics.ListCreateAPIView):
         return RentalSerializer
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        rental = serializer.save(user=self.request.user)
+        enqueue('rentals.notify_vendor', rental_id=rental.pk)
 
 class RentalDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = RentalSerializer
@@ -239,14 +388,14 @@ class RentalDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Rental.objects.filter(user=self.request.user)
 
-class VendorRentalListView(generics.ListAPIView):
+class VendorRentalListView(StreamingListMixin, generics.ListAPIView):
     serializer_class = RentalSerializer
     permission_classes = [IsAuthenticated, IsVendor]
     pagination_class = StandardResultsSetPagination
     
     def get_queryset(self):
         return Rental.objects.filter(product__vendor=self.request.user).select_related(
-            'user', 'product'
+            'user', 'product__vendor'
         )
 
 class VendorRentalUpdateView(generics.UpdateAPIView):
@@ -254,7 +403,15 @@ class VendorRentalUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated, IsVendor]
     
     def get_queryset(self):
-        return Rental.objects.filter(product__vendor=self.request.user)
+        return Rental.objects.filter(product__vendor=self.request.user).select_related(
+            'product'
+        ).defer('product__search_vector')
+    
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        rental = serializer.save()
+        if rental.status != previous_status:
+            enqueue('rentals.notify_customer', rental_id=rental.pk)
 
 class ReviewListView(generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
@@ -265,7 +422,7 @@ class ReviewListView(generics.ListCreateAPIView):
         return Review.objects.filter(
             product_id=product_id, 
             is_approved=True
-        ).select_related('user').prefetch_related('media')
+        ).select_related('user', 'product').prefetch_related('media')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -282,28 +439,54 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Review.objects.filter(user=self.request.user)
 
-@api_view(['GET'])
-@permission_classes([permissions.AllowAny])
-def product_availability_check(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    start_date = request.query_params.get('start_date')
-    end_date = request.query_params.get('end_date')
+MAX_AVAILABILITY_WINDOW_DAYS = 366
+MAX_AVAILABILITY_PRODUCTS = 100
+
+def date_range_from_params(params):
+    """Return (start_date, end_date, error_message) from ?start_date=&end_date=."""
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
     
     if not start_date or not end_date:
-        return Response(
-            {"error": "start_date and end_date are required"}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        return None, None, "start_date and end_date are required"
     
     try:
-        from datetime import datetime
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     except ValueError:
-        return Response(
-            {"error": "Invalid date format. Use YYYY-MM-DD"}, 
+        return None, None, "Invalid date format. Use YYYY-MM-DD"
+    
+    return start_date, end_date, None
+
+def parse_date_range(request):
+    """Return (start_date, end_date, error_response) from ?start_date=&end_date=."""
+    start_date, end_date, error = date_range_from_params(request.query_params)
+    if error:
+        return None, None, Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+    return start_date, end_date, None
+
+def parse_calendar_window(request):
+    start_date, end_date, error = parse_date_range(request)
+    if error is None and end_date < start_date:
+        error = Response(
+            {"error": "end_date must not be before start_date"},
             status=status.HTTP_400_BAD_REQUEST
         )
+    if error is None and (end_date - start_date).days + 1 > MAX_AVAILABILITY_WINDOW_DAYS:
+        error = Response(
+            {"error": f"The window can span at most {MAX_AVAILABILITY_WINDOW_DAYS} days"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return start_date, end_date, error
+
+@cache_anonymous_response('product-availability', product_id_tags)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def product_availability_check(request, product_id):
+    product = get_object_or_404(Product, id=product_id)
+    start_date, end_date, error = parse_date_range(request)
+    if error:
+        return error
     
     is_available = product.is_available_for_rental(start_date, end_date)
     rental_price = product.calculate_rental_price(start_date, end_date) if is_available else 0
@@ -314,59 +497,91 @@ def product_availability_check(request, product_id):
         "days": (end_date - start_date).days + 1
     })
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def product_availability_calendar(request, product_id):
+    product = get_object_or_404(
+        Product.objects.only('id', 'is_rental_available'),
+        id=product_id
+    )
+    start_date, end_date, error = parse_calendar_window(request)
+    if error:
+        return error
+    
+    calendar = availability_calendar([product], start_date, end_date)[product.pk]
+    return Response({
+        "product": product.pk,
+        "start_date": start_date,
+        "end_date": end_date,
+        **calendar
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def rental_availability_calendar(request):
+    """Availability of many products at once: ?products=1,2,3&start_date=&end_date="""
+    start_date, end_date, error = parse_calendar_window(request)
+    if error:
+        return error
+    
+    try:
+        product_ids = [int(pk) for pk in request.query_params.get('products', '').split(',') if pk]
+    except ValueError:
+        return Response(
+            {"error": "products must be a comma separated list of ids"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not product_ids or len(product_ids) > MAX_AVAILABILITY_PRODUCTS:
+        return Response(
+            {"error": f"Provide between 1 and {MAX_AVAILABILITY_PRODUCTS} product ids"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    products = Product.objects.filter(id__in=product_ids, is_active=True).only('id', 'is_rental_available')
+    return Response({
+        "start_date": start_date,
+        "end_date": end_date,
+        "results": availability_calendar(products, start_date, end_date)
+    })
+
+@cache_anonymous_response('product-stats', product_id_tags)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def product_stats(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(
+        Product.objects.select_related('rating_summary'),
+        id=product_id
+    )
     
     stats = {
         "average_rating": product.get_average_rating(),
         "review_count": product.get_review_count(),
-        "rating_distribution": {}
+        "rating_distribution": product.get_rating_distribution()
     }
     
-    for i in range(1, 6):
-        count = product.reviews.filter(stars=i, is_approved=True).count()
-        stats["rating_distribution"][str(i)] = count
-    
     return Response(stats)
 
 class DashboardStatsView(APIView):
     permission_classes = [IsAuthenticated, IsVendor]
     
     def get(self, request):
-        vendor = request.user
-        
-        total_products = Product.objects.filter(vendor=vendor).count()
-        active_products = Product.objects.filter(vendor=vendor, is_active=True).count()
-        
-        total_quotes = Quote.objects.filter(product__vendor=vendor).count()
-        pending_quotes = Quote.objects.filter(product__vendor=vendor, status='pending').count()
-        
-        total_rentals = Rental.objects.filter(product__vendor=vendor).count()
-        active_rentals = Rental.objects.filter(product__vendor=vendor, status='active').count()
-        
-        total_reviews = Review.objects.filter(product__vendor=vendor).count()
-        average_rating = Review.objects.filter(product__vendor=vendor).aggregate(
-            avg_rating=Avg('stars')
-        )['avg_rating'] or 0
+        return Response(dashboard_payload(vendor_stats(request.user.pk)))
+
+class DashboardSeriesView(APIView):
+    permission_classes = [IsAuthenticated, IsVendor]
+    
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', DEFAULT_SERIES_DAYS))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= MAX_SERIES_DAYS:
+            return Response(
+                {"error": f"days must be between 1 and {MAX_SERIES_DAYS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response({
-            "products": {
-                "total": total_products,
-                "active": active_products,
-                "inactive": total_products - active_products
-            },
-            "quotes": {
-                "total": total_quotes,
-                "pending": pending_quotes
-            },
-            "rentals": {
-                "total": total_rentals,
-                "active": active_rentals
-            },
-            "reviews": {
-                "total": total_reviews,
-                "average_rating": round(average_rating, 1)
-            }
-        })
\ No newline at end of file
+            "days": days,
+            "series": daily_series(request.user.pk, days)
+        })